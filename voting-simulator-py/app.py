@@ -3,23 +3,43 @@ Flask web application for the UK Weighted Voting System.
 Provides an interactive web interface for running voting simulations.
 """
 
-from flask import Flask, render_template, request, jsonify, send_file, Response
+from flask import (
+    Flask, render_template, request, jsonify, send_file, Response, url_for,
+    copy_current_request_context, abort
+)
 import os
 import tempfile
 import threading
 import time
 import random
-import uuid
+
+import numpy as np
 
 from vote_types import (
     Candidate, VoterProfile, WeightCoefficients, Results
 )
-from election import run_weighted_yes_no_election, run_election_web
+from election import run_election_web
+from sweep import sample_simplex, simplex_grid, sweep_weighted_yes_no_election
+from simulation import grouped_profile
+from pairwise import pairwise_stats
+from result_cache import (
+    DEFAULT_MAX_BYTES, DEFAULT_MAX_DISK_BYTES, ResultCache, cache_key
+)
+from jobs import (
+    CANCELLED, DEFAULT_MAX_QUEUE, DEFAULT_TIMEOUT, DEFAULT_WORKERS, DONE, FAILED,
+    TIMED_OUT, JobPool, JobQueueFull
+)
+from chart_store import (
+    ChartStore, DEFAULT_MAX_BYTES as CHART_STORE_BYTES, DEFAULT_TTL as CHART_STORE_TTL
+)
 from visualization import (
     create_weighted_vote_chart,
     create_ranked_choice_visualization,
     create_voter_profile_heatmap,
-    create_first_preferences_pie_chart
+    create_first_preferences_pie_chart,
+    install_plotly_js,
+    PLOTLY_JS_NAME,
+    PLOTLY_JS_SOURCE
 )
 from voting_systems import (
     plurality, anti_plurality, borda_count, dowdall, veto,
@@ -31,13 +51,67 @@ from voting_systems import (
 
 app = Flask(__name__)
 
+# Every page and chart loads one plotly.js bundle, so chart payloads carry
+# only their figure. `flask install-plotly-js` (also run when app.py is
+# started directly) copies it into static/js; until then, or when the
+# static folder is read-only, it is served from the plotly package.
+PLOTLY_JS_DIR = os.path.join(app.static_folder, 'js')
+# The bundle's name carries the plotly version, so browsers may keep it
+PLOTLY_JS_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def install_static_plotly_js():
+    """Copy the plotly.js bundle into static/js; False if it cannot be written."""
+    try:
+        install_plotly_js(PLOTLY_JS_DIR)
+        return True
+    except OSError as e:
+        print(f"plotly.js not installed in {PLOTLY_JS_DIR} ({e}); "
+              f"serving it from the plotly package")
+        return False
+
+
+@app.cli.command('install-plotly-js')
+def install_plotly_js_command():
+    """Copy the plotly.js bundle into the static folder."""
+    if install_static_plotly_js():
+        print(f"Installed {os.path.join(PLOTLY_JS_DIR, PLOTLY_JS_NAME)}")
+
+
+@app.context_processor
+def inject_plotly_js():
+    """Make the plotly.js bundle URL available to every template."""
+    if os.path.exists(os.path.join(PLOTLY_JS_DIR, PLOTLY_JS_NAME)):
+        url = url_for('static', filename='js/' + PLOTLY_JS_NAME)
+    else:
+        url = url_for('serve_plotly_js', filename=PLOTLY_JS_NAME)
+    return {'plotly_js_url': url}
+
+
+@app.route('/plotly/<filename>')
+def serve_plotly_js(filename):
+    """Serve the plotly.js bundle from the plotly package."""
+    if filename != PLOTLY_JS_NAME:
+        abort(404)
+    return send_file(PLOTLY_JS_SOURCE, mimetype='text/javascript')
+
+
+@app.after_request
+def cache_plotly_js(response):
+    """Serve the versioned plotly.js bundle with long-lived cache headers."""
+    if request.path.endswith('/' + PLOTLY_JS_NAME):
+        response.headers['Cache-Control'] = PLOTLY_JS_CACHE_CONTROL
+    return response
+
+
 # Global variables for simulation state
 simulation_state = {
     'weighted_results': None,
     'ranked_results': None,
     'current_round': 0,
     'is_running': False,
-    'round_duration': 5  # Default 5 seconds for web interface
+    'round_duration': 5,  # Default 5 seconds for web interface
+    'ballot_seed': None   # Seed of the last election's ballots
 }
 # Mapping rule names to functions for ranking-based rules
 rule_funcs = {
@@ -64,6 +138,18 @@ rule_funcs = {
     'young': young,
     'random_dictatorship': random_dictatorship
 }
+# Rules whose outcome is not determined by the ballots alone
+UNCACHED_RULES = {'random_dictatorship'}
+# Part of every cached result's key; bump when a rule's output changes
+RULES_VERSION = 1
+
+# Generated ballots and rule results, keyed by everything that determines
+# them; set RESULT_CACHE_PATH to keep them in SQLite across restarts
+result_cache = ResultCache(
+    max_bytes=int(os.environ.get('RESULT_CACHE_BYTES', DEFAULT_MAX_BYTES)),
+    path=os.environ.get('RESULT_CACHE_PATH'),
+    max_disk_bytes=int(os.environ.get('RESULT_CACHE_DISK_BYTES',
+                                      DEFAULT_MAX_DISK_BYTES)))
 
 
 def get_uk_parties():
@@ -103,43 +189,119 @@ def get_voter_profiles():
     ]
 
 
-def generate_ballots_for_election(candidates, voter_profiles):
-    """Generate ranked choice ballots for election."""
-    ballots = []
-
-    # Regional voting patterns for UK parties
-    regional_preferences = {
-        "urban_professionals": ["labour", "libdem", "green"],
-        "rural_voters": ["conservative", "reform", "libdem"],
-        "students": ["green", "labour", "libdem"],
-        "retirees": ["conservative", "labour", "libdem"],
-        "working_class": ["labour", "conservative", "reform"],
-        "young_professionals": ["labour", "libdem", "green"],
-        "business_owners": ["conservative", "reform", "libdem"],
-        "public_sector": ["labour", "libdem", "green"],
-        "first_time_voters": ["green", "labour", "libdem"]
-    }
+def get_referendum_sides():
+    """Get the voter groups voting YES and NO in the EU referendum."""
+    yes_ids = [
+        'urban_professionals',
+        'students',
+        'young_professionals',
+        'public_sector',
+        'first_time_voters']
+    no_ids = ['rural_voters', 'retirees', 'working_class', 'business_owners']
+    return yes_ids, no_ids
 
-    for profile in voter_profiles:
-        base_preferences = regional_preferences.get(
-            profile.id, ["labour", "conservative", "libdem"])
 
-        for _ in range(profile.count):
-            # Create realistic preference ordering with some randomization
-            preferences = base_preferences.copy()
-            remaining = [c.id for c in candidates if c.id not in preferences]
-            random.shuffle(remaining)
+def get_normalization_bounds():
+    """Get the min/max attribute bounds used to normalize voter scores."""
+    return {
+        "min": VoterProfile(id='', E=0, P=0, D=0, A=0, S=0),
+        "max": VoterProfile(id='', E=10, P=100, D=10, A=10, S=100)
+    }
 
-            # Add remaining candidates randomly
-            full_preferences = preferences + remaining
 
-            # Sometimes shuffle the order slightly for realism
-            if random.random() < 0.3:
-                random.shuffle(full_preferences)
+# Regional voting patterns for UK parties
+REGIONAL_PREFERENCES = {
+    "urban_professionals": ["labour", "libdem", "green"],
+    "rural_voters": ["conservative", "reform", "libdem"],
+    "students": ["green", "labour", "libdem"],
+    "retirees": ["conservative", "labour", "libdem"],
+    "working_class": ["labour", "conservative", "reform"],
+    "young_professionals": ["labour", "libdem", "green"],
+    "business_owners": ["conservative", "reform", "libdem"],
+    "public_sector": ["labour", "libdem", "green"],
+    "first_time_voters": ["green", "labour", "libdem"]
+}
+DEFAULT_PREFERENCES = ["labour", "conservative", "libdem"]
+# Share of voters ranking every party at random, and the parties ranked
+BALLOT_SHUFFLE_RATE = 0.3
+BALLOT_DEPTH = 5
+# Part of the ballots' cache key; bump when ballot generation changes
+BALLOTS_VERSION = 1
+
+
+def generate_ballots_for_election(candidates, voter_profiles, seed=None):
+    """
+    Generate ranked choice ballots for election as a BallotProfile.
+
+    Each profile's voters rank their regional parties first and the rest in
+    random order; 30% of voters shuffle their whole ranking. Ballots rank at
+    most 5 parties. The same seed always gives the same ballots.
+    """
+    groups = [(REGIONAL_PREFERENCES.get(profile.id, DEFAULT_PREFERENCES), profile.count)
+              for profile in voter_profiles]
+    return grouped_profile(candidates, groups, np.random.default_rng(seed),
+                           shuffle_rate=BALLOT_SHUFFLE_RATE, depth=BALLOT_DEPTH)
+
+
+def ballots_key(candidates, voter_profiles, seed):
+    """Cache key of the ballots generated for these profiles and seed."""
+    return cache_key('ballots', BALLOTS_VERSION, candidates, voter_profiles,
+                     REGIONAL_PREFERENCES, DEFAULT_PREFERENCES, BALLOT_SHUFFLE_RATE,
+                     BALLOT_DEPTH, seed)
+
+
+def get_election_ballots(candidates, voter_profiles, seed):
+    """Generated ballots for the election, from the cache when possible."""
+    def compute():
+        ballots = generate_ballots_for_election(candidates, voter_profiles, seed)
+        # Fill the statistics the rules memoize on the profile before it is
+        # stored, so the cache measures the size the profile keeps
+        ballots.fingerprint()
+        ballots.position_counts()
+        pairwise_stats(ballots)
+        return ballots
+
+    return result_cache.get_or_compute(
+        ballots_key(candidates, voter_profiles, seed), compute)
+
+
+def run_ranked_rule(rule, candidates, voter_profiles, seed):
+    """Run a ranking rule on the election ballots, reusing cached results."""
+    func = rule_funcs.get(rule, run_election_web)
+
+    def compute():
+        ballots = get_election_ballots(candidates, voter_profiles, seed)
+        return func(candidates, ballots)
+
+    if rule in UNCACHED_RULES:
+        return compute()
+    key = cache_key('result', RULES_VERSION,
+                    ballots_key(candidates, voter_profiles, seed),
+                    func.__module__, func.__name__)
+    return result_cache.get_or_compute(key, compute)
+
+
+def format_ranked_results(results):
+    """Winner and per-round tallies of a ranked election for the web client."""
+    return {
+        'winner': results.winner.name if results.winner else 'No winner',
+        'total_rounds': len(results.round_details),
+        'rounds': [
+            {
+                'round_num': r['round'],
+                'vote_counts': r['tallies'],
+                'eliminated': r.get('eliminated', None)
+            } for r in results.round_details
+        ]
+    }
 
-            ballots.append(full_preferences[:min(5, len(full_preferences))])
 
-    return ballots
+def get_ballot_seed(seed=None):
+    """Seed for the election ballots: the one given, or a fresh one."""
+    if seed is None:
+        seed = random.getrandbits(32)
+    simulation_state['ballot_seed'] = int(seed)
+    return int(seed)
 
 
 @app.route('/')
@@ -168,89 +330,49 @@ def api_run_weighted_vote():
 
         # Get voter profiles
         voter_profiles = get_voter_profiles()
-
-        # Define voting groups for EU referendum
-        yes_ids = [
-            'urban_professionals',
-            'students',
-            'young_professionals',
-            'public_sector',
-            'first_time_voters']
-        no_ids = ['rural_voters', 'retirees', 'working_class', 'business_owners']
+        yes_ids, no_ids = get_referendum_sides()
 
         # Define weighting systems
-        equal_weights = WeightCoefficients(0.2, 0.2, 0.2, 0.2, 0.2)
-        expertise_weights = WeightCoefficients(0.4, 0.3, 0.1, 0.1, 0.1)
-        stake_weights = WeightCoefficients(0.1, 0.1, 0.1, 0.3, 0.4)
-
-        # Define bounds for normalization
-        bounds = {
-            "min": VoterProfile(id='', E=0, P=0, D=0, A=0, S=0),
-            "max": VoterProfile(id='', E=10, P=100, D=10, A=10, S=100)
+        weighting_systems = {
+            'equal': WeightCoefficients(0.2, 0.2, 0.2, 0.2, 0.2),
+            'expertise': WeightCoefficients(0.4, 0.3, 0.1, 0.1, 0.1),
+            'stake': WeightCoefficients(0.1, 0.1, 0.1, 0.3, 0.4)
         }
 
-        # Run simulations
+        # Run all weighting systems as one sweep
+        sweep = sweep_weighted_yes_no_election(
+            voter_profiles,
+            yes_ids,
+            no_ids,
+            list(weighting_systems.values()),
+            0.5,
+            get_normalization_bounds(),
+            weight_by_count=bool((data or {}).get('weight_by_count', False)))
         results = {
-            'equal': run_weighted_yes_no_election(
-                voter_profiles,
-                yes_ids,
-                no_ids,
-                equal_weights,
-                0.5,
-                bounds),
-            'expertise': run_weighted_yes_no_election(
-                voter_profiles,
-                yes_ids,
-                no_ids,
-                expertise_weights,
-                0.5,
-                bounds),
-            'stake': run_weighted_yes_no_election(
-                voter_profiles,
-                yes_ids,
-                no_ids,
-                stake_weights,
-                0.5,
-                bounds)}
+            name: {
+                'passed': bool(sweep['passed'][i]),
+                'total_yes': float(sweep['total_yes'][i]),
+                'total_no': float(sweep['total_no'][i])
+            } for i, name in enumerate(weighting_systems)
+        }
 
         # Store results globally for chart generation
         simulation_state['weighted_results'] = results
 
         return jsonify({
             'success': True,
-            'results': {                'equal': {
-                    'yes_votes': results['equal']['total_yes'],
-                    'no_votes': results['equal']['total_no'],
-                    'yes_percentage': (results['equal']['total_yes'] /
-                                       (results['equal']['total_yes'] +
-                                        results['equal']['total_no']) * 100),
-                    'no_percentage': (results['equal']['total_no'] /
-                                      (results['equal']['total_yes'] +
-                                       results['equal']['total_no']) * 100),
-                    'result': 'PASSED' if results['equal']['passed'] else 'FAILED'
-                },
-                'expertise': {
-                    'yes_votes': results['expertise']['total_yes'],
-                    'no_votes': results['expertise']['total_no'],
-                    'yes_percentage': (results['expertise']['total_yes'] /
-                                       (results['expertise']['total_yes'] +
-                                        results['expertise']['total_no']) * 100),
-                    'no_percentage': (results['expertise']['total_no'] /
-                                      (results['expertise']['total_yes'] +
-                                       results['expertise']['total_no']) * 100),
-                    'result': 'PASSED' if results['expertise']['passed'] else 'FAILED'
-                },
-                'stake': {
-                    'yes_votes': results['stake']['total_yes'],
-                    'no_votes': results['stake']['total_no'],
-                    'yes_percentage': (results['stake']['total_yes'] /
-                                       (results['stake']['total_yes'] +
-                                        results['stake']['total_no']) * 100),
-                    'no_percentage': (results['stake']['total_no'] /
-                                      (results['stake']['total_yes'] +
-                                       results['stake']['total_no']) * 100),
-                    'result': 'PASSED' if results['stake']['passed'] else 'FAILED'
-                }
+            'results': {
+                name: {
+                    'yes_votes': result['total_yes'],
+                    'no_votes': result['total_no'],
+                    'yes_percentage': (result['total_yes'] /
+                                       (result['total_yes'] +
+                                        result['total_no']) * 100),
+                    'no_percentage': (result['total_no'] /
+                                      (result['total_yes'] +
+                                       result['total_no']) * 100),
+                    'result': 'PASSED' if result['passed'] else 'FAILED'
+                } for name, result in results.items()
             },
             'voter_profiles': [
                 {
@@ -269,6 +391,61 @@ def api_run_weighted_vote():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# Largest number of coefficient vectors a single sweep request may evaluate
+MAX_SWEEP_SCENARIOS = 200000
+
+
+@app.route('/api/weighted-vote-sweep', methods=['POST'])
+def api_weighted_vote_sweep():
+    """API endpoint to sweep weighting coefficients over the simplex."""
+    try:
+        data = request.get_json(silent=True) or {}
+        threshold = float(data.get('threshold', 0.5))
+
+        # Either a uniform sample or a regular grid of coefficient vectors
+        if data.get('samples'):
+            samples = int(data['samples'])
+            if not 0 < samples <= MAX_SWEEP_SCENARIOS:
+                raise ValueError(
+                    f"samples must be between 1 and {MAX_SWEEP_SCENARIOS}")
+            coefficients = sample_simplex(samples, seed=data.get('seed'))
+        else:
+            steps = int(data.get('steps', 10))
+            if not 0 < steps <= 50:
+                raise ValueError("steps must be between 1 and 50")
+            coefficients = simplex_grid(steps)
+
+        yes_ids, no_ids = get_referendum_sides()
+        sweep = sweep_weighted_yes_no_election(
+            get_voter_profiles(),
+            yes_ids,
+            no_ids,
+            coefficients,
+            threshold,
+            get_normalization_bounds(),
+            weight_by_count=bool(data.get('weight_by_count', False)))
+
+        return jsonify({
+            'success': True,
+            'threshold': threshold,
+            'weight_by_count': bool(data.get('weight_by_count', False)),
+            'scenarios': len(sweep['coefficients']),
+            'pass_rate': float(sweep['passed'].mean()),
+            'attributes': sweep['boundary']['attributes'],
+            'coefficients': sweep['coefficients'].tolist(),
+            'passed': sweep['passed'].tolist(),
+            'total_yes': sweep['total_yes'].tolist(),
+            'total_no': sweep['total_no'].tolist(),
+            'boundary': {
+                'normal': sweep['boundary']['normal'].tolist(),
+                'edge_points': sweep['boundary']['edge_points']
+            }
+        })
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/run-ranked-choice', methods=['POST'])
 def api_run_ranked_choice():
     """API endpoint to run ranked choice election simulation."""
@@ -278,45 +455,27 @@ def api_run_ranked_choice():
         data = request.get_json()
         round_duration = data.get('round_duration', 5)
         rule = data.get('rule', 'instant_runoff')
-
-        # Get parties and voter profiles
-        candidates = get_uk_parties()
-        voter_profiles = get_voter_profiles()
-        ballots = generate_ballots_for_election(candidates, voter_profiles)
+        seed = get_ballot_seed(data.get('seed'))
 
         # Reset simulation state
         simulation_state['is_running'] = True
         simulation_state['current_round'] = 0
         simulation_state['round_duration'] = round_duration
 
-        # Run the selected voting rule
-        func = rule_funcs.get(rule)
-        if func:
-            # For rules expecting (candidates, ballots)
-            results = func(candidates, ballots)
-        else:
-            results = run_election_web(candidates, ballots)
-
-        # Store results
-        simulation_state['ranked_results'] = results
+        # Run the selected voting rule on the job pool, which bounds its run
+        # time; repeated scenarios come from the cache
+        job = run_job(ranked_choice_job, rule, seed, kind='ranked-choice',
+                      pool=rule_pool(rule))
         simulation_state['is_running'] = False
-        simulation_state['current_round'] = len(results.round_details)
+        if job.status != DONE:
+            return job_error(job)
 
-        return jsonify({
-            'success': True,
-            'results': {
-                'winner': results.winner.name if results.winner else 'No winner',
-                'total_rounds': len(results.round_details),
-                'rounds': [
-                    {
-                        'round_num': r['round'],
-                        'vote_counts': r['tallies'],
-                        'eliminated': r.get('eliminated', None)
-                    } for r in results.round_details
-                ]
-            }
-        })
+        # The job stored the results for the charts
+        return jsonify(job.result)
 
+    except JobQueueFull as e:
+        simulation_state['is_running'] = False
+        return jsonify({'success': False, 'error': str(e)}), 429
     except Exception as e:
         simulation_state['is_running'] = False
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -335,14 +494,14 @@ def api_run_ranked_choice_timed():
         # Get parties and voter profiles
         candidates = get_uk_parties()
         voter_profiles = get_voter_profiles()
-        ballots = generate_ballots_for_election(candidates, voter_profiles)
-
-        # Precompute full results for selected rule
-        func = rule_funcs.get(rule)
-        if func:
-            full_results = func(candidates, ballots)
-        else:
-            full_results = run_election_web(candidates, ballots)
+        seed = get_ballot_seed(data.get('seed'))
+
+        # Precompute full results for selected rule on the job pool
+        job = run_job(run_ranked_rule, rule, candidates, voter_profiles, seed,
+                      kind='ranked-choice', pool=rule_pool(rule))
+        if job.status != DONE:
+            return job_error(job)
+        full_results = job.result
         # Reset simulation state
         simulation_state['is_running'] = True
         simulation_state['current_round'] = 0
@@ -370,9 +529,12 @@ def api_run_ranked_choice_timed():
         return jsonify({
             'success': True,
             'message': 'Election started with timed rounds',
-            'round_duration': round_duration
+            'round_duration': round_duration,
+            'seed': seed
         })
 
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 429
     except Exception as e:
         simulation_state['is_running'] = False
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -405,79 +567,120 @@ def api_election_progress():
     # Include final results if election is complete
     if not simulation_state['is_running'] and simulation_state['ranked_results']:
         results = simulation_state['ranked_results']
-        response_data['final_results'] = {
-            'winner': results.winner.name if results.winner else 'No winner',
-            'total_rounds': len(results.round_details),
-            'rounds': [
-                {
-                    'round_num': r['round'],
-                    'vote_counts': r['tallies'],
-                    'eliminated': r.get('eliminated', None)
-                } for r in results.round_details
-            ]
-        }
+        response_data['final_results'] = format_ranked_results(results)
 
     return jsonify(response_data)
 
 
-# Global variable to store generated chart files
-chart_cache = {}
+@app.route('/api/cache-stats')
+def api_cache_stats():
+    """Hit/miss counters and memory use of the result cache and chart store."""
+    return jsonify({'success': True, 'results': result_cache.stats(),
+                    'charts': chart_store.stats()})
 
-@app.route('/api/generate-chart/<chart_type>')
-def api_generate_chart(chart_type):
-    """Generate and return chart data."""
-    try:
-        chart = None
-
-        if chart_type == 'weighted-comparison':
-            if simulation_state.get('weighted_results'):
-                # Adapt results for the chart function
-                formatted_results = {
-                    "Equal Weights": simulation_state['weighted_results']['equal'],
-                    "Expertise Focus": simulation_state['weighted_results']['expertise'],
-                    "Stake Focus": simulation_state['weighted_results']['stake']}
-                chart = create_weighted_vote_chart(
-                    formatted_results, "UK Rejoining EU - Different Weighting Systems")
-            else:
-                return jsonify(
-                    {'error': 'No weighted voting results available. Run a weighted vote simulation first.'}), 404
-
-        elif chart_type == 'ranked-choice':
-            if simulation_state.get(
-                    'ranked_results') and simulation_state['ranked_results'] is not None:
-                candidates = get_uk_parties()
-                chart = create_ranked_choice_visualization(
-                    simulation_state['ranked_results'], candidates)
-            else:
-                return jsonify(
-                    {'error': 'No ranked choice results available. Run a ranked choice election first.'}), 404
 
-        elif chart_type == 'voter-profiles':
-            voter_profiles = get_voter_profiles()
-            chart = create_voter_profile_heatmap(voter_profiles)
+# Rendered charts, stored by content hash and found again by their inputs
+chart_store = ChartStore(
+    max_bytes=int(os.environ.get('CHART_STORE_BYTES', CHART_STORE_BYTES)),
+    ttl=float(os.environ.get('CHART_STORE_TTL', CHART_STORE_TTL)))
 
-        elif chart_type == 'first-preferences':
-            candidates = get_uk_parties()
-            voter_profiles = get_voter_profiles()
-            ballots = generate_ballots_for_election(candidates, voter_profiles)
-            chart = create_first_preferences_pie_chart(ballots, candidates)
 
+def generate_chart(chart_type, seed=None):
+    """
+    Generate a chart, or find it in the chart store.
+
+    Returns the JSON payload and HTTP status for the client.
+    """
+    # Each chart type gives the inputs that determine the chart and a
+    # builder that is only run when no chart for those inputs is stored
+    if chart_type == 'weighted-comparison':
+        if simulation_state.get('weighted_results'):
+            # Adapt results for the chart function
+            formatted_results = {
+                "Equal Weights": simulation_state['weighted_results']['equal'],
+                "Expertise Focus": simulation_state['weighted_results']['expertise'],
+                "Stake Focus": simulation_state['weighted_results']['stake']}
+            inputs = formatted_results
+
+            def build():
+                return create_weighted_vote_chart(
+                    formatted_results, "UK Rejoining EU - Different Weighting Systems")
         else:
-            return jsonify({'error': f'Unknown chart type: {chart_type}'}), 404
-
-        if chart is not None and hasattr(chart, 'to_html'):
-            # Generate unique filename and store in cache
-            chart_id = str(uuid.uuid4())
-            chart_cache[chart_id] = chart.to_html()
-            
-            # Return JSON with chart URL instead of HTML
-            return jsonify({
-                'success': True,
-                'chart_url': f'/chart/{chart_id}'
-            })
+            return {'error': 'No weighted voting results available. '
+                             'Run a weighted vote simulation first.'}, 404
+
+    elif chart_type == 'ranked-choice':
+        if simulation_state.get(
+                'ranked_results') and simulation_state['ranked_results'] is not None:
+            candidates = get_uk_parties()
+            ranked_results = simulation_state['ranked_results']
+            inputs = [ranked_results, candidates]
+
+            def build():
+                return create_ranked_choice_visualization(
+                    ranked_results, candidates)
         else:
-            return jsonify(
-                {'error': 'Chart generation failed or chart object is invalid'}), 500
+            return {'error': 'No ranked choice results available. '
+                             'Run a ranked choice election first.'}, 404
+
+    elif chart_type == 'voter-profiles':
+        voter_profiles = get_voter_profiles()
+        inputs = voter_profiles
+
+        def build():
+            return create_voter_profile_heatmap(voter_profiles)
+
+    elif chart_type == 'first-preferences':
+        candidates = get_uk_parties()
+        voter_profiles = get_voter_profiles()
+        # Chart the ballots of the last election unless a seed is given; a
+        # given seed is only used for this chart
+        if seed is None:
+            seed = get_ballot_seed(simulation_state['ballot_seed'])
+        seed = int(seed)
+        inputs = ballots_key(candidates, voter_profiles, seed)
+
+        def build():
+            return create_first_preferences_pie_chart(
+                get_election_ballots(candidates, voter_profiles, seed), candidates)
+
+    else:
+        return {'error': f'Unknown chart type: {chart_type}'}, 404
+
+    def render():
+        # Charts are stored as figure JSON; browsers draw them with the
+        # shared plotly.js bundle
+        chart = build()
+        if chart is None or not hasattr(chart, 'to_json'):
+            return None
+        return chart.to_json().encode('utf-8')
+
+    chart_id = chart_store.get_or_render(cache_key('chart', chart_type, inputs), render)
+    if chart_id is not None:
+        # Return JSON with chart URLs instead of HTML
+        return {
+            'success': True,
+            'chart_url': url_for('serve_chart', chart_id=chart_id),
+            'figure_url': url_for('api_chart_figure', chart_id=chart_id)
+        }, 200
+    else:
+        return {'error': 'Chart generation failed or chart object is invalid'}, 500
+
+
+@app.route('/api/generate-chart/<chart_type>')
+def api_generate_chart(chart_type):
+    """Generate and return chart data."""
+    try:
+        # Rendered on the chart pool, which bounds its run time
+        job = run_job(generate_chart, chart_type, request.args.get('seed', type=int),
+                      kind=f'chart:{chart_type}', pool=job_pools['charts'])
+        if job.status != DONE:
+            return job_error(job)
+        payload, status = job.result
+        return jsonify(payload), status
+
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 429
 
     except Exception as e:
         import traceback
@@ -489,19 +692,201 @@ def api_generate_chart(chart_type):
 
 @app.route('/chart/<chart_id>')
 def serve_chart(chart_id):
-    """Serve cached chart HTML."""
-    if chart_id in chart_cache:
-        return Response(chart_cache[chart_id], mimetype='text/html')
+    """Serve a minimal page drawing a cached chart."""
+    if chart_store.get(chart_id) is not None:
+        return render_template(
+            'chart.html', figure_url=url_for('api_chart_figure', chart_id=chart_id))
     else:
         return "Chart not found", 404
 
 
+@app.route('/api/chart-figure/<chart_id>')
+def api_chart_figure(chart_id):
+    """Serve the figure JSON of a cached chart."""
+    content = chart_store.get(chart_id)
+    if content is not None:
+        return Response(content, mimetype='application/json')
+    else:
+        return jsonify({'error': 'Chart not found'}), 404
+
+
+# Rules whose count can take minutes on larger elections
+SLOW_RULES = {'kemeny_young', 'dodgson', 'young'}
+
+
+def make_job_pool(workers):
+    """Job pool with the queue limit and timeout from the environment."""
+    return JobPool(
+        workers=workers,
+        max_queue=int(os.environ.get('JOB_MAX_QUEUE', DEFAULT_MAX_QUEUE)),
+        timeout=float(os.environ.get('JOB_TIMEOUT', DEFAULT_TIMEOUT)))
+
+
+# Elections and charts run on these pools instead of in the request thread.
+# Slow rules and charts each get their own workers, so a stuck Kemeny-Young
+# count never holds up the other rules or the charts
+job_pools = {
+    'rules': make_job_pool(int(os.environ.get('JOB_WORKERS', DEFAULT_WORKERS))),
+    'slow-rules': make_job_pool(int(os.environ.get('SLOW_JOB_WORKERS', 1))),
+    'charts': make_job_pool(int(os.environ.get('CHART_JOB_WORKERS', DEFAULT_WORKERS))),
+}
+
+
+def rule_pool(rule):
+    """The job pool that runs a ranking rule."""
+    return job_pools['slow-rules' if rule in SLOW_RULES else 'rules']
+
+
+def find_job(job_id):
+    """The pool running a job and the job, or (None, None) if unknown."""
+    for pool in job_pools.values():
+        job = pool.get(job_id)
+        if job is not None:
+            return pool, job
+    return None, None
+
+
+def job_payload(job):
+    """
+    Job status with the URLs to follow it.
+
+    ``success`` is False once the job has failed, timed out or been
+    cancelled; ``status`` tells a pending or running job from a done one.
+    """
+    payload = job.to_dict()
+    payload['success'] = job.status not in (FAILED, TIMED_OUT, CANCELLED)
+    payload['status_url'] = url_for('api_job_status', job_id=job.id)
+    payload['events_url'] = url_for('api_job_events', job_id=job.id)
+    payload['cancel_url'] = url_for('api_cancel_job', job_id=job.id)
+    return payload
+
+
+def job_error(job):
+    """Error response for a job that failed, timed out or was cancelled."""
+    status = 504 if job.status == TIMED_OUT else 500
+    return jsonify({'success': False, 'error': job.error, 'job_id': job.id,
+                    'status': job.status}), status
+
+
+def run_job(func, *args, kind, pool):
+    """
+    Run work for a synchronous endpoint on a job pool and wait for it.
+
+    The work gets the pool's timeout and queue limit like any other job.
+    Returns the finished job; raises JobQueueFull when the queue is full.
+    """
+    job = pool.submit(copy_current_request_context(func), *args, kind=kind)
+    return pool.wait(job.id)
+
+
+def submit_job(func, *args, kind, pool, timeout=None):
+    """Queue work for a job pool and answer with its job id at once."""
+    # Requested timeouts can shorten the pool's limit but not extend it
+    if timeout is not None:
+        timeout = min(float(timeout), pool.timeout)
+    try:
+        # Jobs keep a copy of the request context so they can build URLs
+        job = pool.submit(copy_current_request_context(func), *args,
+                          kind=kind, timeout=timeout)
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 429
+    return jsonify(job_payload(job)), 202
+
+
+def ranked_choice_job(rule, seed):
+    """Run a ranking rule for a job and keep its results for the charts."""
+    results = run_ranked_rule(rule, get_uk_parties(), get_voter_profiles(), seed)
+    simulation_state['ranked_results'] = results
+    simulation_state['current_round'] = len(results.round_details)
+    return {'success': True, 'seed': seed, 'results': format_ranked_results(results)}
+
+
+def chart_job(chart_type, seed):
+    """Generate a chart for a job."""
+    payload, status = generate_chart(chart_type, seed)
+    if status != 200:
+        raise RuntimeError(payload['error'])
+    return payload
+
+
+@app.route('/api/jobs/ranked-choice', methods=['POST'])
+def api_submit_ranked_choice_job():
+    """Start a ranked choice election in the background."""
+    try:
+        data = request.get_json() or {}
+        seed = get_ballot_seed(data.get('seed'))
+        rule = data.get('rule', 'instant_runoff')
+        return submit_job(ranked_choice_job, rule, seed, kind='ranked-choice',
+                          pool=rule_pool(rule), timeout=data.get('timeout'))
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/jobs/chart/<chart_type>', methods=['POST'])
+def api_submit_chart_job(chart_type):
+    """Start generating a chart in the background."""
+    try:
+        data = request.get_json(silent=True) or {}
+        return submit_job(chart_job, chart_type, data.get('seed'),
+                          kind=f'chart:{chart_type}', pool=job_pools['charts'],
+                          timeout=data.get('timeout'))
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/jobs')
+def api_jobs():
+    """Queue depth, limits and job counts of each job pool."""
+    stats = {name: pool.stats() for name, pool in job_pools.items()}
+    return jsonify({'success': True, 'results': stats})
+
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    """Poll a job; the result is included once it is done."""
+    _, job = find_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify(job_payload(job))
+
+
+@app.route('/api/jobs/<job_id>/events')
+def api_job_events(job_id):
+    """Stream a job's status changes as server-sent events until it finishes."""
+    pool, _ = find_job(job_id)
+    if pool is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    def stream():
+        for job in pool.watch(job_id):
+            if job is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield f"event: status\ndata: {app.json.dumps(job.to_dict())}\n\n"
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_job(job_id):
+    """Cancel a job that has not finished."""
+    pool, job = find_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    cancelled = pool.cancel(job_id)
+    return jsonify({'success': cancelled, 'job_id': job_id, 'status': job.status})
+
+
 if __name__ == '__main__':
     # Create templates and static directories if they don't exist
     os.makedirs('templates', exist_ok=True)
     os.makedirs('static', exist_ok=True)
     os.makedirs('static/css', exist_ok=True)
     os.makedirs('static/js', exist_ok=True)
+    install_static_plotly_js()
 
     print("🌐 Starting UK Weighted Voting System Web Interface...")
     print("📊 Access the application at: http://localhost:5000")
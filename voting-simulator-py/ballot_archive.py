@@ -0,0 +1,211 @@
+"""
+Binary ballot archives opened through ``numpy.memmap``.
+
+Parsing text ballots again for every analysis is slow, so ballots can be
+stored once in a compact binary file and reopened instantly: the ballot
+data is mapped into memory, not read. Counting rules page the rows in block
+by block; instant runoff and Coombs still keep O(rows) state in memory, see
+RunoffCount.
+
+Layout (little-endian)::
+
+    magic        8s   b"VSBALLOT"
+    version      u2
+    kind         u1   0 = ballot rows, 1 = (ranking, count) table
+    itemsize     u1   bytes per candidate index (1, 2 or 4)
+    depth        u4   rank positions per row
+    candidates   u4   number of candidates
+    rows         u8   rows stored
+    meta_len     u4   length of the JSON candidate list that follows
+    data_offset  u8   start of the row data, a multiple of 64
+
+Ballot rows are a (rows x depth) array of candidate indices padded with
+UNRANKED. Table rows are records of an int64 count followed by the ranking.
+The row count in the header is rewritten only after appended data is on
+disk, so an interrupted append leaves the archive readable as it was.
+"""
+
+import json
+import os
+import struct
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from vote_types import Candidate
+from ballots import (
+    BLOCK_ROWS, BallotMatrix, BallotProfile, RankedBallots, UNRANKED,
+    as_ballot_matrix, rank_dtype
+)
+
+MAGIC = b"VSBALLOT"
+VERSION = 1
+
+# Ballot kinds
+ROWS = "rows"
+TABLE = "table"
+KINDS = (ROWS, TABLE)
+
+_HEADER = struct.Struct("<8sHBBIIQIQ")
+_ROWS_FIELD = struct.calcsize("<8sHBBII")   # byte offset of ``rows``
+_ALIGN = 64
+
+
+@dataclass
+class ArchiveHeader:
+    version: int
+    kind: str
+    candidates: List[Candidate]
+    depth: int
+    rank_dtype: np.dtype
+    rows: int
+    data_offset: int
+
+    @property
+    def record_dtype(self) -> np.dtype:
+        """dtype of one stored row"""
+        if self.kind == ROWS:
+            return np.dtype((self.rank_dtype, (self.depth,)))
+        return np.dtype([("count", "<i8"), ("ranks", self.rank_dtype, (self.depth,))])
+
+
+def read_header(path: str) -> ArchiveHeader:
+    """Parse the header of a ballot archive"""
+    with open(path, "rb") as f:
+        raw = f.read(_HEADER.size)
+        if len(raw) < _HEADER.size:
+            raise ValueError(f"{path!r} is not a ballot archive")
+        (magic, version, kind, itemsize, depth, m, rows, meta_len,
+         offset) = _HEADER.unpack(raw)
+        if magic != MAGIC:
+            raise ValueError(f"{path!r} is not a ballot archive")
+        if version > VERSION:
+            raise ValueError(f"ballot archive version {version} is newer than "
+                             f"the supported version {VERSION}")
+        meta = json.loads(f.read(meta_len).decode("utf-8"))
+    candidates = [Candidate(id=c["id"], name=c["name"]) for c in meta["candidates"]]
+    if len(candidates) != m:
+        raise ValueError(f"{path!r} has a corrupt candidate list")
+    return ArchiveHeader(version=version, kind=KINDS[kind], candidates=candidates,
+                         depth=depth, rank_dtype=np.dtype(f"<i{itemsize}"),
+                         rows=rows, data_offset=offset)
+
+
+def create_archive(
+        path: str,
+        candidates: Sequence[Candidate],
+        kind: str = ROWS,
+        depth: Optional[int] = None) -> ArchiveHeader:
+    """
+    Write an empty archive for ``candidates``, replacing any existing file.
+
+    ``depth`` defaults to the number of candidates, enough for complete
+    rankings.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"unknown ballot archive kind {kind!r}")
+    candidates = list(candidates)
+    depth = len(candidates) if depth is None else depth
+    dtype = np.dtype(rank_dtype(len(candidates))).newbyteorder("<")
+    meta = json.dumps({"candidates": [{"id": c.id, "name": c.name}
+                                      for c in candidates]}).encode("utf-8")
+    offset = -(-(_HEADER.size + len(meta)) // _ALIGN) * _ALIGN
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, KINDS.index(kind), dtype.itemsize,
+                             depth, len(candidates), 0, len(meta), offset))
+        f.write(meta)
+        f.write(b"\0" * (offset - _HEADER.size - len(meta)))
+    return read_header(path)
+
+
+def append_archive(path: str, ballots: RankedBallots) -> int:
+    """
+    Append ballots to an archive in bulk, one block at a time.
+
+    Ballots over other candidates are restricted to the archive's
+    candidates. Returns the number of rows written. Appending to a table
+    may repeat rankings already stored; every rule weights rows by their
+    counts, so results are unaffected.
+    """
+    header = read_header(path)
+    bm = as_ballot_matrix(header.candidates, ballots)
+    if bm.depth > header.depth and (bm.ranks[:, header.depth:] != UNRANKED).any():
+        raise ValueError(f"ballots rank {bm.depth} candidates but the archive "
+                         f"stores at most {header.depth}")
+    record = header.record_dtype
+    written = 0
+    with open(path, "r+b") as f:
+        f.seek(header.data_offset + header.rows * record.itemsize)
+        for ranks, counts in bm.blocks():
+            block = np.full((len(ranks), header.depth), UNRANKED,
+                            dtype=header.rank_dtype)
+            width = min(bm.depth, header.depth)
+            block[:, :width] = ranks[:, :width]
+            if header.kind == ROWS:
+                for voters in _voter_rows(block, counts):
+                    f.write(np.ascontiguousarray(voters).tobytes())
+                    written += len(voters)
+            else:
+                rows = np.zeros(len(block), dtype=record)
+                rows["count"] = counts
+                rows["ranks"] = block
+                f.write(rows.tobytes())
+                written += len(rows)
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(_ROWS_FIELD)
+        f.write(struct.pack("<Q", header.rows + written))
+    return written
+
+
+def _voter_rows(block: np.ndarray, counts: np.ndarray):
+    # Expand weighted rows to one row per voter, a bounded piece at a time
+    if int(counts.sum()) <= 4 * BLOCK_ROWS:
+        yield np.repeat(block, counts, axis=0)
+        return
+    for row, count in zip(block, counts.tolist()):
+        for start in range(0, count, BLOCK_ROWS):
+            yield np.broadcast_to(row, (min(BLOCK_ROWS, count - start), len(row)))
+
+
+def write_archive(
+        path: str,
+        ballots: BallotMatrix,
+        kind: Optional[str] = None) -> ArchiveHeader:
+    """
+    Save a ballot matrix as a new archive.
+
+    A BallotProfile is stored as a (ranking, count) table by default, any
+    other matrix as ballot rows.
+    """
+    if kind is None:
+        kind = TABLE if isinstance(ballots, BallotProfile) else ROWS
+    create_archive(path, ballots.candidates, kind, depth=ballots.depth)
+    append_archive(path, ballots)
+    return read_header(path)
+
+
+def open_archive(path: str) -> BallotMatrix:
+    """
+    Map an archive as a read-only BallotMatrix without reading its rows.
+
+    Ballot rows open as a BallotMatrix whose counts are a zero-stride view of
+    ones; a table opens as a BallotProfile.
+    """
+    header = read_header(path)
+    if header.kind == ROWS:
+        shape = (header.rows, header.depth)
+        ranks = _map(path, header, header.rank_dtype, shape)
+        counts = np.broadcast_to(np.int64(1), (header.rows,))
+        return BallotMatrix(header.candidates, ranks, counts)
+    data = _map(path, header, header.record_dtype, (header.rows,))
+    return BallotProfile(header.candidates, data["ranks"], data["count"])
+
+
+def _map(path: str, header: ArchiveHeader, dtype: np.dtype, shape) -> np.ndarray:
+    # np.memmap cannot map zero bytes
+    if not int(np.prod(shape)) * dtype.itemsize:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=header.data_offset,
+                     shape=shape)
@@ -0,0 +1,215 @@
+"""
+Streaming readers for ballot exports too large to load at once.
+
+Files are read in chunks of at most ``chunk_rows`` ballots and each chunk is
+handed over as a NumPy block, so memory stays bounded by the chunk size
+whatever the file size. The ``tally_*_file`` helpers fold every chunk into a
+mergeable tally from tallies.py in one pass.
+
+Formats, chosen by file suffix (``.csv``, ``.jsonl``/``.ndjson``, optionally
+followed by ``.gz``) or by ``fmt``:
+
+* Ranked CSV: one ballot per line, candidate ids in order of preference.
+  Empty cells are ignored; a blank line is an empty ballot.
+* Ranked JSONL: one ballot per line, either a list of candidate ids or an
+  object ``{"ranking": [...], "count": n}`` for n identical ballots.
+* Score CSV: a header line of candidate ids, then one line of scores per
+  ballot. Empty cells score 0.
+* Score JSONL: one object per line mapping candidate ids to scores.
+* Graded ballots use the score layouts with grade strings for majority
+  judgment.
+
+Candidate ids not in ``candidates`` are ignored, as in BallotMatrix.
+"""
+
+import csv
+import gzip
+import json
+from collections import Counter
+from functools import partial
+from itertools import islice
+from typing import IO, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from vote_types import Candidate
+from ballots import BLOCK_ROWS, BallotProfile
+from tallies import GradeTally, RankedTally, ScoreTally
+
+FORMATS = ("csv", "jsonl")
+
+
+def detect_format(path: str) -> str:
+    """Ballot file format implied by the file name"""
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"cannot tell the ballot format of {path!r}; pass fmt")
+
+
+def _open(path: str) -> IO[str]:
+    if path.lower().endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _resolve(path: str, fmt: Optional[str]) -> str:
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown ballot format {fmt!r}")
+    return fmt
+
+
+def _ranked_jsonl(line: str):
+    # A ballot line as (ranking, count)
+    ballot = json.loads(line)
+    if isinstance(ballot, dict):
+        return tuple(ballot["ranking"]), int(ballot.get("count", 1))
+    return tuple(ballot), 1
+
+
+def read_ranked(
+        path: str,
+        candidates: Sequence[Candidate],
+        chunk_rows: int = BLOCK_ROWS,
+        fmt: Optional[str] = None) -> Iterator[BallotProfile]:
+    """Yield the ranked ballots of ``path`` as BallotProfile chunks"""
+    fmt = _resolve(path, fmt)
+    with _open(path) as f:
+        if fmt == "csv":
+            reader = csv.reader(f)
+            while True:
+                lines = list(islice(reader, chunk_rows))
+                if not lines:
+                    break
+                # Identical rankings are collapsed before encoding
+                chunk = Counter(map(tuple, map(partial(filter, None), lines)))
+                yield BallotProfile.from_ranking_counts(candidates, chunk.items())
+        else:
+            lines = (line for line in f if line.strip())
+            while True:
+                ballots = list(map(_ranked_jsonl, islice(lines, chunk_rows)))
+                if not ballots:
+                    break
+                chunk: Counter = Counter()
+                for ranking, count in ballots:
+                    chunk[ranking] += count
+                yield BallotProfile.from_ranking_counts(candidates, chunk.items())
+
+
+def read_scores(
+        path: str,
+        candidates: Sequence[Candidate],
+        chunk_rows: int = BLOCK_ROWS,
+        fmt: Optional[str] = None) -> Iterator[np.ndarray]:
+    """
+    Yield the cardinal ballots of ``path`` as (rows x num_candidates) float
+    arrays, columns in ``candidates`` order
+    """
+    fmt = _resolve(path, fmt)
+    index = {c.id: i for i, c in enumerate(candidates)}
+    m = len(candidates)
+    with _open(path) as f:
+        if fmt == "csv":
+            reader = csv.reader(f)
+            header = next(reader, [])
+            fields = [j for j, cid in enumerate(header) if cid in index]
+            columns = [index[header[j]] for j in fields]
+            lines = (line for line in reader if line)
+            while True:
+                batch = list(islice(lines, chunk_rows))
+                if not batch:
+                    break
+                cells = np.array([[line[j] if j < len(line) else "" for j in fields]
+                                  for line in batch], dtype=str)
+                cells = cells.reshape(len(batch), len(fields))
+                cells[cells == ""] = "0"
+                block = np.zeros((len(batch), m), dtype=np.float64)
+                block[:, columns] = cells.astype(np.float64)
+                yield block
+        else:
+            lines = (line for line in f if line.strip())
+            while True:
+                batch = list(map(json.loads, islice(lines, chunk_rows)))
+                if not batch:
+                    break
+                block = np.zeros((len(batch), m), dtype=np.float64)
+                for row, ballot in enumerate(batch):
+                    for cid, score in ballot.items():
+                        if cid in index:
+                            block[row, index[cid]] = float(score)
+                yield block
+
+
+def read_grades(
+        path: str,
+        chunk_rows: int = BLOCK_ROWS,
+        fmt: Optional[str] = None) -> Iterator[List[Dict[str, str]]]:
+    """
+    Yield graded ballots of ``path`` as lists of {candidate id: grade}.
+    Files use the score layouts with grade strings; empty cells are
+    ungraded.
+    """
+    fmt = _resolve(path, fmt)
+    with _open(path) as f:
+        if fmt == "csv":
+            reader = csv.reader(f)
+            header = next(reader, [])
+            lines = (line for line in reader if line)
+            ballots = ({cid: grade for cid, grade in zip(header, line) if grade}
+                       for line in lines)
+        else:
+            ballots = (json.loads(line) for line in f if line.strip())
+        while True:
+            chunk = list(islice(ballots, chunk_rows))
+            if not chunk:
+                break
+            yield chunk
+
+
+def tally_ranked_file(
+        path: str,
+        candidates: Sequence[Candidate],
+        chunk_rows: int = BLOCK_ROWS,
+        fmt: Optional[str] = None) -> RankedTally:
+    """
+    Position and pairwise counts of every ranked ballot in ``path``.
+
+    Pass ``tally.summary()`` to plurality, Borda, the other positional rules
+    or the Condorcet family to run them over the whole file.
+    """
+    tally = RankedTally(candidates)
+    for chunk in read_ranked(path, candidates, chunk_rows, fmt):
+        tally.update(chunk)
+    return tally
+
+
+def tally_score_file(
+        path: str,
+        candidates: Sequence[Candidate],
+        chunk_rows: int = BLOCK_ROWS,
+        fmt: Optional[str] = None) -> ScoreTally:
+    """
+    Score sums, approvals and score preferences of every cardinal ballot in
+    ``path``, accepted directly by the approval, score and STAR rules
+    """
+    tally = ScoreTally(candidates)
+    for block in read_scores(path, candidates, chunk_rows, fmt):
+        tally.update(block)
+    return tally
+
+
+def tally_grade_file(
+        path: str,
+        candidates: Sequence[Candidate],
+        chunk_rows: int = BLOCK_ROWS,
+        fmt: Optional[str] = None) -> GradeTally:
+    """Grade histograms of every graded ballot in ``path``, for majority judgment"""
+    tally = GradeTally(candidates)
+    for chunk in read_grades(path, chunk_rows, fmt):
+        tally.update(chunk)
+    return tally
@@ -0,0 +1,398 @@
+"""
+Compact ballot representations shared by the ranking-based voting rules.
+
+Candidate ids are interned once into small integer indices and the rankings
+are stored in a contiguous NumPy array, so the rules can tally with integer
+arithmetic instead of hashing candidate id strings in their inner loops.
+"""
+
+import hashlib
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from vote_types import Candidate, Ballot
+
+# Fills the unused rank positions of a truncated ballot
+UNRANKED = -1
+
+# Rows processed per step by the vectorized accumulators, bounding the size
+# of their temporaries regardless of the electorate size
+BLOCK_ROWS = 1 << 16
+
+# Upper bound on (rows x candidates x candidates) cells compared at once when
+# accumulating pairwise preferences
+PAIRWISE_BLOCK_CELLS = 1 << 22
+
+
+def rank_dtype(num_candidates: int) -> type:
+    """Smallest signed integer type able to hold every candidate index"""
+    if num_candidates <= np.iinfo(np.int8).max:
+        return np.int8
+    if num_candidates <= np.iinfo(np.int16).max:
+        return np.int16
+    return np.int32
+
+
+class BallotMatrix:
+    """
+    Ranked ballots encoded as an (n_ballots x depth) integer array.
+
+    Row ``i`` holds the candidate indices of ballot ``i`` in order of
+    preference. Positions past the end of a truncated ballot hold
+    ``UNRANKED``. ``counts[i]`` is the number of voters who cast row ``i``
+    (one each unless given). ``index`` maps a candidate id to its column
+    index in O(1).
+
+    A matrix is treated as immutable once built: statistics derived from it
+    are cached on the instance and shared by every rule it is passed to.
+    """
+
+    def __init__(
+            self,
+            candidates: Sequence[Candidate],
+            ranks: np.ndarray,
+            counts: Optional[np.ndarray] = None):
+        self.candidates: List[Candidate] = list(candidates)
+        self.ids: List[str] = [c.id for c in self.candidates]
+        self.index: Dict[str, int] = {cid: i for i, cid in enumerate(self.ids)}
+        self.ranks = ranks
+        if counts is None:
+            counts = np.ones(ranks.shape[0], dtype=np.int64)
+        self.counts = counts
+        self._cache: Dict[str, Any] = {}
+
+    @classmethod
+    def from_ballots(
+            cls,
+            candidates: Sequence[Candidate],
+            ballots: Sequence[Ballot]) -> "BallotMatrix":
+        """Intern list-of-ids ballots; ids not in ``candidates`` are dropped"""
+        index = {c.id: i for i, c in enumerate(candidates)}
+        encoded = [[index[cid] for cid in ballot if cid in index]
+                   for ballot in ballots]
+        return cls(candidates, _encode_rows(encoded, len(candidates)))
+
+    def __len__(self) -> int:
+        """Number of stored rows (distinct ballot types for a profile)"""
+        return self.ranks.shape[0]
+
+    @property
+    def num_ballots(self) -> int:
+        """Number of voters represented, counting multiplicities"""
+        return int(self.counts.sum())
+
+    @property
+    def num_candidates(self) -> int:
+        return len(self.candidates)
+
+    @property
+    def depth(self) -> int:
+        """Number of rank positions stored per ballot"""
+        return self.ranks.shape[1]
+
+    def memo(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Return the statistic cached under ``key``, computing it once"""
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def fingerprint(self) -> str:
+        """
+        Content hash of the candidate ids, rankings and counts.
+
+        Hashing reads every row once, so on a memory-mapped archive the
+        first call scans the whole file.
+        """
+        return self.memo("fingerprint", self._hash_contents)
+
+    def _hash_contents(self) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update("\x1f".join(self.ids).encode("utf-8"))
+        digest.update(str((self.ranks.dtype.str, self.depth)).encode("ascii"))
+        for ranks, counts in self.blocks():
+            digest.update(np.ascontiguousarray(ranks))
+            digest.update(np.ascontiguousarray(counts, dtype=np.int64))
+        return digest.hexdigest()
+
+    def blocks(self, rows: int = BLOCK_ROWS):
+        """Yield (ranks, counts) slices of at most ``rows`` rows"""
+        for start in range(0, len(self), rows):
+            stop = start + rows
+            yield self.ranks[start:stop], self.counts[start:stop]
+
+    def position_counts(self) -> np.ndarray:
+        """
+        (num_candidates x depth) matrix of voters ranking each candidate at
+        each position.
+
+        Built once with bincount accumulation; any positional rule is then a
+        single matrix-vector product against it.
+        """
+        return self.memo("position_counts", self._count_positions)
+
+    def _count_positions(self) -> np.ndarray:
+        m, depth = self.num_candidates, self.depth
+        totals = np.zeros((m, depth), dtype=np.int64)
+        for ranks, counts in self.blocks():
+            weights = counts.astype(np.float64)
+            for j in range(depth):
+                # Shifted by one so UNRANKED falls into bin 0
+                column = ranks[:, j].astype(np.intp) + 1
+                totals[:, j] += np.rint(np.bincount(
+                    column, weights=weights, minlength=m + 1)[1:]).astype(np.int64)
+        return totals
+
+    def pairwise_counts(self) -> np.ndarray:
+        """
+        (num_candidates x num_candidates) matrix ``N`` where ``N[x, y]`` is
+        the number of voters ranking x above y.
+
+        Each ballot is turned into a position vector once, with unranked
+        candidates tied below every ranked one, and blocks of ballots are
+        compared by broadcasting, for O(n * m^2) work overall.
+        """
+        m = self.num_candidates
+        totals = np.zeros((m, m), dtype=np.int64)
+        rows = max(1, PAIRWISE_BLOCK_CELLS // max(1, m * m))
+        for ranks, counts in self.blocks(rows):
+            pos = rank_positions(ranks, m)
+            prefers = pos[:, :, None] < pos[:, None, :]
+            totals += np.tensordot(counts, prefers, axes=(0, 0))
+        return totals
+
+    def candidate(self, cid: str) -> Candidate:
+        """Look up a candidate object by id"""
+        return self.candidates[self.index[cid]]
+
+    def rows(self) -> List[List[int]]:
+        """Each ballot as a list of candidate indices, sentinels stripped"""
+        return [[idx for idx in row if idx != UNRANKED]
+                for row in self.ranks.tolist()]
+
+    def weighted_rows(self) -> List[Tuple[List[int], int]]:
+        """Each stored row paired with the number of voters who cast it"""
+        return list(zip(self.rows(), self.counts.tolist()))
+
+    def to_ballots(self) -> List[Ballot]:
+        """Decode back to the legacy list-of-ids representation"""
+        return [[self.ids[idx] for idx in row] for row in self.rows()]
+
+    def restrict(self, candidates: Sequence[Candidate]) -> "BallotMatrix":
+        """
+        Re-encode the ballots over a subset of the candidates.
+
+        Candidates missing from ``candidates`` are struck from every ballot
+        and the remaining preferences move up, keeping their relative order.
+        """
+        mapping = np.full(self.num_candidates + 1, UNRANKED,
+                          dtype=rank_dtype(len(candidates)))
+        for new_idx, c in enumerate(candidates):
+            if c.id in self.index:
+                mapping[self.index[c.id]] = new_idx
+        # The sentinel indexes the last slot, which stays UNRANKED
+        mapped = mapping[self.ranks]
+        order = np.argsort(mapped == UNRANKED, axis=1, kind="stable")
+        compact = np.take_along_axis(mapped, order, axis=1)
+        depth = min(self.depth, len(candidates))
+        return BallotMatrix(candidates,
+                            np.ascontiguousarray(compact[:, :depth]),
+                            self.counts)
+
+    def reversed(self) -> "BallotMatrix":
+        """
+        The same ballots with each ranking read from last to first, as a new
+        in-memory rank array
+        """
+        lengths = (self.ranks != UNRANKED).sum(axis=1)
+        source = lengths[:, None] - 1 - np.arange(self.depth)
+        flipped = np.take_along_axis(self.ranks, np.maximum(source, 0), axis=1)
+        flipped[source < 0] = UNRANKED
+        return BallotMatrix(self.candidates, flipped, self.counts)
+
+
+class BallotProfile(BallotMatrix):
+    """
+    A BallotMatrix whose rows are distinct rankings.
+
+    Identical ballots are collapsed into a single row with its multiplicity
+    in ``counts``, so tallies cost O(distinct rankings) rather than
+    O(voters).
+    """
+
+    @classmethod
+    def from_ballots(
+            cls,
+            candidates: Sequence[Candidate],
+            ballots: Sequence[Ballot]) -> "BallotProfile":
+        """Collapse list-of-ids ballots into (ranking, count) pairs in one pass"""
+        index = {c.id: i for i, c in enumerate(candidates)}
+        tally = Counter(tuple(index[cid] for cid in ballot if cid in index)
+                        for ballot in ballots)
+        ranks = _encode_rows(list(tally), len(candidates))
+        return cls(candidates, ranks,
+                   np.fromiter(tally.values(), dtype=np.int64, count=len(tally)))
+
+    @classmethod
+    def from_ranking_counts(
+            cls,
+            candidates: Sequence[Candidate],
+            ranking_counts: Sequence[Tuple[Ballot, int]]) -> "BallotProfile":
+        """Build a profile from (ranking of ids, count) pairs"""
+        index = {c.id: i for i, c in enumerate(candidates)}
+        tally: Counter = Counter()
+        for ballot, count in ranking_counts:
+            tally[tuple(index[cid] for cid in ballot if cid in index)] += count
+        ranks = _encode_rows(list(tally), len(candidates))
+        return cls(candidates, ranks,
+                   np.fromiter(tally.values(), dtype=np.int64, count=len(tally)))
+
+    @classmethod
+    def from_matrix(cls, bm: BallotMatrix) -> "BallotProfile":
+        """Collapse the identical rows of an existing matrix"""
+        if not len(bm):
+            return cls(bm.candidates, bm.ranks, bm.counts)
+        if not bm.depth:
+            # Every row is the empty ranking
+            return cls(bm.candidates, bm.ranks[:1],
+                       np.array([bm.num_ballots], dtype=np.int64))
+        ranks, inverse = np.unique(bm.ranks, axis=0, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=bm.counts,
+                             minlength=len(ranks))
+        return cls(bm.candidates, ranks, counts.astype(np.int64))
+
+    def ranking_counts(self) -> List[Tuple[Ballot, int]]:
+        """The profile as (ranking of ids, count) pairs"""
+        return list(zip(self.to_ballots(), self.counts.tolist()))
+
+    def restrict(self, candidates: Sequence[Candidate]) -> "BallotProfile":
+        # Striking candidates can make distinct rankings identical
+        return BallotProfile.from_matrix(super().restrict(candidates))
+
+
+class RunoffCount:
+    """
+    Incremental elimination count over a BallotMatrix.
+
+    Ballots sit in per-candidate piles with a cursor to their current
+    preference. Eliminating a candidate only moves that candidate's pile on
+    to each ballot's next surviving preference, so the whole count advances
+    every cursor at most ``depth`` times: O(n*m) in total rather than
+    O(rounds*n*m) for rescanning every ballot each round.
+
+    Counting over ``bm.reversed()`` tracks each ballot's last surviving
+    preference instead of its first.
+
+    The cursors and piles take about 16 bytes per stored row, so memory
+    grows with the number of rows even when ``bm`` is a memory-mapped
+    archive.
+    """
+
+    def __init__(self, bm: BallotMatrix):
+        m = bm.num_candidates
+        self.bm = bm
+        # One extra slot so the UNRANKED sentinel (-1) indexes a dead entry
+        self.alive = np.ones(m + 1, dtype=bool)
+        self.alive[m] = False
+        self.remaining = list(range(m))
+        self.votes = np.zeros(m, dtype=np.int64)
+        self.piles: List[List[np.ndarray]] = [[] for _ in range(m)]
+        self.cursor = np.zeros(len(bm), dtype=np.int64)
+        self._advance(np.arange(len(bm)))
+
+    def tallies(self) -> Dict[int, int]:
+        """Current votes of each remaining candidate, by candidate index"""
+        return {idx: int(self.votes[idx]) for idx in self.remaining}
+
+    def eliminate(self, idx: int) -> None:
+        """Drop a candidate and transfer its pile"""
+        self.alive[idx] = False
+        self.remaining.remove(idx)
+        self.votes[idx] = 0
+        pile, self.piles[idx] = self.piles[idx], []
+        if pile:
+            self._advance(np.concatenate(pile))
+
+    def _advance(self, rows: np.ndarray) -> None:
+        # Step each row's cursor forward to its first surviving preference
+        ranks, depth = self.bm.ranks, self.bm.depth
+        cursor = self.cursor[rows]
+        choice = np.full(len(rows), UNRANKED, dtype=np.int64)
+        pending = np.arange(len(rows))
+        while len(pending):
+            pending = pending[cursor[pending] < depth]
+            picked = ranks[rows[pending], cursor[pending]].astype(np.int64)
+            settled = (picked == UNRANKED) | self.alive[picked]
+            choice[pending[settled]] = picked[settled]
+            pending = pending[~settled]
+            cursor[pending] += 1
+        self.cursor[rows] = cursor
+        # Exhausted ballots drop out of the count
+        live = choice != UNRANKED
+        self._pile(rows[live], choice[live])
+
+    def _pile(self, rows: np.ndarray, choice: np.ndarray) -> None:
+        m = self.bm.num_candidates
+        order = np.argsort(choice, kind="stable")
+        rows, choice = rows[order], choice[order]
+        self.votes += np.rint(np.bincount(
+            choice, weights=self.bm.counts[rows], minlength=m)).astype(np.int64)
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(choice, minlength=m))))
+        for idx in np.flatnonzero(np.diff(bounds)).tolist():
+            self.piles[idx].append(rows[bounds[idx]:bounds[idx + 1]])
+
+    def lowest(self) -> Optional[int]:
+        """
+        Candidate to eliminate: fewest votes, ties broken by the candidate
+        ID that comes first alphabetically
+        """
+        if not self.remaining:
+            return None
+        ids = self.bm.ids
+        return min(self.remaining, key=lambda idx: (self.votes[idx], ids[idx]))
+
+
+def rank_positions(ranks: np.ndarray, num_candidates: int) -> np.ndarray:
+    """
+    Invert rank rows into position vectors: entry [i, c] is the position of
+    candidate ``c`` on ballot ``i``. Unranked candidates share the position
+    one past the deepest rank, so they tie below every ranked candidate.
+    """
+    depth = ranks.shape[1]
+    pos = np.full((ranks.shape[0], num_candidates), depth,
+                  dtype=rank_dtype(num_candidates + 1))
+    rows, cols = np.nonzero(ranks != UNRANKED)
+    pos[rows, ranks[rows, cols]] = cols
+    return pos
+
+
+def _encode_rows(rows: Sequence[Sequence[int]], num_candidates: int) -> np.ndarray:
+    # Pack variable-length index rows into a sentinel-padded rank array
+    depth = min(max((len(row) for row in rows), default=0), num_candidates)
+    ranks = np.full((len(rows), depth), UNRANKED,
+                    dtype=rank_dtype(num_candidates))
+    for i, row in enumerate(rows):
+        ranks[i, :len(row)] = row[:depth]
+    return ranks
+
+
+# Every ranking-based rule accepts either representation
+RankedBallots = Union[Sequence[Ballot], BallotMatrix]
+
+
+def as_ballot_matrix(
+        candidates: Sequence[Candidate],
+        ballots: RankedBallots) -> BallotMatrix:
+    """
+    Legacy adapter: return ``ballots`` as a matrix over exactly ``candidates``.
+
+    Lists of candidate-id lists are collapsed into a BallotProfile; a matrix
+    built over a different candidate list is restricted to the given
+    candidates.
+    """
+    if isinstance(ballots, BallotMatrix):
+        if ballots.ids == [c.id for c in candidates]:
+            return ballots
+        return ballots.restrict(candidates)
+    return BallotProfile.from_ballots(candidates, ballots)
@@ -0,0 +1,152 @@
+"""
+Bounded store for rendered charts.
+
+A chart is stored under the hash of its rendered content, so identical
+figures share one entry however many times they are requested. Callers can
+also register the key of the inputs a chart was rendered from; a later
+request with the same inputs is answered with the stored chart id without
+rendering again. Entries expire ``ttl`` seconds after they were stored and
+the least recently used ones are evicted to stay within ``max_bytes``.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Set
+
+# Default byte budget and entry lifetime
+DEFAULT_MAX_BYTES = 32 << 20
+DEFAULT_TTL = 3600.0
+
+
+def content_id(content: bytes) -> str:
+    """Chart id of rendered chart content"""
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+@dataclass
+class _Chart:
+    content: bytes
+    expires: float
+
+
+class ChartStore:
+    """Thread-safe LRU + TTL store of rendered charts under a byte budget"""
+
+    def __init__(
+            self,
+            max_bytes: int = DEFAULT_MAX_BYTES,
+            ttl: float = DEFAULT_TTL,
+            clock: Callable[[], float] = time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._charts: "OrderedDict[str, _Chart]" = OrderedDict()
+        self._inputs: Dict[str, str] = {}           # inputs key -> chart id
+        self._aliases: Dict[str, Set[str]] = {}     # chart id -> inputs keys
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._charts)
+
+    def get(self, chart_id: str) -> Optional[bytes]:
+        """Content of a stored chart, or None if unknown or expired"""
+        with self._lock:
+            chart = self._live(chart_id)
+            if chart is None:
+                return None
+            self._charts.move_to_end(chart_id)
+            return chart.content
+
+    def put(self, content: bytes, inputs_key: Optional[str] = None) -> str:
+        """Store rendered content and return its chart id"""
+        chart_id = content_id(content)
+        with self._lock:
+            if chart_id in self._charts:
+                # Same figure as a stored chart: refresh it instead of duplicating
+                self._charts[chart_id].expires = self.clock() + self.ttl
+                self._charts.move_to_end(chart_id)
+            elif len(content) <= self.max_bytes:
+                self._charts[chart_id] = _Chart(content, self.clock() + self.ttl)
+                self._bytes += len(content)
+                self._evict()
+            if inputs_key is not None and chart_id in self._charts:
+                previous = self._inputs.get(inputs_key)
+                if previous is not None and previous != chart_id:
+                    self._aliases[previous].discard(inputs_key)
+                self._inputs[inputs_key] = chart_id
+                self._aliases.setdefault(chart_id, set()).add(inputs_key)
+        return chart_id
+
+    def lookup(self, inputs_key: str) -> Optional[str]:
+        """Id of the live chart rendered from ``inputs_key``, if any"""
+        with self._lock:
+            chart_id = self._inputs.get(inputs_key)
+            if chart_id is None or self._live(chart_id) is None:
+                self.misses += 1
+                return None
+            self._charts.move_to_end(chart_id)
+            self.hits += 1
+            return chart_id
+
+    def get_or_render(
+            self,
+            inputs_key: str,
+            render: Callable[[], Optional[bytes]]) -> Optional[str]:
+        """
+        Chart id for ``inputs_key``, rendering only when nothing is stored.
+        If ``render`` returns None nothing is stored and None is returned.
+        """
+        chart_id = self.lookup(inputs_key)
+        if chart_id is None:
+            self.renders += 1
+            content = render()
+            if content is not None:
+                chart_id = self.put(content, inputs_key)
+        return chart_id
+
+    def stats(self) -> Dict[str, object]:
+        """Hit/miss counters and memory use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "charts": len(self._charts),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "renders": self.renders,
+                "evictions": self.evictions,
+            }
+
+    def _live(self, chart_id: str) -> Optional[_Chart]:
+        # Caller holds the lock; expired charts are dropped when seen
+        chart = self._charts.get(chart_id)
+        if chart is not None and chart.expires <= self.clock():
+            self._drop(chart_id)
+            return None
+        return chart
+
+    def _evict(self) -> None:
+        now = self.clock()
+        expired = [cid for cid, chart in self._charts.items() if chart.expires <= now]
+        for chart_id in expired:
+            self._drop(chart_id)
+        while self._bytes > self.max_bytes:
+            self._drop(next(iter(self._charts)))
+
+    def _drop(self, chart_id: str) -> None:
+        chart = self._charts.pop(chart_id)
+        self._bytes -= len(chart.content)
+        self.evictions += 1
+        for inputs_key in self._aliases.pop(chart_id, ()):
+            self._inputs.pop(inputs_key, None)
@@ -1,5 +1,10 @@
-from typing import Dict, List, Union
-from vote_types import VoterProfile, Candidate, Ballot, Results, WeightCoefficients
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from vote_types import VoterProfile, Candidate, Results, WeightCoefficients
+from ballots import RankedBallots, RunoffCount, as_ballot_matrix
+from voters import ATTRIBUTES, Voters, VoterTable, as_voter_table
 
 
 def verify_voting_system():
@@ -35,53 +40,46 @@ def verify_voting_system():
 
 def run_election(
         candidates: List[Candidate],
-        ballots: List[Ballot],
+        ballots: RankedBallots,
         round_duration: int = 30) -> Results:
     """
     Run a ranked choice (single transferable vote) election with timed rounds.
 
     Args:
         candidates: List of candidate objects
-        ballots: List of voter preferences as ordered lists of candidate IDs
+        ballots: Voter preferences as ordered lists of candidate IDs or a
+            BallotMatrix
         round_duration: Duration of each round in seconds (default: 30)
 
     Returns:
         Results object with winner and round-by-round details
     """
-    if not candidates or not ballots:
+    if not candidates or not len(ballots):
         return Results(winner=None, round_details=[])
 
     print(
         f"\n🗳️  Starting Ranked Choice Election with {round_duration}-second rounds...")
 
-    # Build a lookup for candidates by ID
-    candidate_map = {c.id: c for c in candidates}
+    bm = as_ballot_matrix(candidates, ballots)
+    count = RunoffCount(bm)
 
     # Track rounds
     rounds = []
-    remaining_candidates = set(c.id for c in candidates)
 
     # Continue until we have a winner
     round_num = 1
-    while remaining_candidates and len(remaining_candidates) > 1:
+    while len(count.remaining) > 1:
         print(f"\n⏱️  Round {round_num} starting... ({round_duration} seconds)")
 
-        # Count first preferences of all valid ballots
-        tallies = {cid: 0 for cid in remaining_candidates}
-
-        for ballot in ballots:
-            # Find the first preference that's still in the running
-            for choice in ballot:
-                if choice in remaining_candidates:
-                    tallies[choice] += 1
-                    break
+        # First preferences of all valid ballots, kept up to date by the count
+        tallies = {bm.ids[idx]: votes for idx, votes in count.tallies().items()}
 
         # Display real-time results
         total_votes = sum(tallies.values())
         print(f"   Current standings:")
         sorted_tallies = sorted(tallies.items(), key=lambda x: x[1], reverse=True)
         for cid, votes in sorted_tallies:
-            candidate_name = candidate_map[cid].name
+            candidate_name = bm.candidate(cid).name
             percentage = (votes / total_votes) * 100 if total_votes > 0 else 0
             print(f"   • {candidate_name}: {votes} votes ({percentage:.1f}%)")
 
@@ -95,42 +93,35 @@ def run_election(
         for cid, votes in tallies.items():
             if votes > total_votes / 2:                # We have a winner
                 rounds.append(round_detail)
-                winner = candidate_map.get(cid)
-                if winner:
-                    print(
-                        f"\n🎉 WINNER: {winner.name} with {votes} votes ({votes / total_votes * 100:.1f}%)"
-                    )
+                winner = bm.candidate(cid)
+                print(
+                    f"\n🎉 WINNER: {winner.name} with {votes} votes "
+                    f"({votes / total_votes * 100:.1f}%)"
+                )
                 return Results(
                     winner=winner,
                     round_details=rounds
                 )
-          # No winner yet, eliminate lowest candidate
-        min_votes = float('inf')
-        to_eliminate = None
 
-        # Find the candidate with the lowest votes
+        # No winner yet, eliminate lowest candidate
         # In case of tie, eliminate the candidate who appears first alphabetically
-        candidates_by_votes = sorted(tallies.items(), key=lambda x: (x[1], x[0]))
-        if candidates_by_votes:
-            to_eliminate = candidates_by_votes[0][0]
-            min_votes = candidates_by_votes[0][1]
-
-        if to_eliminate:
-            eliminated_name = candidate_map[to_eliminate].name
-            round_detail["eliminated"] = to_eliminate
-            remaining_candidates.remove(to_eliminate)
-            print(f"   ❌ ELIMINATED: {eliminated_name} ({min_votes} votes)")
+        to_eliminate = count.lowest()
+        if to_eliminate is not None:
+            eliminated_id = bm.ids[to_eliminate]
+            round_detail["eliminated"] = eliminated_id
+            count.eliminate(to_eliminate)
+            print(f"   ❌ ELIMINATED: {bm.candidates[to_eliminate].name} "
+                  f"({tallies[eliminated_id]} votes)")
 
         rounds.append(round_detail)
         round_num += 1
-      # If we exit the loop, either we have a single candidate left, or we're
-      # out of candidates
+
+    # If we exit the loop, either we have a single candidate left, or we're
+    # out of candidates
     winner = None
-    if remaining_candidates:
-        winner_id = list(remaining_candidates)[0]
-        winner = candidate_map.get(winner_id)
-        if winner:
-            print(f"\n🎉 WINNER: {winner.name} (last remaining candidate)")
+    if count.remaining:
+        winner = bm.candidates[count.remaining[0]]
+        print(f"\n🎉 WINNER: {winner.name} (last remaining candidate)")
 
     return Results(
         winner=winner,
@@ -138,39 +129,44 @@ def run_election(
     )
 
 
-def run_election_web(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def run_election_web(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     """
     Run a ranked choice election optimized for web interface (no delays).
 
     Args:
         candidates: List of candidate objects
-        ballots: List of voter preferences as ordered lists of candidate IDs
+        ballots: Voter preferences as ordered lists of candidate IDs or a
+            BallotMatrix
 
     Returns:
         Results object with winner and round-by-round details
     """
-    if not candidates or not ballots:
+    if not candidates or not len(ballots):
         return Results(winner=None, round_details=[])
 
-    # Build a lookup for candidates by ID
-    candidate_map = {c.id: c for c in candidates}
+    # Intern candidate IDs once and collapse identical ballots; the count
+    # then only moves the ballots of each eliminated candidate
+    bm = as_ballot_matrix(candidates, ballots)
+    return run_runoff_rounds(RunoffCount(bm))
+
+
+def run_runoff_rounds(count: RunoffCount) -> Results:
+    """
+    Eliminate candidates one round at a time until one has a majority.
+
+    ``count`` supplies the tallies and transfers: a RunoffCount, or any
+    object with the same ``bm``, ``remaining``, ``tallies()``, ``lowest()``
+    and ``eliminate()`` members such as a sharded count.
+    """
+    bm = count.bm
 
     # Track rounds
     rounds = []
-    remaining_candidates = set(c.id for c in candidates)
 
     # Continue until we have a winner
     round_num = 1
-    while remaining_candidates and len(remaining_candidates) > 1:
-        # Count first preferences of all valid ballots
-        tallies = {cid: 0 for cid in remaining_candidates}
-
-        for ballot in ballots:
-            # Find the first preference that's still in the running
-            for choice in ballot:
-                if choice in remaining_candidates:
-                    tallies[choice] += 1
-                    break
+    while len(count.remaining) > 1:
+        tallies = {bm.ids[idx]: votes for idx, votes in count.tallies().items()}
 
         # Record this round
         round_detail = {
@@ -184,20 +180,17 @@ def run_election_web(candidates: List[Candidate], ballots: List[Ballot]) -> Resu
             if votes > total_votes / 2:
                 # We have a winner
                 rounds.append(round_detail)
-                winner = candidate_map.get(cid)
                 return Results(
-                    winner=winner,
+                    winner=bm.candidate(cid),
                     round_details=rounds
                 )
 
         # No winner yet, eliminate lowest candidate
-        # Find the candidate with the lowest votes
         # In case of tie, eliminate the candidate who appears first alphabetically
-        candidates_by_votes = sorted(tallies.items(), key=lambda x: (x[1], x[0]))
-        if candidates_by_votes:
-            to_eliminate = candidates_by_votes[0][0]
-            round_detail["eliminated"] = to_eliminate
-            remaining_candidates.remove(to_eliminate)
+        to_eliminate = count.lowest()
+        if to_eliminate is not None:
+            round_detail["eliminated"] = bm.ids[to_eliminate]
+            count.eliminate(to_eliminate)
 
         rounds.append(round_detail)
         round_num += 1
@@ -205,9 +198,8 @@ def run_election_web(candidates: List[Candidate], ballots: List[Ballot]) -> Resu
     # If we exit the loop, either we have a single candidate left, or we're
     # out of candidates
     winner = None
-    if remaining_candidates:
-        winner_id = list(remaining_candidates)[0]
-        winner = candidate_map.get(winner_id)
+    if count.remaining:
+        winner = bm.candidates[count.remaining[0]]
 
     return Results(
         winner=winner,
@@ -220,41 +212,107 @@ def normalize(x: float, min_val: float, max_val: float) -> float:
     return (x - min_val) / (max_val - min_val) if max_val > min_val else 0
 
 
+def coefficient_vector(coeffs: WeightCoefficients) -> np.ndarray:
+    """Coefficients as an array in VoterTable column order"""
+    return np.array([coeffs.wE, coeffs.wP, coeffs.wD, coeffs.wA, coeffs.wS],
+                    dtype=np.float64)
+
+
+def normalization_kernel(
+    bounds: Dict[str, VoterProfile]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-attribute (scale, shift) so that normalize(x) == x * scale + shift.
+
+    Attributes whose max does not exceed their min normalize to 0, as in
+    normalize().
+    """
+    lo = np.array([getattr(bounds["min"], a) for a in ATTRIBUTES], dtype=np.float64)
+    hi = np.array([getattr(bounds["max"], a) for a in ATTRIBUTES], dtype=np.float64)
+    span = hi - lo
+    scale = np.divide(1.0, span, out=np.zeros_like(span), where=span > 0)
+    return scale, -lo * scale
+
+
+def voter_weights(
+    voters: Voters,
+    coeffs: WeightCoefficients,
+    bounds: Dict[str, VoterProfile]
+) -> np.ndarray:
+    """
+    Composite weight of every row of a VoterTable.
+
+    Min-max normalization is affine, so it is folded into the coefficients
+    and all voters are weighted with one matrix-vector product.
+    """
+    table = as_voter_table(voters)
+    scale, shift = normalization_kernel(bounds)
+    w = coefficient_vector(coeffs)
+    return table.values @ (w * scale) + float(shift @ w)
+
+
 def calculate_weights(
-    profiles: List[VoterProfile],
+    profiles: Voters,
     coeffs: WeightCoefficients,
     bounds: Dict[str, VoterProfile]
 ) -> Dict[str, float]:
     """Compute each voter's composite weight"""
-    W: Dict[str, float] = {}
-    for p in profiles:
-        E = normalize(p.E, bounds["min"].E, bounds["max"].E)
-        P = normalize(p.P, bounds["min"].P, bounds["max"].P)
-        D = normalize(p.D, bounds["min"].D, bounds["max"].D)
-        A = normalize(p.A, bounds["min"].A, bounds["max"].A)
-        S = normalize(p.S, bounds["min"].S, bounds["max"].S)
-        W[p.id] = (
-            coeffs.wE * E +
-            coeffs.wP * P +
-            coeffs.wD * D +
-            coeffs.wA * A +
-            coeffs.wS * S
-        )
-    return W
+    table = as_voter_table(profiles)
+    weights = voter_weights(table, coeffs, bounds)
+    return dict(zip(table.ids.tolist(), weights.tolist()))
+
+
+def voter_votes(
+        table: VoterTable,
+        voters: Union[Sequence[str], np.ndarray]) -> np.ndarray:
+    """
+    Votes cast by each row of ``table``: how often its id appears in
+    ``voters``, so a repeated id counts every time as in the list path.
+    Unknown ids are ignored; boolean row masks count each row once.
+    """
+    if isinstance(voters, np.ndarray) and voters.dtype == bool:
+        return voters.astype(np.int64)
+    ids = np.asarray(list(voters), dtype=str)
+    if not len(table) or not len(ids):
+        return np.zeros(len(table), dtype=np.int64)
+    order = np.argsort(table.ids, kind="stable")
+    pos = np.minimum(np.searchsorted(table.ids[order], ids), len(table) - 1)
+    rows = order[pos[table.ids[order][pos] == ids]]
+    return np.bincount(rows, minlength=len(table))
 
 
 def run_weighted_yes_no_election(
-    profiles: List[VoterProfile],
-    yes_voter_ids: List[str],
-    no_voter_ids: List[str],
+    profiles: Voters,
+    yes_voter_ids: Union[Sequence[str], np.ndarray],
+    no_voter_ids: Union[Sequence[str], np.ndarray],
     coeffs: WeightCoefficients,
     threshold: float,
-    bounds: Dict[str, VoterProfile]
+    bounds: Dict[str, VoterProfile],
+    weight_by_count: bool = False
 ) -> Dict[str, Union[bool, float]]:
-    """Simple weighted yes/no vote"""
-    weights = calculate_weights(profiles, coeffs, bounds)
-    total_yes = sum(weights.get(id, 0) for id in yes_voter_ids)
-    total_no = sum(weights.get(id, 0) for id in no_voter_ids)
+    """
+    Simple weighted yes/no vote.
+
+    ``profiles`` may be a list of VoterProfile or a VoterTable. With a
+    VoterTable the yes/no voters may also be given as boolean row masks. An
+    id listed more than once votes once per listing on every path.
+
+    By default each profile casts one weighted vote (group semantics). With
+    ``weight_by_count`` every voter a profile represents votes: the group
+    weight is computed once and multiplied by its ``count``, giving the
+    per-voter tally without expanding profiles into individual voters.
+    """
+    if isinstance(profiles, VoterTable) or weight_by_count:
+        table = as_voter_table(profiles)
+        weights = voter_weights(table, coeffs, bounds)
+        if weight_by_count:
+            weights = weights * table.counts
+        total_yes = float(weights @ voter_votes(table, yes_voter_ids))
+        total_no = float(weights @ voter_votes(table, no_voter_ids))
+    else:
+        weights = calculate_weights(profiles, coeffs, bounds)
+        total_yes = sum(weights.get(id, 0) for id in yes_voter_ids)
+        total_no = sum(weights.get(id, 0) for id in no_voter_ids)
     passed = total_yes / \
         (total_yes + total_no) > threshold if (total_yes + total_no) > 0 else False
 
@@ -0,0 +1,252 @@
+"""
+Background jobs for slow work in the web app.
+
+Rendering charts and running expensive rules such as Kemeny-Young are
+submitted to a JobPool instead of running in the request thread. Submitting
+returns a job id at once; the work runs on a bounded pool of worker threads
+and clients poll the job or follow its status changes. Jobs run in threads
+rather than processes so they share the app's result cache and chart store.
+
+Limits:
+
+* Queue depth: once ``max_queue`` jobs are waiting or running, submit raises
+  JobQueueFull rather than letting the backlog grow.
+* Timeouts: a job not finished ``timeout`` seconds after it was submitted is
+  marked timed out. A job still waiting never starts; Python cannot stop a
+  running thread, so a job already running finishes in the background and
+  its result is discarded.
+* Cancellation works the same way: a waiting job is dropped, a running one
+  is marked cancelled and its result discarded.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Job states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+FINISHED = (DONE, FAILED, CANCELLED, TIMED_OUT)
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_QUEUE = 32
+DEFAULT_TIMEOUT = 60.0
+# Finished jobs kept for clients to collect, oldest dropped first
+DEFAULT_KEEP = 256
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when a job is submitted while the queue is at its limit"""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    timeout: float
+    submitted: float
+    status: str = PENDING
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    version: int = 0            # bumped on every status change
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def deadline(self) -> float:
+        return self.submitted + self.timeout
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready status of the job, with its result once done"""
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "timeout": self.timeout,
+        }
+        if self.status == DONE:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class JobPool:
+    """Bounded pool of worker threads running submitted jobs"""
+
+    def __init__(
+            self,
+            workers: int = DEFAULT_WORKERS,
+            max_queue: int = DEFAULT_MAX_QUEUE,
+            timeout: float = DEFAULT_TIMEOUT,
+            keep: int = DEFAULT_KEEP,
+            clock: Callable[[], float] = time.time):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.keep = keep
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._changed = threading.Condition()
+        self.rejected = 0
+
+    def submit(
+            self,
+            func: Callable[..., Any],
+            *args,
+            kind: str = "",
+            timeout: Optional[float] = None,
+            **kwargs) -> Job:
+        """
+        Queue ``func(*args, **kwargs)`` and return its job.
+
+        Raises JobQueueFull when ``max_queue`` jobs are already waiting or
+        running.
+        """
+        with self._changed:
+            if self.depth() >= self.max_queue:
+                self.rejected += 1
+                raise JobQueueFull(f"job queue is full ({self.max_queue} jobs "
+                                   f"waiting or running)")
+            job = Job(id=uuid.uuid4().hex, kind=kind,
+                      timeout=self.timeout if timeout is None else timeout,
+                      submitted=self.clock())
+            self._jobs[job.id] = job
+            self._forget_finished()
+            job.future = self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """The job with this id, with its timeout applied, or None"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._check_deadline(job)
+            return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not finished; False if it already had"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            self._check_deadline(job)
+            if job.status in FINISHED:
+                return False
+            job.future.cancel()
+            self._finish(job, CANCELLED, error="cancelled")
+            return True
+
+    def depth(self) -> int:
+        """Jobs waiting or running, including abandoned ones still running"""
+        return sum(not job.future.done() for job in self._jobs.values()
+                   if job.future is not None)
+
+    def wait(self, job_id: str) -> Optional[Job]:
+        """Block until the job has finished, timed out or been cancelled"""
+        for _ in self.watch(job_id):
+            pass
+        return self.get(job_id)
+
+    def watch(self, job_id: str, heartbeat: float = 15.0) -> Iterator[Optional[Job]]:
+        """
+        Yield the job each time its status changes, ending once it has
+        finished; yields None after ``heartbeat`` seconds without a change
+        """
+        seen = -1
+        while True:
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return
+                self._check_deadline(job)
+                if job.version == seen:
+                    wait = min(heartbeat, max(0.0, job.deadline - self.clock()) + 0.01)
+                    self._changed.wait(wait)
+                    self._check_deadline(job)
+                changed = job.version != seen
+                seen = job.version
+            if changed:
+                yield job
+                if job.status in FINISHED:
+                    return
+            else:
+                yield None
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, limits and the number of jobs in each state"""
+        with self._changed:
+            for job in self._jobs.values():
+                self._check_deadline(job)
+            states: Dict[str, int] = {}
+            for job in self._jobs.values():
+                states[job.status] = states.get(job.status, 0) + 1
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "timeout": self.timeout,
+                "depth": self.depth(),
+                "rejected": self.rejected,
+                "jobs": states,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting jobs and drop those still waiting"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job: Job, func: Callable[..., Any], args, kwargs) -> None:
+        with self._changed:
+            self._check_deadline(job)
+            if job.status in FINISHED:
+                return
+            job.started = self.clock()
+            self._set_status(job, RUNNING)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            with self._changed:
+                if job.status not in FINISHED:
+                    self._finish(job, FAILED, error=str(e))
+            return
+        with self._changed:
+            self._check_deadline(job)
+            if job.status not in FINISHED:
+                job.result = result
+                self._finish(job, DONE)
+
+    def _check_deadline(self, job: Job) -> None:
+        # Caller holds the lock
+        if job.status not in FINISHED and self.clock() >= job.deadline:
+            self._finish(job, TIMED_OUT, error=f"timed out after {job.timeout:g}s")
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        job.finished = self.clock()
+        job.error = error
+        self._set_status(job, status)
+
+    def _set_status(self, job: Job, status: str) -> None:
+        job.status = status
+        job.version += 1
+        self._changed.notify_all()
+
+    def _forget_finished(self) -> None:
+        # Dicts keep insertion order, so the oldest finished jobs go first.
+        # Cancelled and timed-out jobs still running in a thread are kept
+        # until it returns, so depth() goes on counting them
+        finished = [job.id for job in self._jobs.values()
+                    if job.status in FINISHED and job.future.done()]
+        for job_id in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[job_id]
@@ -0,0 +1,182 @@
+"""
+Shared pairwise statistics for the Condorcet family of rules.
+
+Also provides the Smith and Schwartz sets as public helpers over a margin
+matrix, computed from the strongly connected components of the majority
+graph.
+
+Comparing several Condorcet methods on one profile used to rescan the
+ballots once per rule. ``pairwise_stats`` computes the preference counts,
+margins, majority graph and Smith set once per ballot profile and hands the
+same object to every rule. Results are memoized on the matrix itself
+(identity) and in a bounded LRU cache keyed on the profile's content hash,
+so an identical profile rebuilt from lists is not recounted either.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+from ballots import BallotMatrix
+
+
+def strongly_connected_components(adjacency: np.ndarray) -> List[List[int]]:
+    """
+    Tarjan's algorithm over a dense boolean adjacency matrix, O(m^2).
+
+    Components are returned in reverse topological order, each sorted by
+    candidate index.
+    """
+    m = adjacency.shape[0]
+    successors = [np.flatnonzero(row).tolist() for row in adjacency]
+    index = [-1] * m
+    low = [0] * m
+    on_stack = [False] * m
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+    for root in range(m):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, iter(successors[root]))]
+        while work:
+            v, edges = work[-1]
+            for w in edges:
+                if index[w] == -1:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, iter(successors[w])))
+                    break
+                if on_stack[w]:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[v])
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(sorted(component))
+    return components
+
+
+def _top_components(adjacency: np.ndarray) -> List[List[int]]:
+    # Components no outside candidate has an edge into
+    m = adjacency.shape[0]
+    components = strongly_connected_components(adjacency)
+    component_of = np.empty(m, dtype=np.int64)
+    for k, component in enumerate(components):
+        component_of[component] = k
+    crossing = adjacency & (component_of[:, None] != component_of[None, :])
+    entered = crossing.any(axis=0)
+    return [c for c in components if not entered[c].any()]
+
+
+def smith_set(margins: np.ndarray) -> List[int]:
+    """
+    Smallest set of candidates that each beat every candidate outside it.
+
+    It is the top strongly connected component of the beats-or-ties graph.
+    """
+    adjacency = margins >= 0
+    np.fill_diagonal(adjacency, False)
+    return sorted(i for c in _top_components(adjacency) for i in c)
+
+
+def schwartz_set(margins: np.ndarray) -> List[int]:
+    """
+    Union of the minimal sets no outside candidate beats outright.
+
+    These are the top strongly connected components of the strict majority
+    graph; always a subset of the Smith set.
+    """
+    adjacency = margins > 0
+    return sorted(i for c in _top_components(adjacency) for i in c)
+
+
+@dataclass
+class PairwiseStats:
+    counts: np.ndarray     # counts[x, y]: voters ranking x above y
+    margins: np.ndarray    # counts - counts.T
+    majority: np.ndarray   # majority[x, y]: x beats y head-to-head
+    smith_set: List[int] = field(default_factory=list)
+    schwartz_set: List[int] = field(default_factory=list)
+
+    @classmethod
+    def from_counts(cls, counts: np.ndarray) -> "PairwiseStats":
+        margins = counts - counts.T
+        majority = margins > 0
+        return cls(counts=counts, margins=margins, majority=majority,
+                   smith_set=smith_set(margins),
+                   schwartz_set=schwartz_set(margins))
+
+    @property
+    def num_candidates(self) -> int:
+        return self.counts.shape[0]
+
+    def condorcet_winner(self) -> Optional[int]:
+        """Index of the candidate beating every other head-to-head, if any"""
+        # A Smith set of one is exactly a Condorcet winner
+        return self.smith_set[0] if len(self.smith_set) == 1 else None
+
+
+class PairwiseCache:
+    """
+    Bounded LRU memo of PairwiseStats keyed on ballot-profile content.
+
+    Safe to share between the Flask request threads.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, PairwiseStats]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, bm: BallotMatrix) -> PairwiseStats:
+        key = bm.fingerprint()
+        with self._lock:
+            stats = self._entries.get(key)
+            if stats is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return stats
+            self.misses += 1
+        # Count outside the lock so other profiles are not held up
+        stats = PairwiseStats.from_counts(bm.pairwise_counts())
+        with self._lock:
+            self._entries[key] = stats
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_cache = PairwiseCache()
+
+
+def pairwise_stats(bm: BallotMatrix) -> PairwiseStats:
+    """Pairwise statistics for ``bm``, computed at most once per profile"""
+    return bm.memo("pairwise_stats", lambda: _cache.get(bm))
@@ -0,0 +1,279 @@
+"""
+Multi-process map-reduce tallying for large electorates.
+
+The ballots are split into shards. A ProcessPoolExecutor computes the
+mergeable partial tallies of tallies.py for each shard in its own process,
+and the parent merges them, so the counting runs outside the GIL on every
+core. Shards of a ballot archive carry only the file path and a row range;
+each worker maps its own rows, so nothing large is pickled between
+processes.
+
+Elimination is parallel per round: ShardedRunoffCount recounts each shard's
+first surviving preferences in the workers after every elimination. The
+rounds only send the eliminated candidates to the workers. In-memory
+shards are copied to each worker once, when shard_pool() starts it, and
+stay there for the life of the pool.
+"""
+
+import os
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import reduce
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from vote_types import Candidate, Results
+from ballots import (
+    BLOCK_ROWS, BallotMatrix, RunoffCount, as_ballot_matrix, rank_dtype
+)
+from ballot_archive import open_archive, read_header
+from ballot_stream import tally_grade_file, tally_ranked_file, tally_score_file
+from election import run_runoff_rounds
+from tallies import GradeTally, RankedTally, ScoreTally
+
+# In-memory shards held by this worker process, by Shard.key; filled once
+# per worker by shard_pool()
+_resident: Dict[str, BallotMatrix] = {}
+
+
+@dataclass
+class Shard:
+    """
+    A slice of ranked ballots a worker process can load on its own.
+
+    Archive shards hold a path and row range; in-memory shards hold their
+    rank and count arrays, which are pickled to the worker, and a ``key``
+    under which a worker started by shard_pool() keeps them.
+    """
+    start: int
+    stop: int
+    path: Optional[str] = None
+    candidates: Optional[List[Candidate]] = None
+    ranks: Optional[np.ndarray] = None
+    counts: Optional[np.ndarray] = None
+    key: Optional[str] = None
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def handle(self) -> "Shard":
+        """The shard without its arrays, for workers that already hold it"""
+        if self.path is not None or self.key is None:
+            return self
+        return Shard(self.start, self.stop, key=self.key)
+
+    def load(self, candidates: Sequence[Candidate]) -> BallotMatrix:
+        """The shard's ballots over ``candidates``"""
+        if self.path is not None:
+            bm = open_archive(self.path)
+            bm = BallotMatrix(bm.candidates, bm.ranks[self.start:self.stop],
+                              bm.counts[self.start:self.stop])
+        elif self.ranks is not None:
+            bm = BallotMatrix(self.candidates, self.ranks, self.counts)
+        elif self.key in _resident:
+            bm = _resident[self.key]
+        else:
+            raise LookupError(f"shard {self.key} is not held by this worker; "
+                              f"start the pool with shard_pool()")
+        return as_ballot_matrix(candidates, bm)
+
+
+def default_shards() -> int:
+    """One shard per core"""
+    return os.cpu_count() or 1
+
+
+def _bounds(rows: int, shards: int) -> List[int]:
+    return np.linspace(0, rows, max(1, shards) + 1).astype(np.int64).tolist()
+
+
+def shard_archive(path: str, shards: Optional[int] = None) -> List[Shard]:
+    """Split a ballot archive into ``shards`` contiguous row ranges"""
+    bounds = _bounds(read_header(path).rows, shards or default_shards())
+    return [Shard(start, stop, path=path)
+            for start, stop in zip(bounds, bounds[1:])]
+
+
+def shard_matrix(bm: BallotMatrix, shards: Optional[int] = None) -> List[Shard]:
+    """Split an in-memory ballot matrix into ``shards`` row slices"""
+    bounds = _bounds(len(bm), shards or default_shards())
+    return [Shard(start, stop, candidates=bm.candidates,
+                  ranks=np.ascontiguousarray(bm.ranks[start:stop]),
+                  counts=np.ascontiguousarray(bm.counts[start:stop]),
+                  key=uuid.uuid4().hex)
+            for start, stop in zip(bounds, bounds[1:])]
+
+
+def _keep_shards(shards: Sequence[Shard]) -> None:
+    # Pool initializer: each worker receives the in-memory shards once
+    for shard in shards:
+        _resident[shard.key] = BallotMatrix(shard.candidates, shard.ranks,
+                                            shard.counts)
+
+
+def shard_pool(
+        shards: Sequence[Shard],
+        workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    A process pool whose workers hold the in-memory ``shards``.
+
+    Each worker unpickles the shards once when it starts, so counts that go
+    back to the workers every round, such as ShardedRunoffCount, only send
+    shard keys. Archive shards need no preloading and are skipped.
+    """
+    in_memory = [shard for shard in shards
+                 if shard.path is None and shard.key is not None]
+    return ProcessPoolExecutor(max_workers=workers, initializer=_keep_shards,
+                               initargs=(in_memory,))
+
+
+@contextmanager
+def _pool(
+        executor: Optional[Executor],
+        workers: Optional[int],
+        shards: Sequence[Shard] = ()) -> Iterator[Executor]:
+    # Use the caller's executor, or a pool that lives for one call
+    if executor is not None:
+        yield executor
+    else:
+        with shard_pool(shards, workers) as pool:
+            yield pool
+
+
+def _ranked_part(args) -> RankedTally:
+    shard, candidates = args
+    return RankedTally(candidates).update(shard.load(candidates))
+
+
+def parallel_ranked_tally(
+        candidates: Sequence[Candidate],
+        shards: Sequence[Shard],
+        executor: Optional[Executor] = None,
+        workers: Optional[int] = None) -> RankedTally:
+    """
+    Position and pairwise counts of every shard, merged.
+
+    ``tally.summary()`` runs the positional rules, Bucklin, Baldwin/Nanson
+    and the Condorcet family over all shards.
+    """
+    candidates = list(candidates)
+    with _pool(executor, workers) as pool:
+        parts = pool.map(_ranked_part, [(shard, candidates) for shard in shards])
+        return reduce(RankedTally.merge, parts, RankedTally(candidates))
+
+
+_FILE_TALLIES = {
+    "ranked": (tally_ranked_file, RankedTally),
+    "score": (tally_score_file, ScoreTally),
+    "grade": (tally_grade_file, GradeTally),
+}
+
+
+def _file_part(args):
+    kind, path, candidates, chunk_rows, fmt = args
+    return _FILE_TALLIES[kind][0](path, candidates, chunk_rows, fmt)
+
+
+def parallel_file_tally(
+        paths: Sequence[str],
+        candidates: Sequence[Candidate],
+        kind: str = "ranked",
+        executor: Optional[Executor] = None,
+        workers: Optional[int] = None,
+        chunk_rows: int = BLOCK_ROWS,
+        fmt: Optional[str] = None) -> Union[RankedTally, ScoreTally, GradeTally]:
+    """
+    Tally CSV/JSONL ballot files one file per task and merge the results.
+
+    ``kind`` is ``"ranked"``, ``"score"`` (approval and score ballots) or
+    ``"grade"`` (majority judgment ballots).
+
+    Files are not split, so a single large export is read by one worker.
+    Split it into several files first, or write it to a ballot archive and
+    use shard_archive() with parallel_ranked_tally().
+    """
+    if kind not in _FILE_TALLIES:
+        raise ValueError(f"unknown ballot kind {kind!r}")
+    candidates = list(candidates)
+    tally_type = _FILE_TALLIES[kind][1]
+    with _pool(executor, workers) as pool:
+        parts = pool.map(_file_part, [(kind, path, candidates, chunk_rows, fmt)
+                                      for path in paths])
+        return reduce(tally_type.merge, parts, tally_type(candidates))
+
+
+def _runoff_part(args) -> np.ndarray:
+    # Votes for each candidate from the shard's first surviving preferences
+    shard, candidates, alive = args
+    bm = shard.load(candidates)
+    m = bm.num_candidates
+    votes = np.zeros(m, dtype=np.int64)
+    for ranks, counts in bm.blocks():
+        # ``alive`` has a dead slot at the end for the UNRANKED sentinel
+        live = alive[ranks]
+        voting = live.any(axis=1)
+        first = live.argmax(axis=1)[voting]
+        choice = ranks[np.flatnonzero(voting), first].astype(np.intp)
+        votes += np.rint(np.bincount(choice, weights=counts[voting],
+                                     minlength=m)).astype(np.int64)
+    return votes
+
+
+class ShardedRunoffCount(RunoffCount):
+    """
+    RunoffCount over shards counted in worker processes.
+
+    Each round the workers recount their shards' first surviving
+    preferences with the current set of eliminated candidates; exhausted
+    ballots drop out exactly as in RunoffCount. Only shard handles and the
+    eliminated candidates are sent each round, so in-memory shards must be
+    held by the workers: run the count on a shard_pool() executor.
+    """
+
+    def __init__(
+            self,
+            candidates: Sequence[Candidate],
+            shards: Sequence[Shard],
+            executor: Executor):
+        m = len(candidates)
+        # Only the candidate list is needed locally; the rows stay in the shards
+        self.bm = BallotMatrix(candidates, np.zeros((0, 0), dtype=rank_dtype(m)))
+        self.shards = list(shards)
+        self.executor = executor
+        self.alive = np.ones(m + 1, dtype=bool)
+        self.alive[m] = False
+        self.remaining = list(range(m))
+        self.votes = self._recount()
+
+    def _recount(self) -> np.ndarray:
+        tasks = [(shard.handle(), self.bm.candidates, self.alive)
+                 for shard in self.shards]
+        return reduce(np.add, self.executor.map(_runoff_part, tasks),
+                      np.zeros(self.bm.num_candidates, dtype=np.int64))
+
+    def eliminate(self, idx: int) -> None:
+        """Drop a candidate and recount the shards"""
+        self.alive[idx] = False
+        self.remaining.remove(idx)
+        self.votes = self._recount()
+
+
+def parallel_instant_runoff(
+        candidates: Sequence[Candidate],
+        shards: Sequence[Shard],
+        executor: Optional[Executor] = None,
+        workers: Optional[int] = None) -> Results:
+    """
+    Instant runoff over sharded ballots, each round counted in parallel.
+
+    Without an ``executor`` a shard_pool() is started for the count. A
+    caller's executor must be a shard_pool() for in-memory shards; any
+    process pool works for archive shards.
+    """
+    if not candidates or not sum(len(shard) for shard in shards):
+        return Results(winner=None, round_details=[])
+    with _pool(executor, workers, shards) as pool:
+        return run_runoff_rounds(ShardedRunoffCount(candidates, shards, pool))
@@ -0,0 +1,205 @@
+"""
+Content-addressed cache for generated ballots and election results.
+
+Entries are keyed by a hash of everything that determines them, such as the
+profile definition, seed, rule and parameters, so identical requests are
+served without regenerating ballots or rerunning a rule. The in-memory
+cache evicts least recently used entries to stay within a byte budget,
+measured as the pickled size of each value. With a SQLite path every entry
+is also written to disk, and a restarted server reloads entries from there
+on first use; the table is kept within its own byte budget by dropping the
+entries least recently written or loaded.
+"""
+
+import hashlib
+import json
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, is_dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Default in-memory budget
+DEFAULT_MAX_BYTES = 64 << 20
+# Default budget of the SQLite table
+DEFAULT_MAX_DISK_BYTES = 1 << 30
+
+
+def _jsonable(value: Any) -> Any:
+    if is_dataclass(value):
+        return asdict(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if hasattr(value, "tolist"):
+        # NumPy scalars and arrays
+        return value.tolist()
+    raise TypeError(f"cannot use {type(value).__name__} in a cache key")
+
+
+def cache_key(*parts: Any) -> str:
+    """
+    Stable hash of JSON-like key parts.
+
+    Dataclasses (candidates, voter profiles) are hashed by their fields and
+    dicts by their sorted items, so equal inputs give equal keys across runs.
+    """
+    text = json.dumps(parts, sort_keys=True, default=_jsonable, separators=(",", ":"))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of picklable values under a byte budget.
+
+    A value larger than the whole budget is not kept in memory, but is
+    still persisted when a SQLite path is given and it fits ``max_disk_bytes``.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, path: Optional[str] = None,
+                 max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        self._tick = 0      # last use of a row, for dropping the oldest
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(results)")]
+            if columns and "used" not in columns:
+                # Written before rows were sized; it is only a cache
+                self._db.execute("DROP TABLE results")
+            self._db.execute("CREATE TABLE IF NOT EXISTS results "
+                             "(key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                             "size INTEGER NOT NULL, used INTEGER NOT NULL)")
+            self._db.commit()
+            self._disk_bytes, self._tick = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0), COALESCE(MAX(used), 0) "
+                "FROM results").fetchone()
+            with self._lock:
+                self._prune()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """The value cached under ``key``, from memory or disk"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            blob = self._load(key)
+            if blob is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            value = pickle.loads(blob)
+            self._remember(key, value, len(blob))
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Cache ``value`` under ``key``, evicting older entries as needed"""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, value, len(blob))
+            if self._db is not None:
+                row = self._db.execute("SELECT size FROM results WHERE key = ?",
+                                       (key,)).fetchone()
+                if row is not None:
+                    self._disk_bytes -= row[0]
+                self._tick += 1
+                self._db.execute("INSERT OR REPLACE INTO results "
+                                 "(key, value, size, used) VALUES (?, ?, ?, ?)",
+                                 (key, sqlite3.Binary(blob), len(blob), self._tick))
+                self._disk_bytes += len(blob)
+                self._prune()
+                self._db.commit()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """The value under ``key``, computing and caching it on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        """Drop every entry, on disk too, and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+                self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and memory use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "persistent": self._db is not None,
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+            }
+
+    def _load(self, key: str) -> Optional[bytes]:
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT value FROM results WHERE key = ?",
+                               (key,)).fetchone()
+        if row is None:
+            return None
+        self._tick += 1
+        self._db.execute("UPDATE results SET used = ? WHERE key = ?", (self._tick, key))
+        self._db.commit()
+        return bytes(row[0])
+
+    def _prune(self) -> None:
+        # Caller holds the lock; drops the least recently used rows
+        excess = self._disk_bytes - self.max_disk_bytes
+        if excess <= 0:
+            return
+        doomed = []
+        for key, size in self._db.execute(
+                "SELECT key, size FROM results ORDER BY used").fetchall():
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+            self._disk_bytes -= size
+        self._db.executemany("DELETE FROM results WHERE key = ?", doomed)
+        self._db.commit()
+
+    def _remember(self, key: str, value: Any, size: int) -> None:
+        # Caller holds the lock
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+            self.evictions += 1
@@ -0,0 +1,311 @@
+"""
+Monte Carlo election simulations for comparing voting rules.
+
+Profiles are drawn from the standard statistical cultures with vectorized
+NumPy generators, collapsed into a BallotProfile, and every rule under
+comparison runs on the same profile object, so the position and pairwise
+counts are computed once per election and shared between the rules. The
+report aggregates Condorcet efficiency, pairwise rule agreement and how
+often each rule's decision was a tie.
+
+Cultures:
+
+* ``ic``: impartial culture, every voter ranks uniformly at random.
+* ``iac``: impartial anonymous culture, every anonymous profile (multiset
+  of rankings) is equally likely.
+* ``mallows``: rankings concentrated around a reference ranking, with
+  dispersion ``phi`` (0 = everyone agrees, 1 = impartial culture).
+* ``urn``: the Pólya-Eggenberger urn with contagion ``alpha`` (0 = IC,
+  1/m! = IAC).
+"""
+
+import math
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vote_types import Candidate, Results
+from ballots import BallotProfile, BallotMatrix, rank_dtype
+from pairwise import pairwise_stats
+from voting_systems import (
+    plurality, borda_count, instant_runoff, coombs, copeland, minimax,
+    ranked_pairs, schulze_method
+)
+
+# Rules compared when none are given
+DEFAULT_RULES: Dict[str, Callable] = {
+    'plurality': plurality,
+    'borda_count': borda_count,
+    'instant_runoff': instant_runoff,
+    'coombs': coombs,
+    'copeland': copeland,
+    'minimax': minimax,
+    'ranked_pairs': ranked_pairs,
+    'schulze_method': schulze_method,
+}
+
+
+def impartial_culture(
+        voters: int,
+        num_candidates: int,
+        rng: np.random.Generator) -> np.ndarray:
+    """(voters x num_candidates) rankings drawn uniformly at random"""
+    return np.argsort(rng.random((voters, num_candidates)), axis=1)
+
+
+def mallows(
+        voters: int,
+        num_candidates: int,
+        rng: np.random.Generator,
+        phi: float = 0.5,
+        reference: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    Mallows rankings around ``reference`` (candidate order by default).
+
+    Uses the repeated insertion model: item i goes to slot j <= i with
+    probability proportional to phi ** (i - j), for all voters at once.
+    """
+    m = num_candidates
+    position = np.zeros((voters, m), dtype=np.int64)
+    for i in range(m):
+        weights = phi ** np.arange(i, -1, -1, dtype=np.float64)
+        cdf = np.cumsum(weights / weights.sum())
+        slot = np.minimum(np.searchsorted(cdf, rng.random(voters), side="right"), i)
+        # Items already at or after the slot move down one place
+        position[:, :i] += position[:, :i] >= slot[:, None]
+        position[:, i] = slot
+    order = np.argsort(position, axis=1)
+    reference = np.arange(m) if reference is None else np.asarray(reference)
+    return reference[order]
+
+
+def polya_urn(
+        voters: int,
+        num_candidates: int,
+        rng: np.random.Generator,
+        alpha: float = 0.1) -> np.ndarray:
+    """
+    Pólya-Eggenberger urn rankings with contagion ``alpha``.
+
+    The urn starts with one copy of each of the m! rankings and every draw
+    adds ``alpha * m!`` copies of the ranking drawn. Equivalently voter i
+    draws a fresh uniform ranking with probability 1 / (1 + alpha * i) and
+    otherwise copies a uniformly chosen earlier voter, which is sampled
+    exactly here without enumerating the m! rankings.
+    """
+    fresh_rankings = impartial_culture(voters, num_candidates, rng)
+    i = np.arange(voters)
+    fresh = rng.random(voters) * (1.0 + alpha * i) < 1.0
+    source = np.where(fresh, i, np.floor(rng.random(voters) * i).astype(np.int64))
+    # Follow copy chains back to the voter who drew fresh (pointer jumping)
+    while True:
+        hop = source[source]
+        if np.array_equal(hop, source):
+            break
+        source = hop
+    return fresh_rankings[source]
+
+
+def impartial_anonymous_culture(
+        voters: int,
+        num_candidates: int,
+        rng: np.random.Generator) -> np.ndarray:
+    """Rankings of a profile drawn uniformly among anonymous profiles"""
+    return polya_urn(voters, num_candidates, rng,
+                     alpha=1.0 / math.factorial(num_candidates))
+
+
+CULTURES: Dict[str, Callable[..., np.ndarray]] = {
+    'ic': impartial_culture,
+    'iac': impartial_anonymous_culture,
+    'mallows': mallows,
+    'urn': polya_urn,
+}
+
+
+def candidate_slate(num_candidates: int) -> List[Candidate]:
+    """Synthetic candidates c0, c1, ..."""
+    return [Candidate(id=f"c{i}", name=f"Candidate {i}") for i in range(num_candidates)]
+
+
+def generate_profile(
+        culture: str,
+        voters: int,
+        candidates: Sequence[Candidate],
+        rng: np.random.Generator,
+        **params) -> BallotProfile:
+    """Draw one profile from ``culture`` as a BallotProfile"""
+    if culture not in CULTURES:
+        raise ValueError(f"unknown culture {culture!r}; "
+                         f"expected one of {sorted(CULTURES)}")
+    ranks = CULTURES[culture](voters, len(candidates), rng, **params)
+    return BallotProfile.from_matrix(
+        BallotMatrix(candidates, ranks.astype(rank_dtype(len(candidates)))))
+
+
+# Voters generated per step by grouped_profile, bounding its temporaries
+GROUP_BLOCK_ROWS = 1 << 20
+
+
+def grouped_profile(
+        candidates: Sequence[Candidate],
+        groups: Sequence[Tuple[Sequence[str], int]],
+        rng: np.random.Generator,
+        shuffle_rate: float = 0.3,
+        depth: Optional[int] = None) -> BallotProfile:
+    """
+    Ballots for groups of voters sharing a base preference order.
+
+    ``groups`` holds (base candidate ids, voters) pairs. A voter ranks the
+    group's base candidates first, in order, then the other candidates in
+    random order; with probability ``shuffle_rate`` the voter ranks every
+    candidate at random instead. Ballots are cut to ``depth`` positions.
+
+    Each voter draws a uniform utility below 1 per candidate and the base
+    candidates get bonuses k, k-1, ..., 1 on top, so sorting the utilities
+    gives the ranking. A whole group is ranked with one argsort per block of
+    voters, and rankings are collapsed into counts as they are generated.
+    """
+    candidates = list(candidates)
+    m = len(candidates)
+    index = {c.id: i for i, c in enumerate(candidates)}
+    depth = m if depth is None else min(depth, m)
+    dtype = rank_dtype(m)
+    # A ranking packs into one integer code, one base-m digit per position
+    packed = 0 < depth and m ** depth <= np.iinfo(np.int64).max
+    place = m ** np.arange(depth, dtype=np.int64)
+    codes, counts, rows = [], [], []
+    for base, voters in groups:
+        base = [index[cid] for cid in base if cid in index]
+        bonus = np.arange(len(base), 0, -1, dtype=np.float32)
+        for start in range(0, voters, GROUP_BLOCK_ROWS):
+            n = min(GROUP_BLOCK_ROWS, voters - start)
+            # Single precision is plenty to order a handful of candidates
+            utility = rng.random((n, m), dtype=np.float32)
+            favoured = np.flatnonzero(rng.random(n) >= shuffle_rate)
+            utility[favoured[:, None], base] += bonus
+            ranks = np.argsort(-utility, axis=1)[:, :depth].astype(dtype)
+            if not packed:
+                rows.append(ranks)
+                continue
+            block, block_counts = np.unique(ranks @ place, return_counts=True)
+            codes.append(block)
+            counts.append(block_counts)
+    if not packed:
+        ranks = np.concatenate(rows) if rows else np.zeros((0, depth), dtype=dtype)
+        return BallotProfile.from_matrix(BallotMatrix(candidates, ranks))
+    if not codes:
+        return BallotProfile(candidates, np.zeros((0, depth), dtype=dtype),
+                             np.zeros(0, dtype=np.int64))
+    unique, inverse = np.unique(np.concatenate(codes), return_inverse=True)
+    totals = np.bincount(inverse, weights=np.concatenate(counts), minlength=len(unique))
+    ranks = (unique[:, None] // place % m).astype(dtype)
+    return BallotProfile(candidates, ranks, totals.astype(np.int64))
+
+
+def is_tie(result: Results) -> bool:
+    """
+    Whether a rule's decision was a tie: no winner, or a top final score
+    shared so the tie-break decided.
+
+    The final scores are ``result.scores`` when the rule sets them, such as
+    Copeland scores or Coombs first preferences, and otherwise the tallies
+    of the last round.
+    """
+    if result.winner is None:
+        return True
+    scores = result.scores
+    if scores is None and result.round_details:
+        scores = result.round_details[-1].get("tallies")
+    if not scores or len(scores) < 2:
+        return False
+    values = list(scores.values())
+    return values.count(max(values)) > 1
+
+
+@dataclass
+class SimulationReport:
+    rules: List[str]
+    elections: int
+    condorcet_winner_rate: float           # share of profiles with a Condorcet winner
+    condorcet_efficiency: Dict[str, float]  # share of those where the rule elects it
+    agreement: np.ndarray                  # agreement[i, j]: share with the same winner
+    tie_frequency: Dict[str, float]        # share of elections decided by a tie
+    params: Dict[str, object] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, object]:
+        """JSON-ready form of the report"""
+        return {
+            "rules": self.rules,
+            "elections": self.elections,
+            "condorcet_winner_rate": self.condorcet_winner_rate,
+            "condorcet_efficiency": self.condorcet_efficiency,
+            "agreement": self.agreement.tolist(),
+            "tie_frequency": self.tie_frequency,
+            "params": self.params,
+        }
+
+
+def simulate(
+        rules: Optional[Mapping[str, Callable]] = None,
+        culture: str = 'ic',
+        elections: int = 1000,
+        voters: int = 101,
+        num_candidates: int = 5,
+        seed: Optional[int] = None,
+        **params) -> SimulationReport:
+    """
+    Run ``elections`` synthetic elections and compare ``rules`` on each.
+
+    Args:
+        rules: Rule name -> function taking (candidates, ballots); defaults
+            to DEFAULT_RULES
+        culture: One of CULTURES
+        elections: Number of profiles to draw
+        voters: Voters per profile
+        num_candidates: Candidates per profile
+        seed: Seed for the profile generator
+        **params: Culture parameters such as ``phi`` or ``alpha``
+
+    Returns:
+        SimulationReport with the aggregate statistics
+    """
+    rules = dict(rules or DEFAULT_RULES)
+    names = list(rules)
+    candidates = candidate_slate(num_candidates)
+    rng = np.random.default_rng(seed)
+
+    # winners[e, r]: index of rule r's winner in election e, -1 for none
+    winners = np.full((elections, len(names)), -1, dtype=np.int64)
+    ties = np.zeros(len(names), dtype=np.int64)
+    condorcet = np.full(elections, -1, dtype=np.int64)
+    for e in range(elections):
+        profile = generate_profile(culture, voters, candidates, rng, **params)
+        cw = pairwise_stats(profile).condorcet_winner()
+        if cw is not None:
+            condorcet[e] = cw
+        for r, name in enumerate(names):
+            result = rules[name](candidates, profile)
+            if result.winner is not None:
+                winners[e, r] = profile.index[result.winner.id]
+            ties[r] += is_tie(result)
+
+    has_cw = condorcet >= 0
+    with_cw = int(has_cw.sum())
+    efficiency = (winners[has_cw] == condorcet[has_cw, None]).sum(axis=0)
+    same = (winners[:, :, None] == winners[:, None, :]) & (winners[:, :, None] >= 0)
+    return SimulationReport(
+        rules=names,
+        elections=elections,
+        condorcet_winner_rate=with_cw / elections if elections else 0.0,
+        condorcet_efficiency={
+            name: float(efficiency[r] / with_cw) if with_cw else float('nan')
+            for r, name in enumerate(names)},
+        agreement=(same.mean(axis=0) if elections
+                   else np.zeros((len(names), len(names)))),
+        tie_frequency={name: float(ties[r] / elections) if elections else 0.0
+                       for r, name in enumerate(names)},
+        params={"culture": culture, "voters": voters,
+                "num_candidates": num_candidates, "seed": seed, **params},
+    )
@@ -0,0 +1,82 @@
+// Helpers for the background jobs of /api/jobs: slow rules and charts are
+// submitted as jobs and followed until they finish, so no page request
+// waits on them.
+
+const JOB_FINISHED = ['done', 'failed', 'cancelled', 'timed_out'];
+
+// Submit a job and return its status payload (job_id, status_url, ...)
+async function submitJob(url, body) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(body || {})
+    });
+    const job = await response.json();
+    if (!job.success) {
+        throw new Error(job.error || 'The job could not be started');
+    }
+    return job;
+}
+
+// Poll a job's status URL until it has finished
+async function pollJob(job, onStatus) {
+    while (true) {
+        const response = await fetch(job.status_url);
+        const update = await response.json();
+        if (!response.ok) {
+            throw new Error(update.error || 'Job not found');
+        }
+        if (onStatus) {
+            onStatus(update);
+        }
+        if (JOB_FINISHED.includes(update.status)) {
+            return update;
+        }
+        await new Promise(resolve => setTimeout(resolve, 500));
+    }
+}
+
+// Follow a job's server-sent status events until it has finished, falling
+// back to polling if the stream is unavailable; resolves with the final
+// status, which carries the result once the job is done
+function followJob(job, onStatus) {
+    if (!window.EventSource) {
+        return pollJob(job, onStatus);
+    }
+    return new Promise((resolve, reject) => {
+        const events = new EventSource(job.events_url);
+        events.addEventListener('status', event => {
+            const update = JSON.parse(event.data);
+            if (onStatus) {
+                onStatus(update);
+            }
+            if (JOB_FINISHED.includes(update.status)) {
+                events.close();
+                resolve(update);
+            }
+        });
+        events.onerror = () => {
+            events.close();
+            pollJob(job, onStatus).then(resolve, reject);
+        };
+    });
+}
+
+// Ask the server to cancel a job that has not finished
+function cancelJob(job) {
+    return fetch(job.cancel_url, { method: 'POST' });
+}
+
+// Human-readable job state
+function describeJob(update) {
+    return {
+        pending: 'Waiting in the queue...',
+        running: 'Running...',
+        done: 'Done',
+        failed: `Failed: ${update.error}`,
+        cancelled: 'Cancelled',
+        timed_out: `Timed out: ${update.error}`
+    }[update.status] || update.status;
+}
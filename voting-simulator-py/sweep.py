@@ -0,0 +1,135 @@
+"""
+Coefficient sweeps for the weighted yes/no vote.
+
+Running run_weighted_yes_no_election once per WeightCoefficients repeats the
+normalization and the voter loop for every scenario. A sweep normalizes the
+voter attributes once and evaluates thousands of coefficient vectors on the
+simplex together: the (scenarios x attributes) @ (attributes x voters)
+weight product is reassociated so the voters are summed per side first,
+which leaves one (scenarios x 5) @ (5 x 2) product.
+
+Because each side's total is linear in the coefficients, the pass/fail
+decision boundary is a hyperplane through the origin and is returned
+exactly, together with the points where it crosses the simplex edges.
+"""
+
+from itertools import combinations
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from vote_types import VoterProfile, WeightCoefficients
+from voters import ATTRIBUTES, Voters, as_voter_table
+from election import coefficient_vector, normalization_kernel, voter_votes
+
+
+def simplex_grid(steps: int, dims: int = len(ATTRIBUTES)) -> np.ndarray:
+    """
+    Every coefficient vector whose entries are multiples of 1/steps and sum
+    to 1, as a (C(steps + dims - 1, dims - 1) x dims) array.
+    """
+    if steps < 1:
+        raise ValueError("steps must be at least 1")
+    # Stars and bars: dims - 1 bars among steps + dims - 1 slots
+    bars = np.array(list(combinations(range(steps + dims - 1), dims - 1)),
+                    dtype=np.int64).reshape(-1, dims - 1)
+    edges = np.hstack([np.full((len(bars), 1), -1), bars,
+                       np.full((len(bars), 1), steps + dims - 1)])
+    return (np.diff(edges, axis=1) - 1) / steps
+
+
+def sample_simplex(samples: int, seed: Optional[int] = None,
+                   dims: int = len(ATTRIBUTES)) -> np.ndarray:
+    """``samples`` coefficient vectors drawn uniformly from the simplex"""
+    rng = np.random.default_rng(seed)
+    return rng.dirichlet(np.ones(dims), size=samples)
+
+
+def coefficient_matrix(
+    coefficients: Union[np.ndarray, Sequence[WeightCoefficients]]
+) -> np.ndarray:
+    """Scenarios as a (scenarios x 5) float array"""
+    if isinstance(coefficients, np.ndarray):
+        return np.asarray(coefficients, dtype=np.float64).reshape(-1, len(ATTRIBUTES))
+    return np.array([coefficient_vector(c) for c in coefficients],
+                    dtype=np.float64).reshape(-1, len(ATTRIBUTES))
+
+
+def boundary_points(normal: np.ndarray) -> List[List[float]]:
+    """
+    Points where the hyperplane ``coeffs @ normal == 0`` crosses the edges
+    of the coefficient simplex.
+    """
+    dims = len(normal)
+    # Vertices lying on the hyperplane, then strict sign changes along edges
+    points = [np.eye(dims)[i].tolist() for i in range(dims) if normal[i] == 0]
+    for i, j in combinations(range(dims), 2):
+        a, b = normal[i], normal[j]
+        if a * b < 0:
+            point = np.zeros(dims)
+            point[i] = b / (b - a)
+            point[j] = a / (a - b)
+            points.append(point.tolist())
+    return points
+
+
+def sweep_weighted_yes_no_election(
+    profiles: Voters,
+    yes_voter_ids: Union[Sequence[str], np.ndarray],
+    no_voter_ids: Union[Sequence[str], np.ndarray],
+    coefficients: Union[np.ndarray, Sequence[WeightCoefficients]],
+    threshold: float,
+    bounds: Dict[str, VoterProfile],
+    weight_by_count: bool = False
+) -> Dict[str, object]:
+    """
+    Weighted yes/no vote for many coefficient vectors at once.
+
+    Args:
+        profiles: Voter profiles or a VoterTable
+        yes_voter_ids: Voters voting YES, as ids or a boolean row mask
+        no_voter_ids: Voters voting NO, as ids or a boolean row mask
+        coefficients: (scenarios x 5) array or a list of WeightCoefficients
+        threshold: Passing threshold (0.0-1.0)
+        bounds: Min/max bounds for normalization
+        weight_by_count: Multiply each group's weight by its voter count
+            instead of counting every profile once
+
+    Returns:
+        Dictionary of per-scenario arrays ``passed``, ``total_yes``,
+        ``total_no`` and ``margin`` (positive when the motion passes), the
+        ``coefficients`` evaluated, and the ``boundary``: the hyperplane
+        normal in ATTRIBUTES order and its crossings of the simplex edges.
+    """
+    table = as_voter_table(profiles)
+    C = coefficient_matrix(coefficients)
+
+    # Normalized attributes, computed once for every scenario
+    scale, shift = normalization_kernel(bounds)
+    normalized = table.values * scale + shift
+    sides = np.stack([voter_votes(table, yes_voter_ids),
+                      voter_votes(table, no_voter_ids)], axis=1).astype(np.float64)
+    if weight_by_count:
+        sides *= table.counts[:, None]
+    side_attributes = normalized.T @ sides      # (5 x 2) attribute sums per side
+
+    totals = C @ side_attributes
+    total_yes, total_no = totals[:, 0], totals[:, 1]
+
+    # yes / (yes + no) > t  <=>  coeffs @ (yes_attr - t * (yes_attr + no_attr)) > 0
+    normal = side_attributes[:, 0] - threshold * side_attributes.sum(axis=1)
+    margin = C @ normal
+    passed = (margin > 0) & (total_yes + total_no > 0)
+
+    return {
+        "coefficients": C,
+        "passed": passed,
+        "total_yes": total_yes,
+        "total_no": total_no,
+        "margin": margin,
+        "boundary": {
+            "attributes": list(ATTRIBUTES),
+            "normal": normal,
+            "edge_points": boundary_points(normal),
+        },
+    }
@@ -0,0 +1,218 @@
+"""
+Mergeable tallies for counting ballots chunk by chunk.
+
+Most rules only need a few sufficient statistics of the profile: plurality,
+Borda and the other positional rules need position counts, the Condorcet
+family needs the pairwise preference counts, the cardinal rules need
+score sums and majority judgment needs grade histograms. These
+accumulators fold ballots into those statistics one chunk at a time in
+memory independent of the number of ballots. Two tallies over the same
+candidates merge by addition, so partial counts can be combined in any
+order.
+"""
+
+import hashlib
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from vote_types import Candidate
+from ballots import BallotMatrix, PAIRWISE_BLOCK_CELLS, as_ballot_matrix
+
+
+class BallotSummary(BallotMatrix):
+    """
+    A ranked profile reduced to its position and pairwise counts.
+
+    Positional rules, Bucklin, Baldwin/Nanson and the Condorcet family run on
+    a summary exactly as on the full matrix. Rules that follow individual
+    ballots (instant runoff, Coombs, two-round runoff, random dictatorship)
+    raise TypeError.
+    """
+
+    def __init__(
+            self,
+            candidates: Sequence[Candidate],
+            position_counts: np.ndarray,
+            pairwise_counts: np.ndarray,
+            num_ballots: int):
+        self.candidates: List[Candidate] = list(candidates)
+        self.ids: List[str] = [c.id for c in self.candidates]
+        self.index: Dict[str, int] = {cid: i for i, cid in enumerate(self.ids)}
+        self._pairwise = pairwise_counts
+        self._num_ballots = num_ballots
+        self._cache = {"position_counts": position_counts}
+
+    @property
+    def ranks(self) -> np.ndarray:
+        raise _needs_ballots()
+
+    @property
+    def counts(self) -> np.ndarray:
+        raise _needs_ballots()
+
+    @property
+    def num_ballots(self) -> int:
+        return self._num_ballots
+
+    @property
+    def depth(self) -> int:
+        return self.position_counts().shape[1]
+
+    def pairwise_counts(self) -> np.ndarray:
+        return self._pairwise
+
+    def _hash_contents(self) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update("\x1f".join(self.ids).encode("utf-8"))
+        digest.update(b"summary")
+        digest.update(np.ascontiguousarray(self.position_counts(), dtype=np.int64))
+        digest.update(np.ascontiguousarray(self._pairwise, dtype=np.int64))
+        return digest.hexdigest()
+
+
+def _needs_ballots() -> TypeError:
+    return TypeError("a BallotSummary keeps only position and pairwise "
+                     "counts; this rule needs the individual ballots")
+
+
+class RankedTally:
+    """
+    Running position counts, pairwise counts and ballot total of ranked
+    ballots over a fixed candidate list.
+    """
+
+    def __init__(self, candidates: Sequence[Candidate]):
+        self.candidates: List[Candidate] = list(candidates)
+        self.ids: List[str] = [c.id for c in self.candidates]
+        m = len(self.candidates)
+        self.num_ballots = 0
+        self.depth = 0
+        self.positions = np.zeros((m, m), dtype=np.int64)
+        self.pairwise = np.zeros((m, m), dtype=np.int64)
+
+    def update(self, bm: BallotMatrix) -> "RankedTally":
+        """Fold a chunk of ballots into the tally"""
+        bm = as_ballot_matrix(self.candidates, bm)
+        self.num_ballots += bm.num_ballots
+        self.depth = max(self.depth, bm.depth)
+        self.positions[:, :bm.depth] += bm.position_counts()
+        self.pairwise += bm.pairwise_counts()
+        return self
+
+    def merge(self, other: "RankedTally") -> "RankedTally":
+        """Add another tally over the same candidates into this one"""
+        if other.ids != self.ids:
+            raise ValueError("cannot merge tallies over different candidates")
+        self.num_ballots += other.num_ballots
+        self.depth = max(self.depth, other.depth)
+        self.positions += other.positions
+        self.pairwise += other.pairwise
+        return self
+
+    @property
+    def first_preferences(self) -> np.ndarray:
+        """Voters ranking each candidate first"""
+        return self.positions[:, 0].copy() if self.depth else np.zeros(
+            len(self.candidates), dtype=np.int64)
+
+    def summary(self) -> BallotSummary:
+        """Snapshot the tally as a BallotSummary the ranked rules accept"""
+        return BallotSummary(self.candidates,
+                             self.positions[:, :self.depth].copy(),
+                             self.pairwise.copy(),
+                             self.num_ballots)
+
+
+class ScoreTally:
+    """
+    Running statistics of cardinal (approval or score) ballots.
+
+    ``sums`` are the total scores, ``approvals`` the number of ballots
+    scoring each candidate exactly 1, and ``prefers[x, y]`` the number of
+    ballots scoring x strictly above y (for the STAR runoff). Candidates
+    missing from a ballot score 0.
+    """
+
+    def __init__(self, candidates: Sequence[Candidate]):
+        self.candidates: List[Candidate] = list(candidates)
+        self.ids: List[str] = [c.id for c in self.candidates]
+        self.index: Dict[str, int] = {cid: i for i, cid in enumerate(self.ids)}
+        m = len(self.candidates)
+        self.num_ballots = 0
+        self.sums = np.zeros(m, dtype=np.float64)
+        self.approvals = np.zeros(m, dtype=np.int64)
+        self.prefers = np.zeros((m, m), dtype=np.int64)
+
+    def update(self, scores: np.ndarray) -> "ScoreTally":
+        """Fold an (n_ballots x num_candidates) block of scores into the tally"""
+        scores = np.asarray(scores, dtype=np.float64)
+        m = len(self.candidates)
+        self.num_ballots += scores.shape[0]
+        self.sums += scores.sum(axis=0)
+        self.approvals += (scores == 1).sum(axis=0)
+        rows = max(1, PAIRWISE_BLOCK_CELLS // max(1, m * m))
+        for start in range(0, scores.shape[0], rows):
+            block = scores[start:start + rows]
+            self.prefers += (block[:, :, None] > block[:, None, :]).sum(axis=0)
+        return self
+
+    def merge(self, other: "ScoreTally") -> "ScoreTally":
+        """Add another tally over the same candidates into this one"""
+        if other.ids != self.ids:
+            raise ValueError("cannot merge tallies over different candidates")
+        self.num_ballots += other.num_ballots
+        self.sums += other.sums
+        self.approvals += other.approvals
+        self.prefers += other.prefers
+        return self
+
+    def tallies(
+            self,
+            candidates: Sequence[Candidate],
+            values: np.ndarray) -> Dict[str, float]:
+        """Per-candidate ``values`` keyed by id; unknown candidates get 0"""
+        return {c.id: values[self.index[c.id]].item() if c.id in self.index else 0
+                for c in candidates}
+
+
+class GradeTally:
+    """
+    Running grade histograms of graded (majority judgment) ballots.
+
+    ``histograms[grade][c]`` is the number of ballots giving candidate ``c``
+    that grade; ballots that leave a candidate out are counted through
+    ``num_ballots``.
+    """
+
+    def __init__(self, candidates: Sequence[Candidate]):
+        self.candidates: List[Candidate] = list(candidates)
+        self.ids: List[str] = [c.id for c in self.candidates]
+        self.index: Dict[str, int] = {cid: i for i, cid in enumerate(self.ids)}
+        self.num_ballots = 0
+        self.histograms: Dict[str, np.ndarray] = {}
+
+    def _histogram(self, grade: str) -> np.ndarray:
+        if grade not in self.histograms:
+            self.histograms[grade] = np.zeros(len(self.candidates), dtype=np.int64)
+        return self.histograms[grade]
+
+    def update(self, ballots: Sequence[Dict[str, str]]) -> "GradeTally":
+        """Fold a chunk of {candidate id: grade} ballots into the tally"""
+        for ballot in ballots:
+            for cid, grade in ballot.items():
+                # Unknown candidates still contribute their grade to the scale
+                histogram = self._histogram(grade)
+                if cid in self.index:
+                    histogram[self.index[cid]] += 1
+        self.num_ballots += len(ballots)
+        return self
+
+    def merge(self, other: "GradeTally") -> "GradeTally":
+        """Add another tally over the same candidates into this one"""
+        if other.ids != self.ids:
+            raise ValueError("cannot merge tallies over different candidates")
+        self.num_ballots += other.num_ballots
+        for grade, histogram in other.histograms.items():
+            self._histogram(grade)[:] += histogram
+        return self
@@ -0,0 +1,1082 @@
+"""
+Tests for the voting rules and the modules built around them.
+
+The ranked rules run on integer-encoded ballot matrices; each is checked
+against a plain brute-force count over lists of candidate ids.
+"""
+
+import json
+import os
+import pickle
+import random
+import sqlite3
+import sys
+import threading
+import time
+from itertools import combinations, permutations
+
+import numpy as np
+import pytest
+
+# Add the package directory to the path for module imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vote_types import Candidate, VoterProfile, WeightCoefficients  # noqa: E402
+from ballots import BallotMatrix, BallotProfile  # noqa: E402
+from ballot_archive import append_archive, open_archive, write_archive  # noqa: E402
+from ballot_stream import tally_ranked_file  # noqa: E402
+from chart_store import ChartStore, content_id  # noqa: E402
+from election import (  # noqa: E402
+    calculate_weights, normalize, run_weighted_yes_no_election, voter_weights
+)
+from jobs import RUNNING, TIMED_OUT, JobPool, JobQueueFull  # noqa: E402
+from parallel import (  # noqa: E402
+    parallel_instant_runoff, parallel_ranked_tally, shard_archive, shard_matrix
+)
+from result_cache import ResultCache, cache_key  # noqa: E402
+from simulation import (  # noqa: E402
+    CULTURES, DEFAULT_RULES, grouped_profile, is_tie, mallows, polya_urn, simulate
+)
+from sweep import (  # noqa: E402
+    sample_simplex, simplex_grid, sweep_weighted_yes_no_election
+)
+from tallies import RankedTally  # noqa: E402
+from voters import ATTRIBUTES, VoterTable  # noqa: E402
+import visualization  # noqa: E402
+from visualization import (  # noqa: E402
+    PLOTLY_JS_NAME, PLOTLY_JS_SOURCE, install_plotly_js
+)
+import app as web  # noqa: E402
+from voting_systems import (  # noqa: E402
+    anti_plurality, baldwin, borda_count, bucklin, coombs, copeland, dowdall,
+    five_three_one, instant_runoff, kemeny_young, minimax, nanson, plurality,
+    ranked_pairs, schulze_method, schwartz_set, smith_irv, smith_set,
+    two_round_runoff, veto
+)
+
+CANDIDATES = [Candidate(id=cid, name=cid.upper()) for cid in ("a", "b", "c")]
+# Ids out of alphabetical order, so tie-breaks by id and by index differ
+SLATE = [Candidate(id=cid, name=cid.upper()) for cid in ("d", "b", "e", "a", "c")]
+SEEDS = range(12)
+
+RULES_BY_INPUT = (borda_count, instant_runoff, coombs, bucklin, baldwin,
+                  schulze_method)
+
+
+def random_ballots(seed, num_candidates=None, voters=None, truncated=0.3):
+    """Random rankings over the start of SLATE, some of them truncated"""
+    rng = random.Random(seed)
+    m = num_candidates or rng.randint(3, len(SLATE))
+    candidates = SLATE[:m]
+    ballots = []
+    for _ in range(voters or rng.randint(15, 60)):
+        ranking = [c.id for c in rng.sample(candidates, m)]
+        if rng.random() < truncated:
+            ranking = ranking[:rng.randint(1, m - 1)]
+        ballots.append(ranking)
+    return candidates, ballots
+
+
+# Brute-force references over lists of candidate ids
+
+
+def first_max(ids, scores):
+    return max(ids, key=lambda cid: scores[cid])
+
+
+def ref_pairwise(candidates, ballots):
+    """N[x][y]: voters ranking x above y, unranked below every ranked"""
+    ids = [c.id for c in candidates]
+    N = {x: {y: 0 for y in ids} for x in ids}
+    for ballot in ballots:
+        for x, y in permutations(ids, 2):
+            if x in ballot and (y not in ballot or ballot.index(x) < ballot.index(y)):
+                N[x][y] += 1
+    return N
+
+
+def ref_beats(candidates, ballots):
+    N = ref_pairwise(candidates, ballots)
+    return lambda x, y: N[x][y] > N[y][x]
+
+
+def ref_positional(candidates, ballots, weights):
+    scores = {c.id: 0 for c in candidates}
+    for ballot in ballots:
+        for position, cid in enumerate(ballot[:len(weights)]):
+            scores[cid] += weights[position]
+    return scores
+
+
+def ref_irv(candidates, ballots):
+    remaining = [c.id for c in candidates]
+    rounds = []
+    while len(remaining) > 1:
+        tallies = {cid: 0 for cid in remaining}
+        for ballot in ballots:
+            choice = next((cid for cid in ballot if cid in remaining), None)
+            if choice is not None:
+                tallies[choice] += 1
+        rounds.append(tallies)
+        total = sum(tallies.values())
+        for cid, votes in tallies.items():
+            if votes > total / 2:
+                return cid, rounds
+        remaining.remove(min(remaining, key=lambda cid: (tallies[cid], cid)))
+    return remaining[0], rounds
+
+
+def ref_ranked_pairs(candidates, ballots):
+    ids = [c.id for c in candidates]
+    N = ref_pairwise(candidates, ballots)
+    pairs = []
+    for i, j in combinations(range(len(ids)), 2):
+        x, y = ids[i], ids[j]
+        if N[x][y] != N[y][x]:
+            winner, loser = (x, y) if N[x][y] > N[y][x] else (y, x)
+            pairs.append((-abs(N[x][y] - N[y][x]), i, j, winner, loser))
+    locked = {cid: set() for cid in ids}
+
+    def reaches(start, target):
+        seen, stack = set(), [start]
+        while stack:
+            node = stack.pop()
+            if node == target:
+                return True
+            if node not in seen:
+                seen.add(node)
+                stack.extend(locked[node])
+        return False
+
+    for *_, winner, loser in sorted(pairs):
+        if not reaches(loser, winner):
+            locked[winner].add(loser)
+    beaten = set().union(*locked.values())
+    return next(cid for cid in ids if cid not in beaten)
+
+
+def ref_schulze(candidates, ballots):
+    ids = [c.id for c in candidates]
+    N = ref_pairwise(candidates, ballots)
+    p = {x: {y: N[x][y] if N[x][y] > N[y][x] else 0 for y in ids} for x in ids}
+    for k in ids:
+        for x in ids:
+            for y in ids:
+                if len({x, y, k}) == 3:
+                    p[x][y] = max(p[x][y], min(p[x][k], p[k][y]))
+    return next(x for x in ids if all(p[x][y] >= p[y][x] for y in ids))
+
+
+# Positional and elimination rules
+
+
+POSITIONAL = [
+    (plurality, lambda m: [1]),
+    (anti_plurality, lambda m: [0] * (m - 1) + [-1]),
+    (borda_count, lambda m: list(range(m - 1, -1, -1))),
+    (dowdall, lambda m: [1.0 / (i + 1) for i in range(m)]),
+    (veto, lambda m: [1.0] * (m - 1) + [0.0]),
+    (five_three_one, lambda m: [5, 3, 1]),
+]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("rule, weights", POSITIONAL)
+def test_positional_rules_match_reference(seed, rule, weights):
+    candidates, ballots = random_ballots(seed)
+    expected = ref_positional(candidates, ballots, weights(len(candidates)))
+    result = rule(candidates, ballots)
+    assert result.round_details[0]["tallies"] == pytest.approx(expected)
+    assert result.winner.id == first_max([c.id for c in candidates], expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_ballot_matrix_counts_like_the_lists(seed):
+    candidates, ballots = random_ballots(seed, truncated=0)
+    matrix = BallotMatrix.from_ballots(candidates, ballots)
+    for rule in RULES_BY_INPUT:
+        assert rule(candidates, matrix) == rule(candidates, ballots)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_ballot_profile_counts_like_the_lists(seed):
+    # Collapsed (ranking, count) rows weigh each ranking by its voters
+    candidates, ballots = random_ballots(seed, truncated=0)
+    profile = BallotProfile.from_ballots(candidates, ballots)
+    assert profile.num_ballots == len(ballots)
+    assert len(profile) == len(set(map(tuple, ballots)))
+    for rule in RULES_BY_INPUT:
+        assert rule(candidates, profile) == rule(candidates, ballots)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_instant_runoff_matches_reference(seed):
+    candidates, ballots = random_ballots(seed)
+    winner, rounds = ref_irv(candidates, ballots)
+    result = instant_runoff(candidates, ballots)
+    assert result.winner.id == winner
+    assert [r["tallies"] for r in result.round_details] == rounds
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_two_round_runoff_matches_reference(seed):
+    candidates, ballots = random_ballots(seed)
+    firsts = ref_positional(candidates, ballots, [1])
+    finalists = sorted(firsts, key=lambda cid: firsts[cid], reverse=True)[:2]
+    runoff = {cid: 0 for cid in finalists}
+    for ballot in ballots:
+        choice = next((cid for cid in ballot if cid in finalists), None)
+        if choice is not None:
+            runoff[choice] += 1
+    result = two_round_runoff(candidates, ballots)
+    assert result.round_details[1]["tallies"] == runoff
+    assert result.winner.id == first_max(finalists, runoff)
+
+
+def ref_coombs(candidates, ballots):
+    remaining = [c.id for c in candidates]
+    while len(remaining) > 1:
+        firsts = {cid: 0 for cid in remaining}
+        lasts = {cid: 0 for cid in remaining}
+        for ballot in ballots:
+            surviving = [cid for cid in ballot if cid in remaining]
+            if surviving:
+                firsts[surviving[0]] += 1
+                lasts[surviving[-1]] += 1
+        leader = first_max(remaining, firsts)
+        if firsts[leader] > sum(firsts.values()) / 2:
+            return leader
+        remaining.remove(first_max(remaining, lasts))
+    return remaining[0]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_coombs_matches_reference(seed):
+    candidates, ballots = random_ballots(seed)
+    assert coombs(candidates, ballots).winner.id == ref_coombs(candidates, ballots)
+
+
+def test_coombs_stops_at_a_first_preference_majority():
+    # a has a majority of first preferences but also the most last places,
+    # which used to eliminate it in the first round
+    ballots = [["a", "b", "c"]] * 3 + [["b", "c", "a"]] + [["c", "b", "a"]]
+    result = coombs(CANDIDATES, ballots)
+    assert result.winner.id == "a"
+    assert len(result.round_details) == 1
+
+
+def ref_bucklin(candidates, ballots, quota=0.5):
+    ids = [c.id for c in candidates]
+    for k in range(1, max(map(len, ballots)) + 1):
+        tallies = {cid: sum(cid in ballot[:k] for ballot in ballots) for cid in ids}
+        if max(tallies.values()) > quota * len(ballots):
+            break
+    return first_max(ids, tallies)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_bucklin_matches_reference(seed):
+    candidates, ballots = random_ballots(seed)
+    assert bucklin(candidates, ballots).winner.id == ref_bucklin(candidates, ballots)
+
+
+def test_bucklin_quota_counts_voters():
+    # The quota is half of the 5 voters. It used to be half of each
+    # round's tallies, which grow every round, so b's 5 of 10 in round 2
+    # fell short.
+    ballots = [["a", "b", "c"]] * 2 + [["b", "c", "a"]] * 2 + [["c", "b", "a"]]
+    result = bucklin(CANDIDATES, ballots)
+    assert result.winner.id == "b"
+    assert len(result.round_details) == 2
+
+
+def ref_borda_elimination(candidates, ballots, drop_below_avg):
+    # Borda recounted among the remaining candidates every round
+    remaining = [c.id for c in candidates]
+    while len(remaining) > 1:
+        scores = {cid: 0 for cid in remaining}
+        for ballot in ballots:
+            ranked = [cid for cid in ballot if cid in remaining]
+            for position, cid in enumerate(ranked):
+                scores[cid] += len(remaining) - 1 - position
+        if drop_below_avg:
+            avg = sum(scores.values()) / len(remaining)
+            dropped = [cid for cid in remaining if scores[cid] < avg]
+        else:
+            dropped = [min(remaining, key=lambda cid: scores[cid])]
+        if not dropped:
+            break
+        remaining = [cid for cid in remaining if cid not in dropped]
+    return remaining[0]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("rule, drop_below_avg", [(baldwin, False), (nanson, True)])
+def test_borda_elimination_matches_reference(seed, rule, drop_below_avg):
+    candidates, ballots = random_ballots(seed)
+    expected = ref_borda_elimination(candidates, ballots, drop_below_avg)
+    assert rule(candidates, ballots).winner.id == expected
+
+
+def test_baldwin_recounts_borda_among_the_remaining():
+    # Once c is out, a and b are scored against each other only, not by
+    # their positions on the full ballots (where a leads 6 to 5)
+    ballots = [["a", "c", "b"]] * 2 + [["c", "b", "a"]] + [["b", "a", "c"]] * 2
+    result = baldwin(CANDIDATES, ballots)
+    assert result.round_details[1]["tallies"] == {"a": 2, "b": 3}
+    assert result.winner.id == "b"
+
+
+# Condorcet rules
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_copeland_and_minimax_match_reference(seed):
+    candidates, ballots = random_ballots(seed, truncated=0)
+    ids = [c.id for c in candidates]
+    N = ref_pairwise(candidates, ballots)
+    wins = {x: sum((N[x][y] > N[y][x]) - (N[x][y] < N[y][x]) for y in ids)
+            for x in ids}
+    worst = {x: max(N[y][x] - N[x][y] for y in ids if y != x) for x in ids}
+    assert copeland(candidates, ballots).winner.id == first_max(ids, wins)
+    assert minimax(candidates, ballots).winner.id == min(ids, key=worst.get)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_ranked_pairs_matches_reference(seed):
+    candidates, ballots = random_ballots(seed, truncated=0)
+    result = ranked_pairs(candidates, ballots)
+    assert result.winner.id == ref_ranked_pairs(candidates, ballots)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_schulze_matches_reference(seed):
+    candidates, ballots = random_ballots(seed, truncated=0)
+    result = schulze_method(candidates, ballots)
+    assert result.winner.id == ref_schulze(candidates, ballots)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_pairwise_counts_rank_unranked_candidates_last(seed):
+    candidates, ballots = random_ballots(seed)
+    ids = [c.id for c in candidates]
+    N = ref_pairwise(candidates, ballots)
+    counts = BallotProfile.from_ballots(candidates, ballots).pairwise_counts()
+    assert counts.tolist() == [[N[x][y] for y in ids] for x in ids]
+    assert ranked_pairs(candidates, ballots).winner.id == ref_ranked_pairs(
+        candidates, ballots)
+    assert schulze_method(candidates, ballots).winner.id == ref_schulze(
+        candidates, ballots)
+    matrix = BallotMatrix.from_ballots(candidates, ballots)
+    profile = BallotProfile.from_ballots(candidates, ballots)
+    for rule in RULES_BY_INPUT:
+        expected = rule(candidates, ballots)
+        assert rule(candidates, matrix) == expected
+        assert rule(candidates, profile) == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_schulze_ranking_puts_no_one_above_a_candidate_beating_them(seed):
+    candidates, ballots = random_ballots(seed)
+    detail = schulze_method(candidates, ballots).round_details[0]
+    ranking, p = detail["ranking"], detail["strengths"]
+    assert sorted(ranking) == sorted(c.id for c in candidates)
+    assert ranking[0] == ref_schulze(candidates, ballots)
+    for i, x in enumerate(ranking):
+        assert not any(p[y][x] > p[x][y] for y in ranking[i:])
+
+
+def ref_smith_set(candidates, ballots):
+    ids = [c.id for c in candidates]
+    beats = ref_beats(candidates, ballots)
+    for size in range(1, len(ids) + 1):
+        for subset in combinations(ids, size):
+            outside = [y for y in ids if y not in subset]
+            if all(beats(x, y) for x in subset for y in outside):
+                return set(subset)
+
+
+def ref_schwartz_set(candidates, ballots):
+    ids = [c.id for c in candidates]
+    beats = ref_beats(candidates, ballots)
+    undominated = [set(subset) for size in range(1, len(ids) + 1)
+                   for subset in combinations(ids, size)
+                   if not any(beats(y, x) for x in subset
+                              for y in ids if y not in subset)]
+    minimal = [s for s in undominated if not any(t < s for t in undominated)]
+    return set().union(*minimal)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_smith_and_schwartz_sets_match_reference(seed):
+    candidates, ballots = random_ballots(seed)
+    smith = {c.id for c in smith_set(candidates, ballots)}
+    schwartz = {c.id for c in schwartz_set(candidates, ballots)}
+    assert smith == ref_smith_set(candidates, ballots)
+    assert schwartz == ref_schwartz_set(candidates, ballots)
+    assert schwartz <= smith
+
+
+def test_smith_irv_runs_instant_runoff_on_the_smith_set():
+    candidates = [Candidate(id=cid, name=cid.upper()) for cid in "abcd"]
+    # a > b > c > a beat d, which still has the most first preferences
+    ballots = ([["a", "b", "c", "d"]] * 5 + [["b", "c", "a", "d"]] * 5
+               + [["c", "a", "b", "d"]] * 5 + [["d", "a", "b", "c"]] * 2
+               + [["d", "b", "c", "a"]] * 2 + [["d", "c", "a", "b"]] * 2)
+    smith = smith_set(candidates, ballots)
+    assert {c.id for c in smith} == {"a", "b", "c"}
+    result = smith_irv(candidates, ballots)
+    assert set(result.round_details[0]["tallies"]) == {"a", "b", "c"}
+    assert result.winner.id == ref_irv(smith, ballots)[0]
+    assert "d" in instant_runoff(candidates, ballots).round_details[0]["tallies"]
+
+
+def ref_kemeny(candidates, ballots):
+    # The first, in permutation order, of the rankings agreeing most
+    N = ref_pairwise(candidates, ballots)
+    return max(permutations(c.id for c in candidates),
+               key=lambda r: sum(N[x][y] for x, y in combinations(r, 2)))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_kemeny_dynamic_programming_matches_brute_force(seed):
+    candidates, ballots = random_ballots(seed)
+    detail = kemeny_young(candidates, ballots).round_details[0]
+    assert detail["exact"]
+    assert detail["optimality_gap"] == 0
+    assert tuple(detail["ranking"]) == ref_kemeny(candidates, ballots)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_kemeny_local_search_is_bounded_by_the_optimum(seed):
+    candidates, ballots = random_ballots(seed)
+    exact = kemeny_young(candidates, ballots).round_details[0]
+    local = kemeny_young(candidates, ballots, exact_limit=0).round_details[0]
+    assert not local["exact"]
+    assert sorted(local["ranking"]) == sorted(c.id for c in candidates)
+    assert local["score"] <= exact["score"] <= local["upper_bound"]
+    assert local["optimality_gap"] == local["upper_bound"] - local["score"]
+
+
+def test_kemeny_local_search_finds_a_majority_order():
+    ballots = [["e", "a", "d", "b", "c"]] * 5 + [["a", "e", "b", "d", "c"]] * 3
+    detail = kemeny_young(SLATE, ballots, exact_limit=0).round_details[0]
+    assert detail["ranking"] == ["e", "a", "d", "b", "c"]
+    assert detail["optimality_gap"] == 0
+
+
+# Weighted votes
+
+
+def random_profiles(seed, n=30):
+    rng = random.Random(seed)
+    return [VoterProfile(id=f"v{i}", E=rng.randint(1, 10), P=rng.randint(0, 100),
+                         D=rng.randint(1, 10), A=rng.randint(1, 10),
+                         S=rng.randint(0, 100), count=rng.randint(1, 40))
+            for i in range(n)]
+
+
+def ref_weights(profiles, coeffs, bounds):
+    """The per-profile formula the vectorized weights replaced"""
+    lo, hi = bounds["min"], bounds["max"]
+    return {p.id: sum(getattr(coeffs, "w" + a)
+                      * normalize(getattr(p, a), getattr(lo, a), getattr(hi, a))
+                      for a in ATTRIBUTES)
+            for p in profiles}
+
+
+WEIGHT_BOUNDS = {
+    # The usual range, with some scores outside it
+    "range": {"min": VoterProfile(id="min", E=2, P=10, D=2, A=2, S=10),
+              "max": VoterProfile(id="max", E=9, P=90, D=9, A=9, S=90)},
+    # Empty and inverted ranges normalize to 0
+    "degenerate": {"min": VoterProfile(id="min", E=5, P=50, D=1, A=8, S=0),
+                   "max": VoterProfile(id="max", E=5, P=40, D=10, A=8, S=100)},
+}
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("bounds", WEIGHT_BOUNDS.values(), ids=WEIGHT_BOUNDS.keys())
+def test_voter_weights_match_the_per_profile_formula(seed, bounds):
+    profiles = random_profiles(seed)
+    rng = random.Random(seed)
+    coeffs = WeightCoefficients(*(rng.random() for _ in ATTRIBUTES))
+    expected = ref_weights(profiles, coeffs, bounds)
+    table = VoterTable.from_profiles(profiles)
+    assert table.ids.tolist() == [p.id for p in profiles]
+    assert table.counts.tolist() == [p.count for p in profiles]
+    assert calculate_weights(profiles, coeffs, bounds) == pytest.approx(expected)
+    assert calculate_weights(table, coeffs, bounds) == pytest.approx(expected)
+    assert voter_weights(table, coeffs, bounds).tolist() == pytest.approx(
+        [expected[p.id] for p in profiles])
+
+
+def test_voter_weights_normalize_the_bounds_to_zero_and_one():
+    bounds = WEIGHT_BOUNDS["range"]
+    table = VoterTable.from_profiles([bounds["min"], bounds["max"]])
+    for i, a in enumerate(ATTRIBUTES):
+        coeffs = WeightCoefficients(*(float(j == i) for j in range(len(ATTRIBUTES))))
+        assert voter_weights(table, coeffs, bounds).tolist() == pytest.approx(
+            [0.0, 1.0]), a
+        degenerate = voter_weights(table, coeffs, WEIGHT_BOUNDS["degenerate"])
+        if a in "EPA":
+            assert degenerate.tolist() == [0.0, 0.0], a
+
+
+@pytest.mark.parametrize("steps", [1, 2, 5, 8])
+def test_simplex_grid_rows_sum_to_one(steps):
+    grid = simplex_grid(steps)
+    assert grid.shape == (len(list(combinations(range(steps + 4), 4))), 5)
+    assert (grid >= 0).all()
+    assert grid.sum(axis=1) == pytest.approx(1.0)
+    assert len({tuple(row) for row in (grid * steps).round().astype(int)}) == len(grid)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("weight_by_count", [False, True])
+def test_sweep_matches_one_election_per_grid_point(seed, weight_by_count):
+    profiles = random_profiles(seed, n=12)
+    rng = random.Random(seed)
+    yes_ids = [p.id for p in profiles if rng.random() < 0.5]
+    no_ids = [p.id for p in profiles if p.id not in yes_ids]
+    bounds = WEIGHT_BOUNDS["range"]
+    threshold = rng.choice([0.4, 0.5, 0.6])
+    result = sweep_weighted_yes_no_election(
+        profiles, yes_ids, no_ids, simplex_grid(6), threshold, bounds,
+        weight_by_count=weight_by_count)
+    for coeffs, passed, yes, no, margin in zip(
+            result["coefficients"], result["passed"], result["total_yes"],
+            result["total_no"], result["margin"]):
+        expected = run_weighted_yes_no_election(
+            profiles, yes_ids, no_ids, WeightCoefficients(*coeffs), threshold,
+            bounds, weight_by_count=weight_by_count)
+        assert yes == pytest.approx(expected["total_yes"])
+        assert no == pytest.approx(expected["total_no"])
+        if abs(margin) > 1e-9:
+            # Grid points on the boundary may round either way
+            assert passed == expected["passed"]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_sweep_boundary_separates_passed_from_failed(seed):
+    profiles = random_profiles(seed, n=12)
+    yes_ids = [p.id for p in profiles[::2]]
+    no_ids = [p.id for p in profiles[1::2]]
+    coefficients = sample_simplex(500, seed=seed)
+    result = sweep_weighted_yes_no_election(
+        profiles, yes_ids, no_ids, coefficients, 0.5, WEIGHT_BOUNDS["range"])
+    normal = result["boundary"]["normal"]
+    assert ((coefficients @ normal > 0) == result["passed"]).all()
+    for point in result["boundary"]["edge_points"]:
+        assert sum(point) == pytest.approx(1.0)
+        assert float(normal @ point) == pytest.approx(0.0, abs=1e-9)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_weight_by_count_equals_one_profile_per_voter(seed):
+    profiles = random_profiles(seed, n=10)
+    yes_ids = [p.id for p in profiles[::3]]
+    no_ids = [p.id for p in profiles if p.id not in yes_ids]
+    voters = [VoterProfile(id=f"{p.id}.{k}", E=p.E, P=p.P, D=p.D, A=p.A, S=p.S)
+              for p in profiles for k in range(p.count)]
+    coeffs = WeightCoefficients(0.3, 0.2, 0.2, 0.2, 0.1)
+    bounds = WEIGHT_BOUNDS["range"]
+    expected = run_weighted_yes_no_election(
+        voters, [v.id for v in voters if v.id.split(".")[0] in yes_ids],
+        [v.id for v in voters if v.id.split(".")[0] in no_ids],
+        coeffs, 0.5, bounds)
+    for group in (profiles, VoterTable.from_profiles(profiles)):
+        result = run_weighted_yes_no_election(
+            group, yes_ids, no_ids, coeffs, 0.5, bounds, weight_by_count=True)
+        assert result["passed"] == expected["passed"]
+        assert result["total_yes"] == pytest.approx(expected["total_yes"])
+        assert result["total_no"] == pytest.approx(expected["total_no"])
+
+
+def test_repeated_voter_ids_vote_once_per_listing_on_every_path():
+    profiles = random_profiles(0, n=6)
+    table = VoterTable.from_profiles(profiles)
+    yes_ids = ["v0", "v0", "v3", "unknown"]
+    no_ids = ["v1", "v2", "v2", "v2"]
+    coeffs = WeightCoefficients(0.2, 0.2, 0.2, 0.2, 0.2)
+    bounds = WEIGHT_BOUNDS["range"]
+    weights = calculate_weights(profiles, coeffs, bounds)
+    results = [run_weighted_yes_no_election(profiles, yes_ids, no_ids, coeffs,
+                                            0.5, bounds),
+               run_weighted_yes_no_election(table, yes_ids, no_ids, coeffs,
+                                            0.5, bounds)]
+    swept = sweep_weighted_yes_no_election(
+        table, yes_ids, no_ids, [coeffs], 0.5, bounds)
+    results.append({"total_yes": swept["total_yes"][0],
+                    "total_no": swept["total_no"][0]})
+    for result in results:
+        assert result["total_yes"] == pytest.approx(2 * weights["v0"] + weights["v3"])
+        assert result["total_no"] == pytest.approx(weights["v1"] + 3 * weights["v2"])
+
+
+# Tallies and ballot files
+
+
+@pytest.mark.parametrize("seed", SEEDS[:4])
+def test_merged_tallies_count_like_the_ballots(seed):
+    candidates, ballots = random_ballots(seed, num_candidates=5, voters=90)
+    parts = [RankedTally(candidates).update(
+        BallotProfile.from_ballots(candidates, ballots[i:i + 30]))
+        for i in range(0, 90, 30)]
+    summary = parts[0].merge(parts[1]).merge(parts[2]).summary()
+    assert summary.num_ballots == 90
+    for rule in (borda_count, bucklin, nanson, copeland, schulze_method):
+        assert rule(candidates, summary) == rule(candidates, ballots)
+    with pytest.raises(TypeError):
+        instant_runoff(candidates, summary)
+
+
+def test_ranked_file_tally_reads_in_chunks(tmp_path):
+    candidates, ballots = random_ballots(1, num_candidates=5, voters=50)
+    path = tmp_path / "ballots.csv"
+    path.write_text("".join(",".join(ballot) + "\n" for ballot in ballots))
+    summary = tally_ranked_file(str(path), candidates, chunk_rows=7).summary()
+    assert summary.num_ballots == 50
+    assert borda_count(candidates, summary) == borda_count(candidates, ballots)
+
+
+# Ballot archives and parallel counts
+
+
+@pytest.mark.parametrize("kind", [BallotMatrix, BallotProfile])
+def test_archive_round_trip(tmp_path, kind):
+    candidates, ballots = random_ballots(2, num_candidates=5, voters=40)
+    path = str(tmp_path / "ballots.vsb")
+    write_archive(path, kind.from_ballots(candidates, ballots[:25]))
+    append_archive(path, kind.from_ballots(candidates, ballots[25:]))
+    bm = open_archive(path)
+    assert isinstance(bm, kind)
+    assert bm.num_ballots == 40
+    for rule in (borda_count, instant_runoff, coombs, ranked_pairs):
+        assert rule(candidates, bm) == rule(candidates, ballots)
+
+
+def test_parallel_counts_match_serial(tmp_path):
+    candidates, ballots = random_ballots(3, num_candidates=5, voters=200)
+    bm = BallotMatrix.from_ballots(candidates, ballots)
+    path = str(tmp_path / "ballots.vsb")
+    write_archive(path, bm)
+    for shards in (shard_matrix(bm, 3), shard_archive(path, 3)):
+        summary = parallel_ranked_tally(candidates, shards, workers=2).summary()
+        assert (schulze_method(candidates, summary)
+                == schulze_method(candidates, ballots))
+        assert (parallel_instant_runoff(candidates, shards, workers=2)
+                == instant_runoff(candidates, ballots))
+
+
+# Simulation ties
+
+
+def test_copeland_cycle_is_a_tie():
+    # a > b > c > a: every candidate has one win and one loss
+    ballots = [["a", "b", "c"], ["b", "c", "a"], ["c", "a", "b"]]
+    result = copeland(CANDIDATES, ballots)
+    assert result.scores == {"a": 0, "b": 0, "c": 0}
+    assert is_tie(result)
+
+
+def test_copeland_condorcet_winner_is_not_a_tie():
+    ballots = [["a", "b", "c"], ["a", "c", "b"], ["b", "a", "c"]]
+    result = copeland(CANDIDATES, ballots)
+    assert result.winner.id == "a"
+    assert not is_tie(result)
+
+
+def test_minimax_scores_are_negated_worst_defeats():
+    ballots = [["a", "b", "c"]] * 3 + [["b", "c", "a"]] * 2
+    result = minimax(CANDIDATES, ballots)
+    assert result.winner.id == "a"
+    # a's worst contest is a win by one, so its worst defeat is -1
+    assert result.scores == {"a": 1, "b": -1, "c": -5}
+    assert not is_tie(result)
+
+
+def test_simulation_counts_copeland_ties():
+    report = simulate(rules={"copeland": copeland}, elections=200, voters=101,
+                      num_candidates=5, seed=1)
+    assert 0.1 < report.tie_frequency["copeland"] < 0.4
+
+
+# Simulation cultures
+
+
+@pytest.mark.parametrize("culture", CULTURES)
+def test_cultures_draw_seeded_rankings(culture):
+    draw = [CULTURES[culture](50, 5, np.random.default_rng(7)) for _ in range(2)]
+    assert np.array_equal(draw[0], draw[1])
+    assert draw[0].shape == (50, 5)
+    assert (np.sort(draw[0], axis=1) == np.arange(5)).all()
+
+
+def test_mallows_without_dispersion_returns_the_reference():
+    rng = np.random.default_rng(0)
+    assert (mallows(20, 4, rng, phi=0.0) == np.arange(4)).all()
+    assert (mallows(20, 4, rng, phi=1e-12, reference=[2, 0, 3, 1])
+            == [2, 0, 3, 1]).all()
+
+
+@pytest.mark.parametrize("phi", [0.2, 0.5, 1.0])
+def test_mallows_draws_the_reference_with_its_model_probability(phi):
+    ranks = mallows(20000, 4, np.random.default_rng(3), phi=phi)
+    # P(reference) = 1 / Z with Z = prod over i of (1 + phi + ... + phi ** i)
+    z = np.prod([sum(phi ** k for k in range(i + 1)) for i in range(4)])
+    share = (ranks == np.arange(4)).all(axis=1).mean()
+    assert share == pytest.approx(1 / z, abs=0.015)
+
+
+def test_urn_with_strong_contagion_copies_the_first_voter():
+    ranks = polya_urn(30, 5, np.random.default_rng(0), alpha=1e12)
+    assert (ranks == ranks[0]).all()
+    ranks = polya_urn(300, 5, np.random.default_rng(0), alpha=0.0)
+    assert len({tuple(r) for r in ranks}) > 60
+
+
+@pytest.mark.parametrize("culture,params", [("ic", {}), ("mallows", {"phi": 0.8}),
+                                            ("urn", {"alpha": 0.05})])
+def test_simulation_condorcet_methods_always_elect_the_condorcet_winner(
+        culture, params):
+    report = simulate(culture=culture, elections=60, voters=25, num_candidates=4,
+                      seed=5, **params)
+    assert report.condorcet_winner_rate > 0
+    for name in ("copeland", "minimax", "ranked_pairs", "schulze_method"):
+        assert report.condorcet_efficiency[name] == 1.0, name
+
+
+def test_simulation_agreement_is_symmetric_with_a_unit_diagonal():
+    report = simulate(elections=80, voters=31, num_candidates=4, seed=2)
+    agreement = report.agreement
+    assert report.rules == list(DEFAULT_RULES)
+    assert agreement.shape == (len(DEFAULT_RULES), len(DEFAULT_RULES))
+    assert np.array_equal(agreement, agreement.T)
+    assert (np.diag(agreement) == 1.0).all()
+    assert ((0 <= agreement) & (agreement <= 1)).all()
+
+
+def test_simulation_is_reproducible_for_a_seed():
+    runs = [simulate(culture="mallows", phi=0.7, elections=30, voters=21, seed=9)
+            for _ in range(2)]
+    assert runs[0].to_dict() == runs[1].to_dict()
+
+
+# Generated ballots
+
+
+def same_profile(x, y):
+    return np.array_equal(x.ranks, y.ranks) and np.array_equal(x.counts, y.counts)
+
+
+def first_preferences(profile):
+    return np.bincount(profile.ranks[:, 0], weights=profile.counts,
+                       minlength=profile.num_candidates)
+
+
+def test_the_same_seed_generates_the_same_ballots():
+    candidates, profiles = web.get_uk_parties(), web.get_voter_profiles()
+    ballots = [web.generate_ballots_for_election(candidates, profiles, seed)
+               for seed in (11, 11, 12)]
+    assert same_profile(ballots[0], ballots[1])
+    assert not same_profile(ballots[0], ballots[2])
+    assert ballots[0].num_ballots == sum(p.count for p in profiles)
+    groups = [(["c", "a"], 40), (["b"], 25)]
+    grouped = [grouped_profile(SLATE, groups, np.random.default_rng(3), depth=3)
+               for _ in range(2)]
+    assert same_profile(*grouped)
+
+
+def test_first_preferences_follow_the_group_sizes():
+    groups = [(["c", "a"], 3000), (["b"], 2000), (["e", "d"], 1000)]
+    index = {c.id: i for i, c in enumerate(SLATE)}
+    loyal = grouped_profile(SLATE, groups, np.random.default_rng(0), shuffle_rate=0.0)
+    expected = np.zeros(len(SLATE))
+    for base, voters in groups:
+        expected[index[base[0]]] += voters
+    assert first_preferences(loyal).tolist() == expected.tolist()
+    # Shuffling voters rank every candidate first equally often
+    mixed = grouped_profile(SLATE, groups, np.random.default_rng(0), shuffle_rate=0.3)
+    shares = first_preferences(mixed) / mixed.num_ballots
+    assert shares == pytest.approx(0.7 * expected / 6000 + 0.3 / len(SLATE), abs=0.02)
+
+
+@pytest.fixture
+def client():
+    web.app.config["TESTING"] = True
+    with web.app.test_client() as client:
+        yield client
+
+
+def test_ranked_choice_endpoints_return_the_seed_they_used(client):
+    data = {"rule": "borda_count", "round_duration": 0}
+    given = client.post("/api/run-ranked-choice", json={**data, "seed": 1234})
+    assert given.get_json()["seed"] == 1234
+    fresh = client.post("/api/run-ranked-choice", json=data).get_json()
+    again = client.post("/api/run-ranked-choice",
+                        json={**data, "seed": fresh["seed"]}).get_json()
+    assert again == fresh
+    timed = client.post("/api/run-ranked-choice-timed", json={**data, "seed": 99})
+    assert timed.get_json()["seed"] == 99
+    job = client.post("/api/jobs/ranked-choice", json={**data, "seed": 7}).get_json()
+    assert web.rule_pool("borda_count").wait(job["job_id"]).result["seed"] == 7
+
+
+# Result cache
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(max_bytes=400)
+    cache.put("a", b"a" * 150)
+    cache.put("b", b"b" * 150)
+    assert cache.get("a") is not None
+    cache.put("c", b"c" * 150)
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.evictions == 1
+
+
+def test_result_cache_persists_to_sqlite(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    key = cache_key("borda_count", CANDIDATES, 7)
+    assert key == cache_key("borda_count", list(CANDIDATES), 7)
+    assert key != cache_key("borda_count", CANDIDATES, 8)
+    result = borda_count(CANDIDATES, [["a", "b", "c"]])
+    ResultCache(path=path).put(key, result)
+    calls = []
+    cached = ResultCache(path=path).get_or_compute(key, lambda: calls.append(key))
+    assert cached == result
+    assert not calls
+
+
+def test_result_cache_bounds_its_sqlite_table(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    size = len(pickle.dumps(b"x" * 100, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = ResultCache(path=path, max_disk_bytes=3 * size)
+    for key in "abc":
+        cache.put(key, key.encode() * 100)
+    cache = ResultCache(path=path, max_disk_bytes=3 * size)
+    assert cache.get("a") is not None
+    cache.put("d", b"d" * 100)
+    cache.put("d", b"D" * 100)
+    stats = cache.stats()
+    assert stats["disk_bytes"] == 3 * size
+    with sqlite3.connect(path) as db:
+        keys = {key for key, in db.execute("SELECT key FROM results")}
+        assert db.execute("SELECT SUM(size) FROM results").fetchone()[0] == 3 * size
+    # "b" was the least recently written or loaded
+    assert keys == {"a", "c", "d"}
+    assert ResultCache(path=path, max_disk_bytes=size).stats()["disk_bytes"] == size
+
+
+def test_result_cache_replaces_a_table_without_sizes(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE results (key TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        db.execute("INSERT INTO results VALUES ('a', ?)", (pickle.dumps(1),))
+    cache = ResultCache(path=path)
+    assert cache.get("a") is None
+    cache.put("a", 2)
+    assert ResultCache(path=path).get("a") == 2
+
+
+def test_ballot_keys_cover_the_generator_and_its_version(monkeypatch):
+    args = web.get_uk_parties(), web.get_voter_profiles(), 5
+    key = web.ballots_key(*args)
+    for name, value in [("BALLOTS_VERSION", web.BALLOTS_VERSION + 1),
+                        ("BALLOT_SHUFFLE_RATE", 0.5), ("BALLOT_DEPTH", 3)]:
+        with monkeypatch.context() as patch:
+            patch.setattr(web, name, value)
+            assert web.ballots_key(*args) != key, name
+
+
+def test_rule_results_are_keyed_by_the_rules_version(monkeypatch):
+    monkeypatch.setattr(web, "result_cache", ResultCache())
+    args = "borda_count", web.get_uk_parties(), web.get_voter_profiles(), 5
+    first = web.run_ranked_rule(*args)
+    assert web.run_ranked_rule(*args) is first
+    monkeypatch.setattr(web, "RULES_VERSION", web.RULES_VERSION + 1)
+    assert web.run_ranked_rule(*args) is not first
+
+
+def test_cached_ballots_are_measured_with_their_statistics(monkeypatch):
+    cache = ResultCache()
+    monkeypatch.setattr(web, "result_cache", cache)
+    candidates = web.get_uk_parties()
+    ballots = web.get_election_ballots(candidates, web.get_voter_profiles(), 5)
+    stored = cache.stats()["bytes"]
+    for rule in (borda_count, copeland, schulze_method, kemeny_young, smith_irv):
+        rule(candidates, ballots)
+    assert len(pickle.dumps(ballots, protocol=pickle.HIGHEST_PROTOCOL)) == stored
+
+
+def test_chart_store_evicts_least_recently_used_within_its_budget():
+    store = ChartStore(max_bytes=250)
+    a, b = store.put(b"a" * 100), store.put(b"b" * 100)
+    assert store.get(a) == b"a" * 100
+    c = store.put(b"c" * 100)
+    assert store.get(b) is None
+    assert store.get(a) is not None and store.get(c) is not None
+    assert store.stats()["bytes"] == 200 and store.evictions == 1
+    # Content over the whole budget is not stored
+    store.put(b"d" * 300)
+    assert len(store) == 2
+
+
+def test_chart_store_expires_charts_and_their_inputs():
+    now = [0.0]
+    store = ChartStore(ttl=10.0, clock=lambda: now[0])
+    renders = []
+
+    def render():
+        renders.append(now[0])
+        return b"figure"
+
+    chart_id = store.get_or_render("inputs", render)
+    now[0] = 9.0
+    assert store.get_or_render("inputs", render) == chart_id
+    assert store.get(chart_id) == b"figure"
+    now[0] = 10.0
+    assert store.get(chart_id) is None
+    assert store.lookup("inputs") is None
+    assert store.get_or_render("inputs", render) == chart_id
+    assert renders == [0.0, 10.0]
+
+
+def test_chart_store_shares_identical_figures():
+    now = [0.0]
+    store = ChartStore(ttl=10.0, clock=lambda: now[0])
+    first = store.put(b"figure", "one")
+    now[0] = 5.0
+    assert store.put(b"figure", "two") == first == content_id(b"figure")
+    assert len(store) == 1 and store.stats()["bytes"] == len(b"figure")
+    assert store.lookup("one") == store.lookup("two") == first
+    # The second put refreshed the shared chart's lifetime
+    now[0] = 12.0
+    assert store.get(first) == b"figure"
+
+
+# Chart delivery
+
+
+def test_install_plotly_js_renames_a_complete_copy_into_place(tmp_path, monkeypatch):
+    target = tmp_path / "js" / PLOTLY_JS_NAME
+    with open(PLOTLY_JS_SOURCE, "rb") as f:
+        bundle = f.read()
+    renames = []
+    replace = os.replace
+
+    def spy(src, dst):
+        # The target only appears, complete, when the temporary file is renamed
+        assert not target.exists()
+        assert os.path.dirname(src) == str(target.parent)
+        with open(src, "rb") as f:
+            assert f.read() == bundle
+        renames.append((src, dst))
+        replace(src, dst)
+
+    monkeypatch.setattr(visualization.os, "replace", spy)
+    assert install_plotly_js(str(target.parent)) == PLOTLY_JS_NAME
+    assert renames == [(renames[0][0], str(target))]
+    assert target.read_bytes() == bundle
+    # Installed already: nothing is copied again
+    install_plotly_js(str(target.parent))
+    assert len(renames) == 1
+    assert os.listdir(target.parent) == [PLOTLY_JS_NAME]
+
+
+def test_install_plotly_js_leaves_no_partial_file(tmp_path, monkeypatch):
+    def fail(source, f):
+        f.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(visualization.shutil, "copyfileobj", fail)
+    with pytest.raises(OSError):
+        install_plotly_js(str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_plotly_js_falls_back_to_the_package_bundle(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(web, "PLOTLY_JS_DIR", str(tmp_path))
+    url = f"/plotly/{PLOTLY_JS_NAME}"
+    assert url in client.get("/ranked-choice").get_data(as_text=True)
+    response = client.get(url)
+    with open(PLOTLY_JS_SOURCE, "rb") as f:
+        assert response.get_data() == f.read()
+    assert response.headers["Cache-Control"] == web.PLOTLY_JS_CACHE_CONTROL
+    assert "immutable" in response.headers["Cache-Control"]
+    response.close()
+    assert client.get("/plotly/plotly-0.0.0.min.js").status_code == 404
+
+
+def test_chart_figures_are_served_until_evicted(client, monkeypatch):
+    store = ChartStore(max_bytes=1 << 20)
+    monkeypatch.setattr(web, "chart_store", store)
+    payload = client.get("/api/generate-chart/voter-profiles").get_json()
+    chart_id = payload["figure_url"].rsplit("/", 1)[1]
+    response = client.get(payload["figure_url"])
+    assert response.status_code == 200
+    assert response.mimetype == "application/json"
+    assert response.get_data() == store.get(chart_id)
+    assert "data" in json.loads(response.get_data())
+    assert client.get(payload["chart_url"]).status_code == 200
+    store.put(b"x" * store.max_bytes)
+    assert client.get(payload["figure_url"]).status_code == 404
+    assert client.get(payload["chart_url"]).status_code == 404
+
+
+# Background jobs
+
+
+def test_abandoned_jobs_count_towards_the_queue_limit():
+    now = [0.0]
+    pool = JobPool(workers=1, max_queue=2, timeout=1.0, keep=0,
+                   clock=lambda: now[0])
+    release = threading.Event()
+    try:
+        first = pool.submit(release.wait)
+        while pool.get(first.id).status != RUNNING:
+            time.sleep(0.01)
+        now[0] = 5.0
+        assert pool.get(first.id).status == TIMED_OUT
+        # The timed-out job's thread is still busy, so it still takes a slot
+        pool.submit(lambda: None)
+        assert pool.depth() == 2
+        with pytest.raises(JobQueueFull):
+            pool.submit(lambda: None)
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_a_stuck_rule_does_not_hold_up_charts_or_other_rules(client, monkeypatch):
+    pools = {name: JobPool(workers=1, max_queue=4, timeout=10.0)
+             for name in web.job_pools}
+    for name, pool in pools.items():
+        monkeypatch.setitem(web.job_pools, name, pool)
+    monkeypatch.setattr(web, "result_cache", ResultCache())
+    started, release = threading.Event(), threading.Event()
+
+    def stuck(candidates, ballots):
+        started.set()
+        release.wait()
+        return kemeny_young(candidates, ballots)
+
+    monkeypatch.setitem(web.rule_funcs, "kemeny_young", stuck)
+    try:
+        job = client.post("/api/jobs/ranked-choice",
+                          json={"rule": "kemeny_young", "seed": 1}).get_json()
+        assert started.wait(5.0)
+        chart = client.get("/api/generate-chart/voter-profiles")
+        assert chart.status_code == 200 and chart.get_json()["success"]
+        election = client.post("/api/run-ranked-choice",
+                               json={"rule": "borda_count", "seed": 1})
+        assert election.status_code == 200 and election.get_json()["success"]
+        status = client.get(job["status_url"]).get_json()
+        assert status["status"] == RUNNING
+        assert pools["slow-rules"].depth() == 1
+    finally:
+        release.set()
+    assert pools["slow-rules"].wait(job["job_id"]).result["success"]
+    for pool in pools.values():
+        pool.shutdown()
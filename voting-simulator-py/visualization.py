@@ -3,11 +3,48 @@ Visualization module for the UK Weighted Voting System
 Provides charts and graphs for election results and weighted voting outcomes
 """
 
+import os
+import shutil
+import tempfile
+
+import plotly
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+import numpy as np
 import pandas as pd
 from typing import List, Dict
 from vote_types import Results, VoterProfile
+from ballots import RankedBallots, as_ballot_matrix
+
+# File name of the plotly.js bundle served next to charts; versioned so it
+# can be cached indefinitely
+PLOTLY_JS_NAME = f"plotly-{plotly.__version__}.min.js"
+# The bundle shipped inside the plotly package
+PLOTLY_JS_SOURCE = os.path.join(os.path.dirname(plotly.__file__), "package_data",
+                                "plotly.min.js")
+
+
+def install_plotly_js(directory: str) -> str:
+    """
+    Copy the plotly.js bundle shipped with the plotly package into
+    ``directory`` unless it is already there, and return its file name.
+
+    The bundle is written to a temporary file and renamed into place, so
+    processes installing at the same time never see a partial file. Raises
+    OSError when ``directory`` cannot be written.
+    """
+    target = os.path.join(directory, PLOTLY_JS_NAME)
+    if not os.path.exists(target):
+        os.makedirs(directory, exist_ok=True)
+        fd, partial = tempfile.mkstemp(dir=directory, suffix=".partial")
+        try:
+            with os.fdopen(fd, "wb") as f, open(PLOTLY_JS_SOURCE, "rb") as source:
+                shutil.copyfileobj(source, f)
+            os.replace(partial, target)
+        except BaseException:
+            os.unlink(partial)
+            raise
+    return PLOTLY_JS_NAME
 
 
 def create_weighted_vote_chart(
@@ -160,19 +197,16 @@ def create_voter_profile_heatmap(profiles: List[VoterProfile]):
     return fig
 
 
-def create_first_preferences_pie_chart(ballots: List[List[str]], candidates: List):
+def create_first_preferences_pie_chart(ballots: RankedBallots, candidates: List):
     """
     Create a pie chart showing first preference distribution
     """
-    candidate_names = {c.id: c.name for c in candidates}
-    first_prefs = [ballot[0] for ballot in ballots if ballot]
+    bm = as_ballot_matrix(candidates, ballots)
+    first_prefs = (bm.position_counts()[:, 0] if bm.depth
+                   else np.zeros(bm.num_candidates))
 
-    # Count first preferences
-    from collections import Counter
-    pref_counts = Counter(first_prefs)
-
-    labels = [candidate_names.get(cid, cid) for cid in pref_counts.keys()]
-    values = list(pref_counts.values())
+    labels = [c.name for c, count in zip(bm.candidates, first_prefs) if count]
+    values = [int(count) for count in first_prefs if count]
 
     fig = go.Figure(data=[go.Pie(
         labels=labels,
@@ -197,17 +231,15 @@ def create_first_preferences_pie_chart(ballots: List[List[str]], candidates: Lis
 
 def save_all_charts(charts: Dict[str, go.Figure], output_dir: str = "charts"):
     """
-    Save all charts as HTML files
+    Save all charts as HTML files sharing one plotly.min.js in output_dir
     """
-    import os
-
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
     for chart_name, fig in charts.items():
         if fig is not None:
             filename = f"{output_dir}/{chart_name.replace(' ', '_').lower()}.html"
-            fig.write_html(filename)
+            fig.write_html(filename, include_plotlyjs='directory')
             print(f"Chart saved: {filename}")
 
 
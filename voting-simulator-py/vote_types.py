@@ -23,6 +23,9 @@ class RoundDetail(TypedDict):
 class Results:
     winner: Optional[Candidate]
     round_details: List[RoundDetail]
+    # final score of each candidate the winner was picked on, higher is
+    # better; set by rules whose last round tallies are not that score
+    scores: Optional[Dict[str, float]] = None
 
 
 @dataclass
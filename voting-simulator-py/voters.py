@@ -0,0 +1,69 @@
+"""
+Columnar voter storage for the weighted yes/no votes.
+
+A VoterTable keeps the raw E, P, D, A, S scores of every voter (or voter
+group) in one (n_voters x 5) NumPy array, so weights for millions of voters
+are computed with a single matrix-vector product instead of a Python loop
+over VoterProfile objects.
+"""
+
+from dataclasses import dataclass
+from typing import Sequence, Union
+
+import numpy as np
+
+from vote_types import VoterProfile
+
+# Column order of VoterTable.values, matching WeightCoefficients
+ATTRIBUTES = ("E", "P", "D", "A", "S")
+
+
+@dataclass
+class VoterTable:
+    ids: np.ndarray      # voter or group ids
+    values: np.ndarray   # (n x 5) raw scores in ATTRIBUTES order
+    counts: np.ndarray   # number of voters each row represents
+
+    @classmethod
+    def from_profiles(cls, profiles: Sequence[VoterProfile]) -> "VoterTable":
+        return cls(
+            ids=np.array([p.id for p in profiles], dtype=str),
+            values=np.array([[getattr(p, a) for a in ATTRIBUTES]
+                             for p in profiles],
+                            dtype=np.float64).reshape(-1, len(ATTRIBUTES)),
+            counts=np.array([p.count for p in profiles], dtype=np.int64),
+        )
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    @property
+    def E(self) -> np.ndarray:
+        return self.values[:, 0]
+
+    @property
+    def P(self) -> np.ndarray:
+        return self.values[:, 1]
+
+    @property
+    def D(self) -> np.ndarray:
+        return self.values[:, 2]
+
+    @property
+    def A(self) -> np.ndarray:
+        return self.values[:, 3]
+
+    @property
+    def S(self) -> np.ndarray:
+        return self.values[:, 4]
+
+
+# The weighted vote accepts either representation
+Voters = Union[Sequence[VoterProfile], VoterTable]
+
+
+def as_voter_table(voters: Voters) -> VoterTable:
+    """Return ``voters`` as a VoterTable, converting a list of profiles"""
+    if isinstance(voters, VoterTable):
+        return voters
+    return VoterTable.from_profiles(voters)
@@ -2,375 +2,560 @@ from typing import List, Dict, Optional, Tuple, Union, Sequence
 from itertools import combinations, permutations
 from copy import deepcopy
 
-from vote_types import Candidate, Ballot, Results
+from vote_types import Candidate, Results
+import numpy as np
+
+from ballots import BallotMatrix, RankedBallots, RunoffCount, UNRANKED, as_ballot_matrix
+from pairwise import pairwise_stats
+from tallies import GradeTally, ScoreTally
+
+# Cardinal rules accept score dicts or a ScoreTally accumulated from a stream
+CardinalBallots = Union[List[Dict[str, float]], ScoreTally]
+GradedBallots = Union[List[Dict[str, str]], GradeTally]
+
+
+def _tallies(bm: BallotMatrix, values: Sequence) -> Dict[str, Union[int, float]]:
+    # round_details stay keyed by candidate id
+    return {cid: values[i] for i, cid in enumerate(bm.ids)}
+
+
+def _tallies_by_index(bm: BallotMatrix, tallies: Dict[int, int]) -> Dict[str, int]:
+    # re-key a {candidate index: value} count by candidate id
+    return {bm.ids[idx]: v for idx, v in tallies.items()}
+
+
+def _argmax(values: Sequence) -> int:
+    # first index holding the maximum, matching max() over candidate order
+    return max(range(len(values)), key=lambda i: values[i])
+
 
 # Positional scoring rules
 
-def positional_scoring(candidates: List[Candidate], ballots: List[Ballot], weights: Sequence[Union[int, float]]) -> Results:
-    scores = {c.id: 0.0 for c in candidates}
-    for ballot in ballots:
-        for rank, cid in enumerate(ballot):
-            if rank < len(weights):
-                scores[cid] += weights[rank]
+def positional_scores(
+        bm: BallotMatrix,
+        weights: Sequence[Union[int, float]]) -> np.ndarray:
+    # one dot product against the cached (candidates x positions) count matrix
+    w = np.zeros(bm.depth)
+    k = min(len(weights), bm.depth)
+    w[:k] = weights[:k]
+    return bm.position_counts() @ w
+
+
+def positional_scoring(
+        candidates: List[Candidate],
+        ballots: RankedBallots,
+        weights: Sequence[Union[int, float]]) -> Results:
+    bm = as_ballot_matrix(candidates, ballots)
+    scores = positional_scores(bm, weights).tolist()
     # winner is highest score
-    winner_id = max(scores, key=lambda cid: scores[cid])
-    winner = next(c for c in candidates if c.id == winner_id)
-    return Results(winner=winner, round_details=[{"round": 1, "tallies": scores, "eliminated": None}])
+    winner = bm.candidates[_argmax(scores)]
+    return Results(winner=winner, round_details=[
+        {"round": 1, "tallies": _tallies(bm, scores), "eliminated": None}])
 
 
-def plurality(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def plurality(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     return positional_scoring(candidates, ballots, [1] + [0] * (len(candidates) - 1))
 
 
-def anti_plurality(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def anti_plurality(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     m = len(candidates)
     return positional_scoring(candidates, ballots, [0] * (m - 1) + [-1])
 
 
-def borda_count(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def borda_count(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     m = len(candidates)
     weights = list(range(m - 1, -1, -1))
     return positional_scoring(candidates, ballots, weights)
 
 
-def dowdall(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def dowdall(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     m = len(candidates)
     weights = [1.0 / (i + 1) for i in range(m)]
     return positional_scoring(candidates, ballots, weights)
 
 
-def veto(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def veto(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     m = len(candidates)
     weights = [1.0] * (m - 1) + [0.0]
     return positional_scoring(candidates, ballots, weights)
 
+
 # Ad-hoc example
 
-def five_three_one(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def five_three_one(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     return positional_scoring(candidates, ballots, [5, 3, 1])
 
+
 # Run-off / elimination systems
 
-def two_round_runoff(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def two_round_runoff(candidates: List[Candidate], ballots: RankedBallots) -> Results:
+    bm = as_ballot_matrix(candidates, ballots)
     # first round
-    first = plurality(candidates, ballots)
+    first = plurality(bm.candidates, bm)
     tallies = first.round_details[0]["tallies"]
     # top two
     top_two = sorted(tallies, key=lambda cid: tallies[cid], reverse=True)[:2]
     # head-to-head
-    head2 = {cid: 0 for cid in top_two}
-    for ballot in ballots:
-        for choice in ballot:
-            if choice in head2:
-                head2[choice] += 1
-                break
-    winner_id = max(head2, key=lambda cid: head2[cid])
-    winner = next(c for c in candidates if c.id == winner_id)
-    details = [first.round_details[0], {"round": 2, "tallies": head2, "eliminated": None}]
-    return Results(winner=winner, round_details=details)
-
-
-def instant_runoff(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+    head2 = {bm.index[cid]: 0 for cid in top_two}
+    finalists = np.array(list(head2), dtype=np.int64)
+    votes = np.zeros(bm.num_candidates, dtype=np.int64)
+    for ranks, counts in bm.blocks():
+        # each ballot goes to whichever finalist it ranks first
+        choice = np.full(len(ranks), UNRANKED, dtype=np.int64)
+        for j in range(bm.depth):
+            column = ranks[:, j]
+            picked = (choice == UNRANKED) & np.isin(column, finalists)
+            choice[picked] = column[picked]
+        voted = choice != UNRANKED
+        choice = choice[voted]
+        votes += np.rint(np.bincount(choice, weights=counts[voted],
+                                     minlength=bm.num_candidates)).astype(np.int64)
+    for idx in head2:
+        head2[idx] = int(votes[idx])
+    winner_idx = max(head2, key=lambda idx: head2[idx])
+    details = [first.round_details[0],
+               {"round": 2, "tallies": {bm.ids[idx]: v for idx, v in head2.items()},
+                "eliminated": None}]
+    return Results(winner=bm.candidates[winner_idx], round_details=details)
+
+
+def instant_runoff(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     # alias for runElection
     from election import run_election_web
     return run_election_web(candidates, ballots)
 
 
-def coombs(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
-    remaining = [c.id for c in candidates]
+def coombs(candidates: List[Candidate], ballots: RankedBallots) -> Results:
+    # Two incremental counts share the eliminations: one follows each
+    # ballot's first surviving preference, the other reads the ballots
+    # backwards to follow its last, so a round only touches the ballots
+    # whose current first or last choice was just eliminated
+    bm = as_ballot_matrix(candidates, ballots)
+    if not bm.num_candidates:
+        return Results(winner=None, round_details=[])
+    first = RunoffCount(bm)
+    last = RunoffCount(bm.reversed())
     rounds = []
-    while len(remaining) > 1:
+    while len(first.remaining) > 1:
         # tally last-place votes
-        tallies = {cid: 0 for cid in remaining}
-        for ballot in ballots:
-            for choice in reversed(ballot):
-                if choice in remaining:
-                    tallies[choice] += 1
-                    break
-        total = sum(tallies.values())
-        # check majority (lowest rejects means winner)
-        for cid, v in tallies.items():
-            if v == min(tallies.values()):
-                winner_id = cid
-        rounds.append({"round": len(rounds) + 1, "tallies": tallies, "eliminated": None})
+        tallies = last.tallies()
+        firsts = first.tallies()
+        rounds.append({"round": len(rounds) + 1,
+                       "tallies": {bm.ids[idx]: v for idx, v in tallies.items()},
+                       "eliminated": None})
+        # a first-preference majority ends the count
+        leader = max(firsts, key=lambda idx: firsts[idx])
+        if firsts[leader] > sum(firsts.values()) / 2:
+            return Results(winner=bm.candidates[leader], round_details=rounds,
+                           scores=_tallies_by_index(bm, firsts))
         # eliminate highest last-place
-        to_elim = max(tallies, key=lambda cid: tallies[cid])
-        remaining.remove(to_elim)
-        rounds[-1]["eliminated"] = to_elim
-    winner = next(c for c in candidates if c.id == remaining[0])
-    return Results(winner=winner, round_details=rounds)
-
-
-def bucklin(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
-    m = len(candidates)
-    cum = {c.id: 0 for c in candidates}
+        to_elim = max(tallies, key=lambda idx: tallies[idx])
+        first.eliminate(to_elim)
+        last.eliminate(to_elim)
+        rounds[-1]["eliminated"] = bm.ids[to_elim]
+    # the round tallies are last places; the decision is on first places
+    scores = _tallies_by_index(bm, firsts) if rounds else None
+    return Results(winner=bm.candidates[first.remaining[0]], round_details=rounds,
+                   scores=scores)
+
+
+def bucklin(
+        candidates: List[Candidate],
+        ballots: RankedBallots,
+        quota: float = 0.5,
+        depth_weights: Optional[Sequence[float]] = None) -> Results:
+    # Round k counts the first k preferences of every voter; the first round
+    # where someone passes the quota share of voters picks the highest tally.
+    # Generalized Bucklin varies the quota; weighted Bucklin discounts deeper
+    # preferences with depth_weights.
+    bm = as_ballot_matrix(candidates, ballots)
+    m = bm.num_candidates
+    if m == 0:
+        return Results(winner=None, round_details=[])
+    # every round is a prefix sum over the cached position-count matrix
+    counts = bm.position_counts()
+    if depth_weights is not None:
+        w = np.zeros(bm.depth)
+        k = min(len(depth_weights), bm.depth)
+        w[:k] = depth_weights[:k]
+        counts = counts * w
+    cumulative = np.cumsum(counts, axis=1)
+    threshold = quota * bm.num_ballots
     rounds = []
-    for k in range(1, m + 1):
-        tallies = {cid: 0 for cid in cum}
-        for ballot in ballots:
-            for choice in ballot[:k]:
-                if choice in tallies:
-                    tallies[choice] += 1
-        rounds.append({"round": k, "tallies": tallies, "eliminated": None})
-        total = sum(tallies.values())
-        for cid, v in tallies.items():
-            if v > total / 2:
-                return Results(winner=next(c for c in candidates if c.id == cid), round_details=rounds)
+    # rounds past the deepest stored preference would repeat the last one
+    for k in range(1, max(bm.depth, 1) + 1):
+        tallies = cumulative[:, k - 1] if bm.depth else np.zeros(m, dtype=np.int64)
+        rounds.append({"round": k, "tallies": _tallies(bm, tallies.tolist()),
+                       "eliminated": None})
+        if (tallies > threshold).any():
+            return Results(winner=bm.candidates[int(tallies.argmax())],
+                           round_details=rounds)
     # no majority, choose highest
-    final = rounds[-1]["tallies"]
-    winner_id = max(final, key=lambda cid: final[cid])
-    return Results(winner=next(c for c in candidates if c.id == winner_id), round_details=rounds)
-
-
-def borda_elimination(candidates: List[Candidate], ballots: List[Ballot], drop_below_avg: bool=False) -> Results:
-    remaining = [c.id for c in candidates]
+    return Results(winner=bm.candidates[int(tallies.argmax())], round_details=rounds)
+
+
+def borda_elimination(
+        candidates: List[Candidate],
+        ballots: RankedBallots,
+        drop_below_avg: bool = False) -> Results:
+    # A candidate's Borda score among the remaining candidates equals its
+    # pairwise wins against them (unranked candidates score nothing), so
+    # the scores are kept up to date from the pairwise counts: removing a
+    # candidate costs O(m) instead of a recount over every ballot.
+    bm = as_ballot_matrix(candidates, ballots)
+    N = pairwise_stats(bm).counts
+    remaining = list(range(bm.num_candidates))
+    borda = N.sum(axis=1)
     rounds = []
     while len(remaining) > 1:
-        # compute Borda
-        m = len(remaining)
-        weights = list(range(m - 1, -1, -1))
-        scores = {cid: 0 for cid in remaining}
-        for ballot in ballots:
-            for rank, cid in enumerate(ballot):
-                if cid in scores and rank < m:
-                    scores[cid] += weights[rank]
-        avg = sum(scores.values()) / m
+        scores = {idx: int(borda[idx]) for idx in remaining}
+        avg = sum(scores.values()) / len(remaining)
         if drop_below_avg:
-            to_drop = [cid for cid, v in scores.items() if v < avg]
+            to_drop = [idx for idx, v in scores.items() if v < avg]
         else:
             # drop one lowest
-            to_drop = [min(scores, key=lambda cid: scores[cid])]
-        for cid in to_drop:
-            remaining.remove(cid)
-        rounds.append({"round": len(rounds) + 1, "tallies": scores, "eliminated": to_drop})
-    winner = next(c for c in candidates if c.id == remaining[0])
-    return Results(winner=winner, round_details=rounds)
-
-
-def baldwin(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+            to_drop = [min(scores, key=lambda idx: scores[idx])]
+        rounds.append({"round": len(rounds) + 1,
+                       "tallies": {bm.ids[idx]: v for idx, v in scores.items()},
+                       "eliminated": [bm.ids[idx] for idx in to_drop]})
+        if not to_drop:
+            # everyone remaining is tied on the average
+            break
+        for idx in to_drop:
+            remaining.remove(idx)
+        borda -= N[:, to_drop].sum(axis=1)
+    return Results(winner=bm.candidates[remaining[0]], round_details=rounds)
+
+
+def baldwin(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     return borda_elimination(candidates, ballots, drop_below_avg=False)
 
 
-def nanson(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def nanson(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     return borda_elimination(candidates, ballots, drop_below_avg=True)
 
-# Condorcet-oriented rules
-
-def pairwise_matrix(candidates: List[Candidate], ballots: List[Ballot]) -> Dict[Tuple[str, str], int]:
-    ids = [c.id for c in candidates]
-    M = {(x, y): 0 for x, y in permutations(ids, 2)}
-    for ballot in ballots:
-        for x, y in combinations(ids, 2):
-            if ballot.index(x) < ballot.index(y):
-                M[(x, y)] += 1
-            else:
-                M[(y, x)] += 1
-    return M
-
-
-def condorcet_winner(candidates: List[Candidate], ballots: List[Ballot]) -> Optional[Candidate]:
-    M = pairwise_matrix(candidates, ballots)
-    ids = [c.id for c in candidates]
-    for x in ids:
-        if all(M.get((x, y), 0) > M.get((y, x), 0) for y in ids if y != x):
-            return next(c for c in candidates if c.id == x)
-    return None
-
-
-def minimax(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
-    M = pairwise_matrix(candidates, ballots)
-    worst = {}
-    for x in [c.id for c in candidates]:
-        defeats = [M[(y, x)] - M[(x, y)] for y in [c.id for c in candidates] if y != x]
-        worst[x] = max(defeats) if defeats else 0
-    winner_id = min(worst, key=lambda x: worst[x])
-    return Results(winner=next(c for c in candidates if c.id == winner_id), round_details=[])
 
+# Condorcet-oriented rules
 
-def copeland(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
-    M = pairwise_matrix(candidates, ballots)
-    score = {c.id: 0 for c in candidates}
-    for x, y in combinations([c.id for c in candidates], 2):
-        if M[(x, y)] > M[(y, x)]:
+def _pairwise_counts(bm: BallotMatrix) -> List[List[int]]:
+    # N[x][y] = number of voters ranking candidate index x above y; unranked
+    # candidates tie below ranked ones, so truncated ballots are counted too.
+    # Shared by every Condorcet rule run on the same profile.
+    return pairwise_stats(bm).counts.tolist()
+
+
+def pairwise_matrix(
+        candidates: List[Candidate],
+        ballots: RankedBallots) -> Dict[Tuple[str, str], int]:
+    bm = as_ballot_matrix(candidates, ballots)
+    N = _pairwise_counts(bm)
+    return {(bm.ids[x], bm.ids[y]): N[x][y]
+            for x, y in permutations(range(bm.num_candidates), 2)}
+
+
+def condorcet_winner(
+        candidates: List[Candidate],
+        ballots: RankedBallots) -> Optional[Candidate]:
+    bm = as_ballot_matrix(candidates, ballots)
+    x = pairwise_stats(bm).condorcet_winner()
+    return bm.candidates[x] if x is not None else None
+
+
+def minimax(candidates: List[Candidate], ballots: RankedBallots) -> Results:
+    bm = as_ballot_matrix(candidates, ballots)
+    N = _pairwise_counts(bm)
+    m = bm.num_candidates
+    worst = []
+    for x in range(m):
+        defeats = [N[y][x] - N[x][y] for y in range(m) if y != x]
+        worst.append(max(defeats) if defeats else 0)
+    winner_idx = min(range(m), key=lambda x: worst[x])
+    # the smallest worst defeat wins, so scores are its negation
+    return Results(winner=bm.candidates[winner_idx], round_details=[],
+                   scores=_tallies(bm, [-w for w in worst]))
+
+
+def copeland(candidates: List[Candidate], ballots: RankedBallots) -> Results:
+    bm = as_ballot_matrix(candidates, ballots)
+    N = _pairwise_counts(bm)
+    score = [0] * bm.num_candidates
+    for x, y in combinations(range(bm.num_candidates), 2):
+        if N[x][y] > N[y][x]:
             score[x] += 1
             score[y] -= 1
-        elif M[(x, y)] < M[(y, x)]:
+        elif N[x][y] < N[y][x]:
             score[x] -= 1
             score[y] += 1
-    winner_id = max(score, key=lambda cid: score[cid])
-    return Results(winner=next(c for c in candidates if c.id == winner_id), round_details=[])
+    return Results(winner=bm.candidates[_argmax(score)], round_details=[],
+                   scores=_tallies(bm, score))
 
 
-def black_rule(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
-    cw = condorcet_winner(candidates, ballots)
+def black_rule(candidates: List[Candidate], ballots: RankedBallots) -> Results:
+    bm = as_ballot_matrix(candidates, ballots)
+    cw = condorcet_winner(bm.candidates, bm)
     if cw:
         return Results(winner=cw, round_details=[])
-    return borda_count(candidates, ballots)
+    return borda_count(bm.candidates, bm)
+
+
+def smith_set(candidates: List[Candidate], ballots: RankedBallots) -> List[Candidate]:
+    # smallest set beating everyone outside it
+    bm = as_ballot_matrix(candidates, ballots)
+    return [bm.candidates[idx] for idx in pairwise_stats(bm).smith_set]
+
+
+def schwartz_set(
+        candidates: List[Candidate],
+        ballots: RankedBallots) -> List[Candidate]:
+    # union of the minimal sets nobody outside beats outright
+    bm = as_ballot_matrix(candidates, ballots)
+    return [bm.candidates[idx] for idx in pairwise_stats(bm).schwartz_set]
+
 
 # Other Condorcet methods (placeholders)
 
-def smith_irv(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
-    # Compute Smith set: smallest unbeaten set
-    M = pairwise_matrix(candidates, ballots)
-    ids = [c.id for c in candidates]
-    # initialize set to all candidates
-    S = set(ids)
-    changed = True
-    while changed:
-        changed = False
-        for x in list(S):
-            for y in ids:
-                if y in S and x in S and y != x:
-                    if M[(y, x)] > M[(x, y)]:
-                        # y beats x, so x not in Smith set
-                        S.remove(x)
-                        changed = True
-                        break
-            if changed:
-                break
-    # restrict candidates and ballots
-    sub_candidates = [c for c in candidates if c.id in S]
-    return instant_runoff(sub_candidates, ballots)
-
-
-def ranked_pairs(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
-    # Tideman Ranked Pairs
-    M = pairwise_matrix(candidates, ballots)
-    ids = [c.id for c in candidates]
-    # list of pairs with strength
-    pairs = []
-    for x, y in combinations(ids, 2):
-        wxy = M[(x, y)] - M[(y, x)]
-        if wxy > 0:
-            pairs.append((x, y, wxy))
-        elif wxy < 0:
-            pairs.append((y, x, -wxy))
-    # sort by descending strength
-    pairs.sort(key=lambda t: t[2], reverse=True)
-    locked = {c: set() for c in ids}
-    def creates_cycle(start, end, graph):
-        # DFS to detect if end reaches start
-        stack = [end]
-        visited = set()
-        while stack:
-            node = stack.pop()
-            if node == start:
-                return True
-            if node not in visited:
-                visited.add(node)
-                for nbr in graph.get(node, []):
-                    stack.append(nbr)
-        return False
-    # lock pairs
-    for winner, loser, _ in pairs:
-        # try to add edge winner->loser
-        if not creates_cycle(winner, loser, locked):
-            locked[winner].add(loser)
-    # winner has no incoming edges
-    incoming = {c: 0 for c in ids}
-    for src, targets in locked.items():
-        for tgt in targets:
-            incoming[tgt] += 1
-    winner_id = min(incoming, key=lambda c: incoming[c])
-    winner = next(c for c in candidates if c.id == winner_id)
-    return Results(winner=winner, round_details=[])
+def smith_irv(candidates: List[Candidate], ballots: RankedBallots) -> Results:
+    # IRV restricted to the Smith set
+    bm = as_ballot_matrix(candidates, ballots)
+    return instant_runoff(smith_set(bm.candidates, bm), bm)
 
 
-def schulze_method(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
-    # Schulze beatpath method
-    M = pairwise_matrix(candidates, ballots)
-    ids = [c.id for c in candidates]
-    # initialize path strengths
-    p = { (i, j): 0 for i in ids for j in ids }
-    for i in ids:
-        for j in ids:
-            if i != j:
-                if M[(i, j)] > M[(j, i)]:
-                    p[(i, j)] = M[(i, j)]
-                else:
-                    p[(i, j)] = 0
-    # Floyd-Warshall style
-    for k in ids:
-        for i in ids:
-            for j in ids:
-                if i != j and i != k and j != k:
-                    p[(i, j)] = max(p[(i, j)], min(p[(i, k)], p[(k, j)]))
-    # find winner whose path strengths beat all others
-    for i in ids:
-        if all(p[(i, j)] >= p[(j, i)] for j in ids if j != i):
-            winner = next(c for c in candidates if c.id == i)
-            return Results(winner=winner, round_details=[])
-    return Results(winner=None, round_details=[])
-
-
-def kemeny_young(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
-    # Brute-force Kemeny-Young: find ranking maximizing pairwise agreement
-    from itertools import permutations
-    ids = [c.id for c in candidates]
-    M = pairwise_matrix(candidates, ballots)
-    best_score = None
-    best_ranking = None
-    for perm in permutations(ids):
-        score = 0
-        for i in range(len(perm)):
-            for j in range(i+1, len(perm)):
-                score += M.get((perm[i], perm[j]), 0)
-        if best_score is None or score > best_score:
-            best_score = score
-            best_ranking = perm
-    # Winner is top of the optimal ranking
-    winner_id = best_ranking[0] if best_ranking else None
-    winner = next((c for c in candidates if c.id == winner_id), None)
-    return Results(winner=winner, round_details=[])
+def _bits(mask: int):
+    # indices of the set bits of a Python int bitset
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
 
 
-def dodgson(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def ranked_pairs(candidates: List[Candidate], ballots: RankedBallots) -> Results:
+    # Tideman Ranked Pairs
+    bm = as_ballot_matrix(candidates, ballots)
+    margins = pairwise_stats(bm).margins
+    m = bm.num_candidates
+    if m == 0:
+        return Results(winner=None, round_details=[])
+    # majority pairs by descending margin; equal margins are taken in
+    # candidate order of the pair, so the result is deterministic
+    x, y = np.nonzero(np.triu(margins != 0, 1))
+    strength = np.abs(margins[x, y])
+    order = np.lexsort((y, x, -strength))
+    pairs = [(int(x[i]), int(y[i])) if margins[x[i], y[i]] > 0
+             else (int(y[i]), int(x[i]))
+             for i in order]
+    # reach[v]: bitset of candidates v reaches in the locked graph, itself
+    # included; above[v]: bitset of candidates reaching v. A pair closes a
+    # cycle exactly when the loser already reaches the winner, an O(1) test.
+    reach = [1 << v for v in range(m)]
+    above = [1 << v for v in range(m)]
+    locked = []
+    for winner, loser in pairs:
+        if reach[loser] >> winner & 1:
+            continue
+        locked.append([bm.ids[winner], bm.ids[loser], int(margins[winner, loser])])
+        if reach[winner] >> loser & 1:
+            # already implied by transitivity, reachability is unchanged
+            continue
+        for u in _bits(above[winner]):
+            reach[u] |= reach[loser]
+        for v in _bits(reach[loser]):
+            above[v] |= above[winner]
+    # candidates locked above more others come first; the winner has no
+    # incoming locked edge
+    dominated = [bin(r).count("1") - 1 for r in reach]
+    ranking = sorted(range(m), key=lambda v: -dominated[v])
+    winner_idx = next(v for v in range(m) if above[v] == 1 << v)
+    detail = {
+        "round": 1,
+        "tallies": _tallies(bm, dominated),
+        "eliminated": None,
+        "ranking": [bm.ids[v] for v in ranking],
+        "locked": locked,
+    }
+    return Results(winner=bm.candidates[winner_idx], round_details=[detail])
+
+
+def schulze_method(candidates: List[Candidate], ballots: RankedBallots) -> Results:
+    # Schulze beatpath method
+    bm = as_ballot_matrix(candidates, ballots)
+    N = pairwise_stats(bm).counts
+    m = bm.num_candidates
+    # initialize path strengths with the winning side of each contest
+    p = np.where(N > N.T, N, 0)
+    np.fill_diagonal(p, 0)
+    # Floyd-Warshall widest paths, relaxing every pair through k at once
+    for k in range(m):
+        np.maximum(p, np.minimum(p[:, k:k + 1], p[k:k + 1, :]), out=p)
+    np.fill_diagonal(p, 0)
+    beats = p > p.T
+    # rank by peeling off the candidates no remaining candidate beats; the
+    # first of them (by candidate order) is the winner
+    ranking = []
+    remaining = np.ones(m, dtype=bool)
+    while remaining.any():
+        layer = np.flatnonzero(remaining & ~beats[remaining].any(axis=0))
+        ranking.extend(layer.tolist())
+        remaining[layer] = False
+    if not ranking:
+        return Results(winner=None, round_details=[])
+    strengths = p.tolist()
+    detail = {
+        "round": 1,
+        "tallies": _tallies(bm, beats.sum(axis=1).tolist()),
+        "eliminated": None,
+        "ranking": [bm.ids[i] for i in ranking],
+        "strengths": {bm.ids[i]: _tallies(bm, row) for i, row in enumerate(strengths)},
+    }
+    return Results(winner=bm.candidates[ranking[0]], round_details=[detail])
+
+
+# Largest field solved exactly by kemeny_young; the subset table holds
+# 2^m x m pairwise sums
+KEMENY_EXACT_LIMIT = 16
+
+
+def _kemeny_exact(N: np.ndarray) -> List[int]:
+    # Dynamic programming over candidate subsets. best[R] is the top score
+    # for ordering the set R below everyone else; placing c first among R
+    # earns T[R, c] = sum of N[c, r] over r in R. Among optimal rankings the
+    # lexicographically first one is returned, as the old brute force did.
+    m = N.shape[0]
+    full = (1 << m) - 1
+    T = np.zeros((full + 1, m), dtype=np.int64)
+    size = np.zeros(full + 1, dtype=np.int64)
+    for b in range(m):
+        T[1 << b:2 << b] = T[:1 << b] + N[:, b]
+        size[1 << b:2 << b] = size[:1 << b] + 1
+    best = np.zeros(full + 1, dtype=np.int64)
+    first = np.zeros(full + 1, dtype=np.int64)
+    for k in range(1, m + 1):
+        layer = np.flatnonzero(size == k)
+        options = np.full((m, len(layer)), np.iinfo(np.int64).min)
+        for c in range(m):
+            has = (layer >> c) & 1 == 1
+            subset = layer[has]
+            options[c, has] = T[subset, c] + best[subset ^ (1 << c)]
+        first[layer] = options.argmax(axis=0)
+        best[layer] = options.max(axis=0)
+    ranking = []
+    R = full
+    while R:
+        c = int(first[R])
+        ranking.append(c)
+        R ^= 1 << c
+    return ranking
+
+
+def _kemeny_local(N: np.ndarray) -> List[int]:
+    # Start from the Borda-like order of total pairwise support, then move
+    # single candidates to their best insertion point until no move helps
+    order = np.argsort(-N.sum(axis=1), kind="stable").tolist()
+    improved = True
+    while improved:
+        improved = False
+        for c in list(order):
+            rest = [x for x in order if x != c]
+            above = np.concatenate(([0], np.cumsum(N[rest, c])))
+            below = np.concatenate(([0], np.cumsum(N[c, rest][::-1])))[::-1]
+            gain = above + below
+            p = int(gain.argmax())
+            if gain[p] > gain[order.index(c)]:
+                order = rest[:p] + [c] + rest[p:]
+                improved = True
+    return order
+
+
+def kemeny_young(
+        candidates: List[Candidate],
+        ballots: RankedBallots,
+        exact_limit: int = KEMENY_EXACT_LIMIT) -> Results:
+    # Kemeny-Young: ranking maximizing pairwise agreement with the voters.
+    # Exact subset DP in O(2^m * m) up to exact_limit candidates; beyond
+    # that a local search whose gap to the pairwise upper bound is reported.
+    bm = as_ballot_matrix(candidates, ballots)
+    N = pairwise_stats(bm).counts
+    m = bm.num_candidates
+    if m == 0:
+        return Results(winner=None, round_details=[])
+    exact = m <= exact_limit
+    ranking = _kemeny_exact(N) if exact else _kemeny_local(N)
+    # each candidate is credited with the agreement on pairs it heads
+    support = [int(N[c, ranking[i + 1:]].sum()) for i, c in enumerate(ranking)]
+    score = sum(support)
+    # no ranking can beat taking the majority side of every pair
+    upper_bound = int(np.maximum(N, N.T)[np.triu_indices(m, 1)].sum())
+    detail = {
+        "round": 1,
+        "tallies": {bm.ids[c]: v for c, v in zip(ranking, support)},
+        "eliminated": None,
+        "ranking": [bm.ids[c] for c in ranking],
+        "score": score,
+        "exact": exact,
+        "upper_bound": upper_bound,
+        "optimality_gap": 0 if exact else upper_bound - score,
+    }
+    # Winner is top of the consensus ranking
+    return Results(winner=bm.candidates[ranking[0]], round_details=[detail])
+
+
+def dodgson(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     # Approximate Dodgson distance by total pairwise deficit (sum of positive deficits)
-    M = pairwise_matrix(candidates, ballots)
-    ids = [c.id for c in candidates]
-    deficits = {}
-    for x in ids:
+    bm = as_ballot_matrix(candidates, ballots)
+    N = _pairwise_counts(bm)
+    m = bm.num_candidates
+    deficits = []
+    for x in range(m):
         total_deficit = 0
-        for y in ids:
+        for y in range(m):
             if y != x:
-                d = M[(y, x)] - M[(x, y)]
+                d = N[y][x] - N[x][y]
                 if d > 0:
                     total_deficit += d
-        deficits[x] = total_deficit
-    winner_id = min(deficits, key=lambda cid: deficits[cid])
-    winner = next((c for c in candidates if c.id == winner_id), None)
-    return Results(winner=winner, round_details=[])
+        deficits.append(total_deficit)
+    winner_idx = min(range(m), key=lambda x: deficits[x])
+    return Results(winner=bm.candidates[winner_idx], round_details=[],
+                   scores=_tallies(bm, [-d for d in deficits]))
 
 
-def young(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def young(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     # Approximate Young score by total pairwise deficit (voter deletions)
     # Similar to Dodgson approximation
     return dodgson(candidates, ballots)
 
+
 # Cardinal systems
 
-def approval_voting(candidates: List[Candidate], ballots: List[Dict[str, int]]) -> Results:
-    scores = {c.id: 0 for c in candidates}
-    for ballot in ballots:
-        for cid, score in ballot.items():
-            if score == 1 and cid in scores:
-                scores[cid] += 1
+def approval_voting(candidates: List[Candidate], ballots: CardinalBallots) -> Results:
+    if isinstance(ballots, ScoreTally):
+        scores = ballots.tallies(candidates, ballots.approvals)
+    else:
+        scores = {c.id: 0 for c in candidates}
+        for ballot in ballots:
+            for cid, score in ballot.items():
+                if score == 1 and cid in scores:
+                    scores[cid] += 1
     winner_id = max(scores, key=lambda cid: scores[cid])
     return Results(winner=next(c for c in candidates if c.id == winner_id), round_details=[{"round": 1, "tallies": scores, "eliminated": None}])
 
 
-def score_voting(candidates: List[Candidate], ballots: List[Dict[str, float]]) -> Results:
-    scores = {c.id: 0.0 for c in candidates}
-    for ballot in ballots:
-        for cid, val in ballot.items():
-            if cid in scores:
-                scores[cid] += val
+def score_voting(candidates: List[Candidate], ballots: CardinalBallots) -> Results:
+    if isinstance(ballots, ScoreTally):
+        sums = ballots.tallies(candidates, ballots.sums)
+        scores = {cid: float(v) for cid, v in sums.items()}
+    else:
+        scores = {c.id: 0.0 for c in candidates}
+        for ballot in ballots:
+            for cid, val in ballot.items():
+                if cid in scores:
+                    scores[cid] += val
     winner_id = max(scores, key=lambda cid: scores[cid])
     return Results(winner=next(c for c in candidates if c.id == winner_id), round_details=[{"round": 1, "tallies": scores, "eliminated": None}])
 
 
-def majority_judgment(candidates: List[Candidate], ballots: List[Dict[str, str]]) -> Results:
+def majority_judgment(candidates: List[Candidate], ballots: GradedBallots) -> Results:
     # Median grade wins; tie-break by lexicographic grade distribution
+    if isinstance(ballots, GradeTally):
+        return _majority_judgment_tally(candidates, ballots)
     # Collect all unique grades
     unique_grades = set()
     for b in ballots:
@@ -399,17 +584,52 @@ def majority_judgment(candidates: List[Candidate], ballots: List[Dict[str, str]]
     return Results(winner=winner, round_details=[])
 
 
-def star_voting(candidates: List[Candidate], ballots: List[Dict[str, float]]) -> Results:
+def _majority_judgment_tally(candidates: List[Candidate], tally: GradeTally) -> Results:
+    # Same rule from grade histograms: with every candidate graded on all n
+    # ballots, sorted grade lists compare like their negated cumulative counts
+    sorted_grades = sorted(tally.histograms, reverse=True)
+    grade_rank = {g: i for i, g in enumerate(sorted_grades)}
+    missing = grade_rank.get('', len(sorted_grades))
+    n = tally.num_ballots
+    cand_stats = {}
+    for c in candidates:
+        if not n:
+            continue
+        hist = np.zeros(len(sorted_grades) + 1, dtype=np.int64)
+        if c.id in tally.index:
+            for grade, rank in grade_rank.items():
+                hist[rank] += tally.histograms[grade][tally.index[c.id]]
+        hist[missing] += n - hist.sum()
+        cumulative = np.cumsum(hist)
+        median_rank = int(np.searchsorted(cumulative, n // 2, side="right"))
+        cand_stats[c.id] = (median_rank, (-cumulative).tolist())
+    winner_id = min(
+        cand_stats.keys(),
+        key=lambda cid: (cand_stats[cid][0], cand_stats[cid][1])
+    )
+    winner = next((c for c in candidates if c.id == winner_id), None)
+    return Results(winner=winner, round_details=[])
+
+
+def star_voting(candidates: List[Candidate], ballots: CardinalBallots) -> Results:
     # score stage
     total = score_voting(candidates, ballots)
     top2 = sorted(total.round_details[0]["tallies"], key=lambda cid: total.round_details[0]["tallies"][cid], reverse=True)[:2]
     # runoff
     runoff = {cid: 0 for cid in top2}
-    for ballot in ballots:
-        if ballot.get(top2[0], 0) > ballot.get(top2[1], 0):
-            runoff[top2[0]] += 1
-        else:
-            runoff[top2[1]] += 1
+    if isinstance(ballots, ScoreTally):
+        # equal scores go to the runner-up, as in the ballot loop
+        first, second = (ballots.index.get(cid) for cid in top2)
+        ahead = (int(ballots.prefers[first, second])
+                 if None not in (first, second) else 0)
+        runoff[top2[0]] = ahead
+        runoff[top2[1]] = ballots.num_ballots - ahead
+    else:
+        for ballot in ballots:
+            if ballot.get(top2[0], 0) > ballot.get(top2[1], 0):
+                runoff[top2[0]] += 1
+            else:
+                runoff[top2[1]] += 1
     winner_id = max(runoff, key=lambda cid: runoff[cid])
     winner = next(c for c in candidates if c.id == winner_id)
     details = [total.round_details[0], {"round": 2, "tallies": runoff, "eliminated": None}]
@@ -460,14 +680,23 @@ def three_two_one_voting(candidates: List[Candidate], ballots: List[Dict[str, st
     winner = next(c for c in candidates if c.id == winner_id)
     return Results(winner=winner, round_details=[])
 
+
 # Theoretical & stochastic
 
-def random_dictatorship(candidates: List[Candidate], ballots: List[Ballot]) -> Results:
+def random_dictatorship(candidates: List[Candidate], ballots: RankedBallots) -> Results:
     import random
-    if not ballots:
+    bm = as_ballot_matrix(candidates, ballots)
+    if not len(bm) or not bm.depth or not bm.num_ballots:
         return Results(winner=None, round_details=[])
-    choice = random.choice(ballots)[0] if ballots[0] else None
-    winner = next((c for c in candidates if c.id == choice), None)
+    # draw a voter, not a distinct ranking, walking the blocks to find its row
+    voter = random.randrange(bm.num_ballots)
+    for ranks, counts in bm.blocks():
+        seen = np.cumsum(counts)
+        if voter < seen[-1]:
+            choice = ranks[int(np.searchsorted(seen, voter, side="right")), 0]
+            break
+        voter -= int(seen[-1])
+    winner = bm.candidates[choice] if choice != UNRANKED else None
     return Results(winner=winner, round_details=[])
 
 